@@ -0,0 +1,34 @@
+# Usage: python benchmarks/builder.py [vm ...]
+# Builds strings of 256 KB to 16 MB with 's = s + chunk' on every VM given and reports the
+# throughput (MB/s): it stays flat as long as every append costs the same whatever the length
+import os
+import sys
+import tempfile
+from common import ROOT, compile_program, run_vm
+
+SIZES = [1 << 18, 1 << 20, 1 << 22, 1 << 24]
+CHUNK = "0123456789abcdef"
+RUNS = 3
+
+def generate_program(filename: str, size: int):
+    with open(filename, "w") as file:
+        file.write(f'string report = "";\nfor (int i = 0; i < {size // len(CHUNK)}) {{\n    report = report + "{CHUNK}";\n}}\n')
+        file.write("print(report.size());\n")
+
+def main():
+    vms = [os.path.abspath(vm) for vm in sys.argv[1:]] or [os.path.join(ROOT, "vml")]
+    source = os.path.join(tempfile.gettempdir(), "bytestack_builder.lx")
+    binary = os.path.join(tempfile.gettempdir(), "bytestack_builder.o")
+
+    print(f"{'size':>8}" + "".join(f"{os.path.basename(vm):>14}" for vm in vms))
+    for size in SIZES:
+        generate_program(source, size)
+        compile_program(source, binary)
+        times = [min(run_vm(binary, vm)["time"] for _ in range(RUNS)) for vm in vms]
+        print(f"{size // 1024:>6}KB" + "".join(f"{size / time / (1 << 20):>14.1f}" for time in times))
+
+    os.remove(source)
+    os.remove(binary)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+# Usage: make stats && python benchmarks/bytecode.py [program.lx ...]
+import os
+import sys
+import glob
+import tempfile
+from common import PROGRAMS, compile_program, run_vm
+
+def main():
+    programs = sys.argv[1:] or sorted(glob.glob(os.path.join(PROGRAMS, "*.lx")))
+    binary = os.path.join(tempfile.gettempdir(), "bytestack_bench.o")
+
+    print(f"{'program':<24}{'mode':<6}{'size (B)':>10}{'emitted':>10}{'executed':>12}{'time (s)':>10}")
+    for program in programs:
+        for optimize in (False, True):
+            compiler = compile_program(program, binary, optimize)
+            size = os.path.getsize(binary)
+            stats = run_vm(binary)
+            executed = int(stats.get("executed instructions", -1))
+            mode = "-O" if optimize else ""
+            print(f"{os.path.basename(program):<24}{mode:<6}{size:>10}{len(compiler.bytecode):>10}{executed:>12}{stats['time']:>10.3f}")
+
+    os.remove(binary)
+
+if __name__ == "__main__":
+    main()
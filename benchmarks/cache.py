@@ -0,0 +1,46 @@
+# Usage: python benchmarks/cache.py [number of files]
+# Builds a project of generated scripts twice with an empty cache (cold and warm build) and once with --no-cache
+import os
+import sys
+import time
+import shutil
+import tempfile
+import subprocess
+from common import ROOT
+
+MAIN = os.path.join(ROOT, "compiler", "main.py")
+
+def generate_project(directory: str, files: int) -> list:
+    with open(os.path.join(ROOT, "examples", "example1.lx")) as file:
+        template = file.read()
+
+    sources = []
+    for i in range(files):
+        sources.append(os.path.join(directory, f"script{i}.lx"))
+        with open(sources[-1], "w") as file:
+            file.write(f"int id = {i};\n{template}")
+
+    return sources
+
+def build(sources: list, env: dict, flags: list = []) -> float:
+    start = time.perf_counter()
+    for source in sources:
+        subprocess.run([sys.executable, MAIN, source, *flags, source[:-3] + ".o"], env=env, check=True)
+
+    return time.perf_counter() - start
+
+def main():
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    directory = tempfile.mkdtemp()
+    env = dict(os.environ, XDG_CACHE_HOME=os.path.join(directory, "cache"))
+    sources = generate_project(directory, files)
+
+    print(f"files:              {files}")
+    print(f"--no-cache (s):     {build(sources, env, ['--no-cache']):.3f}")
+    print(f"cold build (s):     {build(sources, env):.3f}")
+    print(f"warm build (s):     {build(sources, env):.3f}")
+
+    shutil.rmtree(directory)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# Usage: python benchmarks/codegen.py [functions]
+# Code generation throughput over the AST of a large generated program
+import sys
+import time
+from common import ROOT
+from lexer import Lexer
+from parser import Parser
+from resolver import Resolver
+from bytecode_gen import ByteCodeCompiler
+
+FUNCTION = """func f{i}(int a, int b) -> int {{
+    int c = a * {i} + b;
+    float d = 1.5;
+    for (int j = 0; j < b) {{
+        if (c > a) {{
+            c = c - a;
+        }} elif (c == a) {{
+            continue;
+        }} else {{
+            c = c + j;
+        }}
+        d = d * 2.0;
+    }}
+    while (c > 10) {{
+        c = c / 2;
+        if (c == 3) {{ break; }}
+    }}
+    print("result: " + c);
+    return c;
+}}
+int r{i} = f{i}({i}, 3);
+"""
+
+def main():
+    functions = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    lexer = Lexer()
+    lexer.input("".join(FUNCTION.format(i=i) for i in range(functions)))
+    ast = Parser(lexer).get_program()
+    Resolver().resolve(ast)
+
+    times = []
+    for _ in range(15):
+        generator = ByteCodeCompiler()
+        start = time.perf_counter()
+        generator.generate_bytecode(ast)
+        times.append(time.perf_counter() - start)
+
+    instructions = len(generator.bytecode)
+    print(f"functions:          {functions}")
+    print(f"instructions:       {instructions}")
+    print(f"codegen time (s):   {min(times):.3f}")
+    print(f"instructions/sec:   {instructions / min(times):,.0f}")
+
+if __name__ == "__main__":
+    main()
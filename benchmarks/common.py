@@ -0,0 +1,36 @@
+import os
+import sys
+import time
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROGRAMS = os.path.join(ROOT, "benchmarks", "programs")
+sys.path.insert(0, os.path.join(ROOT, "compiler"))
+
+from main import Compiler
+
+def compile_program(filename: str, output_file: str, optimize: bool = False) -> Compiler:
+    compiler = Compiler(filename, output_file)
+    compiler.generate_lexer()
+    compiler.generate_ast()
+    if optimize: compiler.optimize_ast()
+    compiler.generate_bytecode()
+    if optimize: compiler.optimize_bytecode()
+    compiler.export_binary()
+    return compiler
+
+def run_vm(binary: str, vm: str = os.path.join(ROOT, "vml")) -> dict:
+    """ Wall time plus every "name: value" line reported by a VM built with 'make stats' """
+    start = time.perf_counter()
+    result = subprocess.run([vm, binary], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    elapsed = time.perf_counter() - start
+
+    stats = {"time": elapsed}
+    for line in result.stderr.decode(errors="replace").splitlines():
+        name, _, value = line.rpartition(":")
+        try:
+            stats[name] = float(value)
+        except ValueError:
+            pass
+
+    return stats
@@ -0,0 +1,25 @@
+# Usage: python benchmarks/heap.py [vm ...]
+# Runs the allocation-bound programs (-O) on every VM given, e.g. against a build of the previous allocator:
+#   python benchmarks/heap.py vml-old vml
+import os
+import sys
+import tempfile
+from common import ROOT, PROGRAMS, compile_program, run_vm
+
+BENCHMARKS = ["allocation.lx"]
+RUNS = 5
+
+def main():
+    vms = [os.path.abspath(vm) for vm in sys.argv[1:]] or [os.path.join(ROOT, "vml")]
+    binary = os.path.join(tempfile.gettempdir(), "bytestack_heap.o")
+
+    print(f"{'program':<16}" + "".join(f"{os.path.basename(vm):>14}" for vm in vms) + f"{'speedup':>10}")
+    for program in BENCHMARKS:
+        compile_program(os.path.join(PROGRAMS, program), binary, optimize=True)
+        times = [min(run_vm(binary, vm)["time"] for _ in range(RUNS)) for vm in vms]
+        print(f"{program:<16}" + "".join(f"{time:>14.3f}" for time in times) + f"{times[0] / times[-1]:>9.2f}x")
+
+    os.remove(binary)
+
+if __name__ == "__main__":
+    main()
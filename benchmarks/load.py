@@ -0,0 +1,38 @@
+# Usage: make stats && python benchmarks/load.py [number of statements]
+# Compiles a large generated program and reports the image size, the VM load time and its peak RSS
+import os
+import sys
+import time
+import tempfile
+from common import compile_program, run_vm
+
+def generate_program(filename: str, statements: int):
+    with open(filename, "w") as file:
+        file.write("int x = 0;\n")
+        for i in range(statements):
+            file.write(f"x = x + {i % 100};\n")
+
+def main():
+    statements = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    source = os.path.join(tempfile.gettempdir(), "bytestack_load.lx")
+    binary = os.path.join(tempfile.gettempdir(), "bytestack_load.o")
+    generate_program(source, statements)
+
+    start = time.perf_counter()
+    compiler = compile_program(source, binary)
+    compile_time = time.perf_counter() - start
+
+    stats = run_vm(binary)
+    print(f"statements:       {statements}")
+    print(f"instructions:     {len(compiler.bytecode)}")
+    print(f"image size (KB):  {os.path.getsize(binary) // 1024}")
+    print(f"compile time (s): {compile_time:.3f}")
+    print(f"load time (ms):   {stats.get('load time (ms)', float('nan')):.3f}")
+    print(f"run time (s):     {stats['time']:.3f}")
+    print(f"peak RSS (KB):    {stats.get('peak rss (KB)', float('nan')):.0f}")
+
+    os.remove(source)
+    os.remove(binary)
+
+if __name__ == "__main__":
+    main()
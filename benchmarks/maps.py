@@ -0,0 +1,56 @@
+# Usage: python benchmarks/maps.py [vm]
+# Looks up string keys in a Map and by scanning parallel arrays, for 16 to 4096 keys, and reports
+# the lookups per second (K/s) of each: the time of the same program without lookups is subtracted
+import os
+import sys
+import tempfile
+from common import ROOT, compile_program, run_vm
+
+SIZES = [16, 256, 4096]
+LOOKUPS = 20000
+RUNS = 3
+
+SETUP = (
+    'string[] names = ["k0"];\nint[] values = [0];\nfor (int i = 1; i < {size}) {{\n'
+    '    names.append("k" + i);\n    values.append(i * 3);\n}}\n'
+    'Map<string, int> index = {{}};\nfor (int i = 0; i < {size}) {{\n    index[names[i]] = values[i];\n}}\n'
+    'string key = "";\nint found = 0;\nint j = 0;\nint k = 0;\n'
+)
+
+# Every lookup reads the key of a different entry (7 entries further)
+LOOKUP = {
+    "map": "    found = found + index[key];\n",
+    "scan": "    k = 0;\n    while (names[k] != key) {\n        k = k + 1;\n    }\n    found = found + values[k];\n",
+}
+
+def generate_program(filename: str, size: int, kind: str, lookups: int):
+    with open(filename, "w") as file:
+        file.write(SETUP.format(size=size))
+        file.write(f"for (int r = 0; r < {lookups}) {{\n    key = names[j];\n")
+        file.write(LOOKUP[kind])
+        file.write(f"    j = j + 7;\n    if (j >= {size}) {{\n        j = j - {size};\n    }}\n}}\nprint(found);\n")
+
+def lookup_time(source: str, binary: str, vm: str, size: int, kind: str) -> float:
+    times = []
+    for lookups in (LOOKUPS, 0):
+        generate_program(source, size, kind, lookups)
+        compile_program(source, binary)
+        times.append(min(run_vm(binary, vm)["time"] for _ in range(RUNS)))
+
+    return max(times[0] - times[1], 1e-6)
+
+def main():
+    vm = os.path.abspath(sys.argv[1]) if len(sys.argv) > 1 else os.path.join(ROOT, "vml")
+    source = os.path.join(tempfile.gettempdir(), "bytestack_maps.lx")
+    binary = os.path.join(tempfile.gettempdir(), "bytestack_maps.o")
+
+    print(f"{'keys':>6}{'map':>12}{'scan':>12}{'speedup':>10}")
+    for size in SIZES:
+        times = [lookup_time(source, binary, vm, size, kind) for kind in LOOKUP]
+        print(f"{size:>6}" + "".join(f"{LOOKUPS / time / 1e3:>12.1f}" for time in times) + f"{times[1] / times[0]:>9.1f}x")
+
+    os.remove(source)
+    os.remove(binary)
+
+if __name__ == "__main__":
+    main()
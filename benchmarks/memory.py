@@ -0,0 +1,42 @@
+# Usage: python benchmarks/memory.py [statements]
+# Peak memory (tracemalloc) and node allocation rate while parsing a large generated program
+import gc
+import sys
+import time
+import tracemalloc
+from common import ROOT
+from lexer import Lexer
+from parser import Parser
+from parsing import TokenReplay, generate_program
+from utils.syntax_tree import ASTNode
+
+def count_nodes() -> int:
+    return sum(1 for item in gc.get_objects() if isinstance(item, ASTNode))
+
+def main():
+    statements = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    lexer = Lexer()
+    lexer.input(generate_program(statements))
+    tokens = list(lexer)
+
+    start = time.perf_counter()
+    Parser(TokenReplay(tokens)).get_program()
+    parse_time = time.perf_counter() - start
+
+    gc.collect()
+    tracemalloc.start()
+    ast = Parser(TokenReplay(tokens)).get_program()
+    ast_size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    nodes = count_nodes()
+
+    print(f"statements:       {statements}")
+    print(f"tokens:           {len(tokens)}")
+    print(f"AST nodes:        {nodes}")
+    print(f"AST size (MB):    {ast_size / 2**20:.1f}")
+    print(f"peak memory (MB): {peak / 2**20:.1f}")
+    print(f"bytes per node:   {ast_size / nodes:.0f}")
+    print(f"nodes/sec:        {nodes / parse_time:,.0f}")
+
+if __name__ == "__main__":
+    main()
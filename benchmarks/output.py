@@ -0,0 +1,40 @@
+# Usage: python benchmarks/output.py [vm ...]
+# Prints 10^6 values on every VM given (stdout to /dev/null) and reports the throughput (Mvalues/s)
+import os
+import sys
+import tempfile
+from common import ROOT, compile_program, run_vm
+
+VALUES = 1000000
+ARRAY_SIZE = 10000
+RUNS = 3
+
+# Every program prints VALUES values, one print call each or ARRAY_SIZE per call
+PROGRAMS = {
+    "ints": f"for (int i = 0; i < {VALUES}) {{\n    print(i);\n}}\n",
+    "strings": f'string word = "" + "value ";\nfor (int i = 0; i < {VALUES}) {{\n    print(word);\n}}\n',
+    "arrays": (
+        f"int[] values = [0];\nfor (int i = 1; i < {ARRAY_SIZE}) {{\n    values.append(i);\n}}\n"
+        f"for (int i = 0; i < {VALUES // ARRAY_SIZE}) {{\n    print(values);\n}}\n"
+    ),
+}
+
+def main():
+    vms = [os.path.abspath(vm) for vm in sys.argv[1:]] or [os.path.join(ROOT, "vml")]
+    source = os.path.join(tempfile.gettempdir(), "bytestack_output.lx")
+    binary = os.path.join(tempfile.gettempdir(), "bytestack_output.o")
+
+    print(f"{'program':<10}" + "".join(f"{os.path.basename(vm):>14}" for vm in vms))
+    for program, code in PROGRAMS.items():
+        with open(source, "w") as file:
+            file.write(code)
+
+        compile_program(source, binary)
+        times = [min(run_vm(binary, vm)["time"] for _ in range(RUNS)) for vm in vms]
+        print(f"{program:<10}" + "".join(f"{VALUES / time / 1e6:>14.2f}" for time in times))
+
+    os.remove(source)
+    os.remove(binary)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# Usage: python benchmarks/parser.py [statements]
+# Parsing throughput (tokens/sec) over a generated expression-heavy program; the tokens
+# are produced beforehand so only the parser (and its semantic checks) is measured
+import sys
+import time
+import random
+from common import ROOT
+from lexer import Lexer
+from parser import Parser
+
+OPERATORS = ['+', '-', '*', '/', '%', '^', '==', '!=', '<', '>', '<=', '>=', 'and', 'or']
+
+def generate_expression(depth: int) -> str:
+    if depth == 0:
+        return random.choice(["a", "b", "c", str(random.randint(0, 99)), f"{random.randint(0, 99)}.5"])
+    if random.random() < 0.2:
+        return f"({generate_expression(depth - 1)})"
+
+    return f"{generate_expression(depth - 1)} {random.choice(OPERATORS)} {generate_expression(depth - 1)}"
+
+def generate_program(statements: int) -> str:
+    random.seed(0)
+    lines = ["float a = 1.5;", "float b = 2.5;", "float c = 3.5;", "float x = 0.0;"]
+    for _ in range(statements):
+        lines.append(f"x = {generate_expression(random.randint(1, 4))};")
+
+    return "\n".join(lines)
+
+class TokenReplay:
+    def __init__(self, tokens: list):
+        self.tokens = iter(tokens)
+
+    def token(self):
+        return next(self.tokens, None)
+
+def main():
+    statements = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    lexer = Lexer()
+    lexer.input(generate_program(statements))
+    tokens = list(lexer)
+
+    times = []
+    for _ in range(3):
+        start = time.perf_counter()
+        Parser(TokenReplay(tokens)).get_program()
+        times.append(time.perf_counter() - start)
+
+    print(f"statements:       {statements}")
+    print(f"tokens:           {len(tokens)}")
+    print(f"parse time (s):   {min(times):.3f}")
+    print(f"tokens/sec:       {len(tokens) / min(times):,.0f}")
+
+if __name__ == "__main__":
+    main()
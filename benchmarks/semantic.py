@@ -0,0 +1,41 @@
+# Usage: python benchmarks/semantic.py [depth] [repetitions]
+# Parsing (with its semantic checks) of deeply nested blocks whose statements use variables of the outer scopes
+import sys
+import time
+from common import ROOT
+from lexer import Lexer
+from parser import Parser
+from parsing import TokenReplay
+
+def generate_program(depth: int, repetitions: int) -> str:
+    lines = ["int v0 = 0;"]
+    for _ in range(repetitions):
+        for level in range(1, depth + 1):
+            lines.append(f"{'    ' * level}if (v0 < {level}) {{")
+            lines.append(f"{'    ' * level}int v{level} = v{level - 1} + 1;")
+            lines.append(f"{'    ' * level}v0 = v0 + v{level} * v{level // 2};")
+        for level in range(depth, 0, -1):
+            lines.append(f"{'    ' * level}}}")
+
+    return "\n".join(lines)
+
+def main():
+    depth = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    repetitions = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    lexer = Lexer()
+    lexer.input(generate_program(depth, repetitions))
+    tokens = list(lexer)
+
+    times = []
+    for _ in range(3):
+        start = time.perf_counter()
+        Parser(TokenReplay(tokens)).get_program()
+        times.append(time.perf_counter() - start)
+
+    print(f"depth:            {depth}")
+    print(f"scopes:           {depth * repetitions}")
+    print(f"tokens:           {len(tokens)}")
+    print(f"parse time (s):   {min(times):.3f}")
+
+if __name__ == "__main__":
+    main()
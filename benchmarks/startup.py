@@ -0,0 +1,53 @@
+# Usage: python benchmarks/startup.py [runs] [statements of the large file]
+# Wall time of complete compiler invocations (python compiler/main.py) on a tiny and on a large file
+import os
+import sys
+import time
+import tempfile
+import subprocess
+from common import ROOT
+
+MAIN = os.path.join(ROOT, "compiler", "main.py")
+
+def generate_program(filename: str, statements: int):
+    with open(filename, "w") as file:
+        file.write("int x = 0;\n")
+        for i in range(statements):
+            file.write(f"x = x + {i % 100}; // statement {i}\n")
+
+def measure(source: str, runs: int) -> float:
+    binary = source[:-3] + ".o"
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, MAIN, source, "--no-cache", binary], check=True)
+        times.append(time.perf_counter() - start)
+
+    os.remove(binary)
+    return min(times) * 1000
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    statements = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    directory = tempfile.mkdtemp()
+    tiny = os.path.join(directory, "tiny.lx")
+    large = os.path.join(directory, "large.lx")
+
+    with open(tiny, "w") as file:
+        file.write('print("hello");\n')
+    generate_program(large, statements)
+
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "pass"], check=True)
+    interpreter = (time.perf_counter() - start) * 1000
+
+    print(f"interpreter startup (ms): {interpreter:.1f}")
+    print(f"tiny file (ms):           {measure(tiny, runs):.1f}")
+    print(f"large file (ms):          {measure(large, max(runs // 5, 1)):.1f}   ({statements} statements)")
+
+    os.remove(tiny)
+    os.remove(large)
+    os.rmdir(directory)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+# Usage: python benchmarks/strings.py [vm ...]
+# Concatenates and slices strings of 1 KB to 1 MB on every VM given and reports the throughput (MB/s)
+import os
+import sys
+import tempfile
+from common import ROOT, compile_program, run_vm
+
+SIZES = [1 << 10, 1 << 14, 1 << 17, 1 << 20]
+TOTAL_BYTES = 64 << 20 # Copied by each program, whatever the string size
+RUNS = 3
+
+# '"" + base' copies the constant "" and appends the whole string to it
+OPERATIONS = {
+    "concat": 'copy = "" + base;',
+    "slice": "length = base.slice(0, -1).size();",
+}
+
+def generate_program(filename: str, size: int, operation: str):
+    with open(filename, "w") as file:
+        file.write(f'string base = "" + "{"a" * 1024}";\nstring half = "";\n')
+        for _ in range((size // 1024).bit_length() - 1):
+            file.write('half = "" + base;\nbase = base + half;\n')
+
+        # Declared once: a declaration inside the loop would keep every copy alive
+        file.write('string copy = "";\nint length = 0;\n')
+        file.write(f"for (int i = 0; i < {TOTAL_BYTES // size}) {{\n    {OPERATIONS[operation]}\n}}\n")
+        file.write("print(copy.size() + length);\n")
+
+def main():
+    vms = [os.path.abspath(vm) for vm in sys.argv[1:]] or [os.path.join(ROOT, "vml")]
+    source = os.path.join(tempfile.gettempdir(), "bytestack_strings.lx")
+    binary = os.path.join(tempfile.gettempdir(), "bytestack_strings.o")
+
+    print(f"{'operation':<10}{'size':>10}" + "".join(f"{os.path.basename(vm):>14}" for vm in vms))
+    for operation in OPERATIONS:
+        for size in SIZES:
+            generate_program(source, size, operation)
+            compile_program(source, binary)
+            times = [min(run_vm(binary, vm)["time"] for _ in range(RUNS)) for vm in vms]
+            print(f"{operation:<10}{size // 1024:>8}KB" + "".join(f"{TOTAL_BYTES / time / (1 << 20):>14.1f}" for time in times))
+
+    os.remove(source)
+    os.remove(binary)
+
+if __name__ == "__main__":
+    main()
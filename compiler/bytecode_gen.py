@@ -1,13 +1,20 @@
+import time
+import struct
 from utils.syntax_tree import *
-from utils.utils import opcodes, built_in_funcs, operations, encode_cast_arg
+from utils.utils import opcodes, built_in_funcs, method_opcodes, operations, typed_operations, encode_cast_arg, encode_inc_arg, TYPE_IDS
+
+# Compare-and-branch forms of '<condition>; JUMP_IF' and '<condition>; NOT; JUMP_IF'
+JUMP_IF_COMPARISON = {'<': "JUMP_IF_LT", '>': "JUMP_IF_GT"}
+JUMP_IF_NOT_COMPARISON = {'<': "JUMP_IF_GE", '>': "JUMP_IF_LE"}
 
 class ByteCodeCompiler:
-    def __init__(self):
+    def __init__(self, profile: bool = False):
         self.length = 0
         self.bytecode = []
+        self.code_addresses = {} # STORE instructions whose argument is the start of a function: function name
+        self.constants = [] # (type id, number of elements, raw data), loaded by the VM as read-only heap blocks
+        self.constant_indexes = {}
 
-        self.memory = 0
-        self.identifiers = {}
         self.heap = []
         self.structs = {}
         self.table_type = {}
@@ -15,16 +22,147 @@ class ByteCodeCompiler:
         self.b_c_statement = [0, '']
         self.in_loop = True
 
+        # Node class: method that generates its instructions
+        self.handlers = {
+            BinaryExpression: self.add_binary_expression,
+            Literal: self.add_literal,
+            FunctionCall: self.add_function_call,
+            InlineCall: self.add_inline_call,
+            NewCall: self.add_new_call,
+            MemberAccess: self.add_member_access,
+            MapAccess: self.add_map_access,
+            MapLiteral: self.add_map_literal,
+            CastingExpression: self.add_casting_expression,
+            VariableDeclaration: self.add_variable_declaration,
+            FunctionDeclaration: self.add_function_declaration,
+            ClassDeclaration: self.add_class_declaration,
+            AssignmentNode: self.add_assignment,
+            IfStatement: self.add_if_statement,
+            WhileStatement: self.add_while_statement,
+            ForStatement: self.add_for_statement,
+            ReturnStatement: self.add_return_statement,
+            BreakStatement: self.add_break_statement,
+            ContinueStatement: self.add_continue_statement,
+        }
+
+        # Node class name: [nodes, seconds spent in their own instructions]
+        self.timings = {}
+        self.children_time = 0.0
+        if profile: self.add_instructions = self.add_instructions_profiled
+
     def append_bytecode(self, instruction: tuple):
         self.bytecode.append(instruction)
         self.length += 1
     
-    def generate_bytecode(self, ast: BlockNode):
+    def generate_bytecode(self, ast: BlockNode, frame_size: int = 0):
+        # Slots of the top-level code, functions reserve theirs when they are called
+        if frame_size: self.append_bytecode((opcodes["ENTER"], frame_size))
+
         for statement in ast.statements:
             self.add_instructions(statement)
 
+    def add_load(self, address: int, local: bool):
+        self.append_bytecode((opcodes["LOAD_LOCAL" if local else "LOAD"], address))
+
+    def add_store(self, address: int, local: bool):
+        self.append_bytecode((opcodes["STORE_LOCAL" if local else "STORE_MEM"], address))
+
+    def add_increment(self, address: int, local: bool, step: int):
+        # x = x + step in a single instruction, when the address and the step fit in its argument
+        if address < (1 << 24) and -128 <= step <= 127:
+            self.append_bytecode((opcodes["INC_LOCAL" if local else "INC_MEM"], encode_inc_arg(address, step)))
+            return
+
+        self.add_load(address, local)
+        self.append_bytecode((opcodes["STORE"], step))
+        self.append_bytecode((opcodes["ADD"], 0))
+        self.add_store(address, local)
+
+    def get_increment(self, node: AssignmentNode):
+        """ k when the assignment is 'x = x + k' with an int literal k, None otherwise """
+        value = node.value
+        if not isinstance(value, BinaryExpression) or value.operator != '+': return None
+
+        # BinaryExpression keeps the left operand in 'right'
+        variable, step = value.right, value.left
+        if not isinstance(variable, Literal) or variable.value_type != 'VARIABLE': return None
+        if not isinstance(step, Literal) or step.value_type != 'INT_LITERAL': return None
+        if (variable.address, variable.local) != (node.address, node.local): return None
+
+        return int(step.value)
+
+    def get_appended(self, node: AssignmentNode):
+        """ The expression appended when the assignment is 's = s + expression' on a string, None otherwise """
+        value = node.value
+        if not isinstance(value, BinaryExpression) or value.operator != '+' or value.operand_type != 'STRING': return None
+
+        variable = value.right
+        if not isinstance(variable, Literal) or variable.value_type != 'VARIABLE': return None
+        if (variable.address, variable.local) != (node.address, node.local): return None
+
+        return value.left
+
+    def add_jump_if(self, condition: ExpressionNode, negated: bool = False) -> int:
+        """ Jumps when the condition holds (or doesn't, if negated), returns the jump to patch """
+        forms = JUMP_IF_NOT_COMPARISON if negated else JUMP_IF_COMPARISON
+        if isinstance(condition, BinaryExpression) and condition.operator in forms:
+            self.add_instructions(condition.right)
+            self.add_instructions(condition.left)
+            self.append_bytecode((opcodes[forms[condition.operator]], 0))
+            return self.length - 1
+
+        self.add_instructions(condition)
+        if negated: self.append_bytecode((opcodes["NOT"], 0))
+        self.append_bytecode((opcodes["JUMP_IF"], 0))
+        return self.length - 1
+
+    def patch_jump(self, position: int, target: int):
+        self.bytecode[position] = (self.bytecode[position][0], target)
+
     def get_bytecode(self):
         return self.bytecode.copy()
+
+    def add_constant(self, data_type: str, values: list) -> int:
+        item_format = {"BOOL": "B", "INT": "I", "FLOAT": "f", "CHAR": "B", "POINTER": "I"}[data_type]
+        constant = (TYPE_IDS[data_type], len(values), struct.pack(f"{len(values)}{item_format}", *values))
+
+        if constant not in self.constant_indexes:
+            self.constant_indexes[constant] = len(self.constants)
+            self.constants.append(constant)
+
+        return self.constant_indexes[constant]
+
+    def get_constant(self, node: Literal):
+        """ Constant pool index of a string or array literal, None if it has to be built at runtime """
+        if node.value_type == 'STRING_LITERAL':
+            string = node.value.replace('\\n', '\n').replace('\\t', '\t')
+            if string == '': return None
+            return self.add_constant("CHAR", [ord(char) & 0xFF for char in string])
+
+        if '[]' not in node.value_type or not isinstance(node.value, list) or not node.value:
+            return None
+
+        data_type, values = None, []
+        for item in node.value:
+            if not isinstance(item, Literal): return None
+
+            if item.value_type == 'INT_LITERAL':
+                item_type, value = "INT", int(item.value) & 0xFFFFFFFF
+            elif item.value_type == 'FLOAT_LITERAL':
+                item_type, value = "FLOAT", item.value
+            elif item.value_type in ('BOOL_LITERAL', 'BYTE_LITERAL'):
+                item_type, value = "BOOL", int(item.value) & 0xFF
+            elif item.value_type == 'STRING_LITERAL' or '[]' in item.value_type:
+                item_type, value = "POINTER", self.get_constant(item)
+                if value is None: return None
+            else:
+                return None
+
+            if data_type not in (None, item_type): return None
+            data_type = item_type
+            values.append(value)
+
+        return self.add_constant(data_type, values)
     
     # def get_heap_relative_location(self, from_object: str, attribute: str) -> int:
     #     _info = from_object
@@ -38,297 +176,337 @@ class ByteCodeCompiler:
     #     return i
 
     def add_instructions(self, node: ASTNode):
-        if isinstance(node, BinaryExpression):
-            self.add_instructions(node.right)
-            self.add_instructions(node.left)
-            self.append_bytecode((opcodes[operations[node.operator]], 0))
-        elif isinstance(node, UnaryExpressionNode):
-            if isinstance(node, Literal):
-                if node.value_type == 'INT_LITERAL':
-                    self.append_bytecode((opcodes["STORE"],  int(node.value)))
-                elif node.value_type == 'FLOAT_LITERAL':
-                    self.append_bytecode((opcodes["STORE_FLOAT"], node.value))
-                elif node.value_type == 'BOOL_LITERAL':
-                    self.append_bytecode((opcodes["STORE_BYTE"], 1 if node.value else 0))
-                elif node.value_type == 'BYTE_LITERAL':
-                    self.append_bytecode((opcodes["STORE_BYTE"], node.value))
-                elif node.value_type == 'STRING_LITERAL':
-                    string = node.value.replace('\\n', '\n').replace('\\t', '\t')
-                    for char in string[::-1]:
-                        self.append_bytecode((opcodes["STORE_CHAR"], ord(char)))
-                    
-                    self.append_bytecode((opcodes["BUILD_LIST"], len(string)))
-                elif '[]' in node.value_type:
-                    for item in node.value[::-1]:
-                        self.add_instructions(item)
-                    
-                    self.append_bytecode((opcodes["BUILD_LIST"], len(node.value)))
-                elif node.value_type == 'VARIABLE':
-                    self.append_bytecode((opcodes["LOAD"], self.identifiers[node.value]))
-                else:
-                    raise Exception(f"Literal Node uncontrolled: {node.to_dict()}")
+        handler = self.handlers.get(type(node))
+        if handler is not None:
+            handler(node)
+        elif isinstance(node, (UnaryExpressionNode, DeclarationNode)):
+            raise Exception(f"{type(node).__name__} uncontrolled: {node.to_dict()}")
+
+    def add_instructions_profiled(self, node: ASTNode):
+        # Self time: the time spent in the children is subtracted from their parent's
+        start = time.perf_counter()
+        children_time = self.children_time
+        self.children_time = 0.0
+        ByteCodeCompiler.add_instructions(self, node)
+        elapsed = time.perf_counter() - start
+
+        counter = self.timings.setdefault(type(node).__name__, [0, 0.0])
+        counter[0] += 1
+        counter[1] += elapsed - self.children_time
+        self.children_time = children_time + elapsed
+
+    def add_binary_expression(self, node: BinaryExpression):
+        self.add_instructions(node.right)
+        self.add_instructions(node.left)
+        operation = typed_operations.get(node.operand_type, {}).get(node.operator, operations[node.operator])
+        self.append_bytecode((opcodes[operation], 0))
+
+    def add_literal(self, node: Literal):
+        value_type = node.value_type
+        if value_type == 'VARIABLE':
+            self.add_load(node.address, node.local)
+        elif value_type == 'INT_LITERAL':
+            self.append_bytecode((opcodes["STORE"],  int(node.value)))
+        elif value_type == 'FLOAT_LITERAL':
+            self.append_bytecode((opcodes["STORE_FLOAT"], node.value))
+        elif value_type == 'BOOL_LITERAL':
+            self.append_bytecode((opcodes["STORE_BYTE"], 1 if node.value else 0))
+        elif value_type == 'BYTE_LITERAL':
+            self.append_bytecode((opcodes["STORE_BYTE"], node.value))
+        elif (constant := self.get_constant(node)) is not None:
+            self.append_bytecode((opcodes["LOAD_CONST"], constant))
+        elif value_type == 'STRING_LITERAL':
+            string = node.value.replace('\\n', '\n').replace('\\t', '\t')
+            for char in string[::-1]:
+                self.append_bytecode((opcodes["STORE_CHAR"], ord(char)))
+            
+            self.append_bytecode((opcodes["BUILD_LIST"], len(string)))
+        elif '[]' in value_type:
+            for item in node.value[::-1]:
+                self.add_instructions(item)
+            
+            self.append_bytecode((opcodes["BUILD_LIST"], len(node.value)))
+        else:
+            raise Exception(f"Literal Node uncontrolled: {node.to_dict()}")
 
-            elif isinstance(node, FunctionCall):
-                for arg in node.args[::-1]:
-                    self.add_instructions(arg)
+    def add_function_call(self, node: FunctionCall):
+        for arg in node.args[::-1]:
+            self.add_instructions(arg)
 
-                if node.from_obj in self.table_type:
-                    # self.append_bytecode((opcodes["LOAD"], self.identifiers[node.from_obj]))
+        if node.from_obj in self.table_type:
+            # self.append_bytecode((opcodes["LOAD"], self.identifiers[node.from_obj]))
 
-                    # self.append_bytecode((opcodes["LOAD_HEAP"], self.get_heap_relative_location(node.from_obj, node.identifier)))
-                    # self.append_bytecode((opcodes["CALL"], -1))
-                    pass
-                else:
-                    if node.from_obj != 'System':
-                        if isinstance(node.from_obj, ASTNode):
-                            self.add_instructions(node.from_obj)
-                        else:
-                            self.append_bytecode((opcodes["LOAD"], self.identifiers[node.from_obj]))
-
-                    if node.identifier in built_in_funcs:
-                        self.append_bytecode((opcodes["SYSCALL"], built_in_funcs[node.identifier]))
-                    elif node.identifier in self.identifiers:
-                        self.append_bytecode((opcodes["CALL"], self.identifiers[node.identifier]))
-                    else: 
-                        raise Exception(f"Unfound identifier '{node.identifier}'\nIdentifiers: {self.identifiers}")
-            elif isinstance(node, NewCall):
-                for arg in node.args:
-                    self.heap.append(f"DATA-{node.struct}")
-                    self.add_instructions(arg)
-
-                self.append_bytecode((opcodes["NEW"], self.structs[node.struct][0]))
-            elif isinstance(node, MemberAccess):
-                identifier = node.object
-                load_root = True
-                if isinstance(identifier, MemberAccess):
-                    self.add_instructions(identifier)
-                    load_root = False
-                    identifier = identifier.object
-
-                if not node.list_access: # Struct Access
-                    # if load_root: self.append_bytecode((opcodes["LOAD"], self.identifiers[identifier]))
-                    # self.append_bytecode((opcodes["LOAD_HEAP"], self.get_heap_relative_location(node.object, node.attribute)))
-                    pass
-                elif isinstance(node.attribute, UnaryExpressionNode):
-                    if load_root: self.append_bytecode((opcodes["LOAD"], self.identifiers[identifier]))
-                    self.append_bytecode((opcodes["LIST_ACCESS"], node.attribute.value))
-                else:
-                    if load_root: self.append_bytecode((opcodes["LOAD"], self.identifiers[identifier]))
-                    self.add_instructions(node.attribute)
-                    self.append_bytecode((opcodes["LIST_ACCESS"], -1))
-            elif isinstance(node, CastingExpression):
-                self.add_instructions(node.expression)
-                self.append_bytecode((opcodes['CAST'], encode_cast_arg(node.old_type, node.new_type)))
-            else:
-                raise Exception(f"UnaryExpressionNode uncontrolled: {node.to_dict()}")
-
-        elif isinstance(node, DeclarationNode):
-            if isinstance(node, VariableDeclaration):
-                self.identifiers[node.identifier] = self.memory
-                self.memory += 1 if node.var_type in ('BOOL', 'CHAR') else 4
-                
-                if isinstance(node.initializer, NewCall):
-                    self.table_type[node.identifier] = node.initializer.struct
-                
-                if node.initializer == None:
-                    instruction = 'STORE' if node.var_type == 'INT' else f'STORE_{node.var_type}'
-                    if node.var_type == 'BOOL': instruction = 'STORE_BYTE'
-                    if node.var_type == 'STRING': instruction = 'BUILD_LIST'
-                    if '[]' in node.var_type: instruction = 'BUILD_LIST'
-                    
-                    self.append_bytecode((opcodes[instruction], 0))
-                else:
-                    self.add_instructions(node.initializer)
-
-                self.append_bytecode((opcodes["STORE_MEM"], -1))
-            elif isinstance(node, FunctionDeclaration):
-                func_pos = self.length
-
-                self.identifiers[node.identifier] = self.memory
-                self.memory += 4
-
-                self.append_bytecode((0, 0)) # STORE func_start_pos
-                self.append_bytecode((opcodes["STORE_MEM"], -1))
-
-                for arg in node.parameters:
-                    if arg.type in self.structs: 
-                        self.table_type[f'{node.identifier}.{arg.identifier}'] = arg.type
-
-                    self.identifiers[f'{node.identifier}.{arg.identifier}'] = self.memory
-                    self.memory += 1 if arg.type in ('BOOL', 'CHAR') else 4
-
-                    self.append_bytecode((opcodes["STORE"], 0))
-                    self.append_bytecode((opcodes["STORE_MEM"], -1))
-                
-                jump_pos = self.length
-                self.append_bytecode((0, 0)) # JUMP x
-
-                self.bytecode[func_pos] = (opcodes["STORE"], self.length)
-
-                for arg in node.parameters:
-                    self.append_bytecode((opcodes["STORE_MEM"], self.identifiers[f'{node.identifier}.{arg.identifier}']))
-
-                self.generate_bytecode(node.body)
-
-                if self.bytecode[-1][0] != opcodes["RETURN"]:
-                    self.append_bytecode((opcodes["RETURN"], 0))
-
-                self.bytecode[jump_pos] = ((opcodes["JUMP"], self.length))
-            elif isinstance(node, ClassDeclaration):
-                self.structs[node.identifier] = [
-                    len(self.heap), len(node.attributes), [arg.identifier for arg in node.attributes]
-                ]
-
-                self.heap.append(f"OBJ-{node.identifier}")
-
-                aux = {"INT" : 1, "FLOAT" : 2, "ARRAY" : 4, "OBJ": 5}
-                for arg in node.attributes:
-                    if arg.type == "BOOL":
-                        arg.type = "INT"
-                    elif arg.type == "STRING" or "[]" in arg.type:
-                        arg.type = "ARRAY"
-                    
-                    if arg.type not in aux:
-                        arg.type = "OBJ"
-                    
-                    self.heap.append(f"PARAM-{aux[arg.type]}-{node.identifier}")
-                    self.append_bytecode((opcodes["STORE"], aux[arg.type]))
-                
-                self.append_bytecode((opcodes["DEFINE_TYPE"], len(node.attributes)))
+            # self.append_bytecode((opcodes["LOAD_HEAP"], self.get_heap_relative_location(node.from_obj, node.identifier)))
+            # self.append_bytecode((opcodes["CALL"], -1))
+            return
+
+        if node.from_obj != 'System':
+            if isinstance(node.from_obj, ASTNode):
+                self.add_instructions(node.from_obj)
             else:
-                raise Exception(f'DeclarationNode uncontrolled: {node.to_dict()}')
-        
-        elif isinstance(node, AssignmentNode):
-            self.add_instructions(node.value)
-
-            if isinstance(node.identifier, MemberAccess):
-                if not node.identifier.list_access: # Struct
-                    # self.append_bytecode((opcodes["LOAD"], self.identifiers[node.identifier.object]))
-                    # self.append_bytecode((opcodes["STORE_HEAP"], self.get_heap_relative_location(node.identifier.object, node.identifier.attribute)))
-                    pass
-                else: # List access
-                    list_set = []
-                    identifier = node.identifier.object
-                    while isinstance(identifier, MemberAccess) and identifier.list_access:
-                        list_set.append(identifier.attribute)
-                        identifier = identifier.object
-
-                    self.append_bytecode((opcodes["LOAD"], self.identifiers[identifier]))
-                    
-                    for setter in list_set:
-                        if isinstance(setter, Literal) and setter.value_type != 'VARIABLE':
-                            self.append_bytecode((opcodes["LIST_ACCESS"], setter.value))
-                        else:
-                            self.add_instructions(setter)
-                            self.append_bytecode((opcodes["LIST_ACCESS"], -1))
-                    
-                    if isinstance(node.identifier.attribute, Literal) and node.identifier.attribute.value_type != "VARIABLE":
-                        self.append_bytecode((opcodes["LIST_SET"], node.identifier.attribute.value))
+                self.add_load(node.object_address, node.object_local)
+
+        if node.identifier in method_opcodes:
+            self.append_bytecode((opcodes[method_opcodes[node.identifier]], 0))
+        elif node.identifier in built_in_funcs:
+            self.append_bytecode((opcodes["SYSCALL"], built_in_funcs[node.identifier]))
+        else:
+            if node.local:
+                self.add_load(node.address, True)
+            self.append_bytecode((opcodes["CALL"], -1 if node.local else node.address))
+
+    def add_inline_call(self, node: InlineCall):
+        # Same evaluation order as CALL: the arguments are pushed in reverse and the
+        # function stores its parameters, but the expression is evaluated right here.
+        # Parameters without address read the argument's variable directly
+        bound = [(param, arg) for param, arg in zip(node.parameters, node.args) if param.address is not None]
+        for _, arg in bound[::-1]:
+            self.add_instructions(arg)
+
+        for param, _ in bound:
+            self.append_bytecode((opcodes["STORE_LOCAL"], param.address))
+
+        self.add_instructions(node.expression)
+
+    def add_new_call(self, node: NewCall):
+        for arg in node.args:
+            self.heap.append(f"DATA-{node.struct}")
+            self.add_instructions(arg)
+
+        self.append_bytecode((opcodes["NEW"], self.structs[node.struct][0]))
+
+    def add_member_access(self, node: MemberAccess):
+        load_root = not isinstance(node.object, MemberAccess)
+        if not load_root:
+            self.add_instructions(node.object)
+
+        if not node.list_access: # Struct Access
+            # if load_root: self.append_bytecode((opcodes["LOAD"], node.address))
+            # self.append_bytecode((opcodes["LOAD_HEAP"], self.get_heap_relative_location(node.object, node.attribute)))
+            pass
+        elif isinstance(node.attribute, Literal) and node.attribute.value_type != 'VARIABLE':
+            if load_root: self.add_load(node.address, node.local)
+            self.append_bytecode((opcodes["LIST_ACCESS"], node.attribute.value))
+        else:
+            if load_root: self.add_load(node.address, node.local)
+            self.add_instructions(node.attribute)
+            self.append_bytecode((opcodes["LIST_ACCESS"], -1))
+
+    def add_map_access(self, node: MapAccess):
+        # The map goes on top of the key
+        self.add_instructions(node.attribute)
+        self.add_load(node.address, node.local)
+        self.append_bytecode((opcodes["MAP_GET"], 0))
+
+    def add_map_literal(self, node: MapLiteral):
+        # Same order as BUILD_LIST: the first pair ends on top, its key over its value
+        for key, value in zip(node.keys[::-1], node.values[::-1]):
+            self.add_instructions(value)
+            self.add_instructions(key)
+
+        self.append_bytecode((opcodes["BUILD_MAP"], len(node.keys)))
+
+    def add_casting_expression(self, node: CastingExpression):
+        self.add_instructions(node.expression)
+        self.append_bytecode((opcodes['CAST'], encode_cast_arg(node.old_type, node.new_type)))
+
+    def add_variable_declaration(self, node: VariableDeclaration):
+        if isinstance(node.initializer, NewCall):
+            self.table_type[node.identifier] = node.initializer.struct
+
+        if node.initializer == None:
+            instruction = 'STORE' if node.var_type == 'INT' else f'STORE_{node.var_type}'
+            if node.var_type == 'BOOL': instruction = 'STORE_BYTE'
+            if node.var_type == 'STRING': instruction = 'BUILD_LIST'
+            if '[]' in node.var_type: instruction = 'BUILD_LIST'
+            if node.var_type.startswith('MAP') and node.var_type.endswith('>'): instruction = 'BUILD_MAP'
+
+            self.append_bytecode((opcodes[instruction], 0))
+        else:
+            self.add_instructions(node.initializer)
+
+        self.add_store(node.address if node.local else -1, node.local)
+
+    def add_function_declaration(self, node: FunctionDeclaration):
+        func_pos = self.length
+
+        self.append_bytecode((0, 0)) # STORE func_start_pos
+        self.add_store(node.address if node.local else -1, node.local)
+
+        for arg in node.parameters:
+            if arg.type in self.structs: 
+                self.table_type[arg.identifier] = arg.type
+
+        jump_pos = self.length
+        self.append_bytecode((0, 0)) # JUMP x
+
+        self.bytecode[func_pos] = (opcodes["STORE"], self.length)
+        self.code_addresses[func_pos] = node.identifier
+
+        # Every call gets its own frame, the arguments are its first slots
+        self.append_bytecode((opcodes["ENTER"], node.frame_size))
+        for arg in node.parameters:
+            self.append_bytecode((opcodes["STORE_LOCAL"], arg.address))
+
+        self.generate_bytecode(node.body)
+
+        if self.bytecode[-1][0] != opcodes["RETURN"]:
+            self.append_bytecode((opcodes["RETURN"], 0))
+
+        self.bytecode[jump_pos] = ((opcodes["JUMP"], self.length))
+
+    def add_class_declaration(self, node: ClassDeclaration):
+        self.structs[node.identifier] = [
+            len(self.heap), len(node.attributes), [arg.identifier for arg in node.attributes]
+        ]
+
+        self.heap.append(f"OBJ-{node.identifier}")
+
+        aux = {"INT" : 1, "FLOAT" : 2, "ARRAY" : 4, "OBJ": 5}
+        for arg in node.attributes:
+            if arg.type == "BOOL":
+                arg.type = "INT"
+            elif arg.type == "STRING" or "[]" in arg.type:
+                arg.type = "ARRAY"
+
+            if arg.type not in aux:
+                arg.type = "OBJ"
+
+            self.heap.append(f"PARAM-{aux[arg.type]}-{node.identifier}")
+            self.append_bytecode((opcodes["STORE"], aux[arg.type]))
+
+        self.append_bytecode((opcodes["DEFINE_TYPE"], len(node.attributes)))
+
+    def add_assignment(self, node: AssignmentNode):
+        if not isinstance(node.identifier, MemberAccess) and (step := self.get_increment(node)) is not None:
+            self.add_increment(node.address, node.local, step)
+            return
+
+        # The VM grows the string in place instead of copying it, see APPEND_MEM
+        if not isinstance(node.identifier, MemberAccess) and (appended := self.get_appended(node)) is not None:
+            self.add_instructions(appended)
+            self.append_bytecode((opcodes["APPEND_LOCAL" if node.local else "APPEND_MEM"], node.address))
+            return
+
+        self.add_instructions(node.value)
+
+        if isinstance(node.identifier, MapAccess):
+            self.add_instructions(node.identifier.attribute)
+            self.add_load(node.identifier.address, node.identifier.local)
+            self.append_bytecode((opcodes["MAP_SET"], 0))
+        elif isinstance(node.identifier, MemberAccess):
+            if not node.identifier.list_access: # Struct
+                # self.append_bytecode((opcodes["LOAD"], self.identifiers[node.identifier.object]))
+                # self.append_bytecode((opcodes["STORE_HEAP"], self.get_heap_relative_location(node.identifier.object, node.identifier.attribute)))
+                pass
+            else: # List access
+                list_set = []
+                root = node.identifier
+                while isinstance(root.object, MemberAccess) and root.object.list_access:
+                    root = root.object
+                    list_set.append(root.attribute)
+
+                self.add_load(root.address, root.local)
+
+                for setter in list_set:
+                    if isinstance(setter, Literal) and setter.value_type != 'VARIABLE':
+                        self.append_bytecode((opcodes["LIST_ACCESS"], setter.value))
                     else:
-                        self.add_instructions(node.identifier.attribute)
-                        self.append_bytecode((opcodes["LIST_SET"], -1))
-            else:
-                self.append_bytecode((opcodes["STORE_MEM"], self.identifiers[node.identifier]))
-        
-        elif isinstance(node, IfStatement):
-            self.add_instructions(node.condition)
-            # self.append_bytecode((opcodes["CREATE_SCOPE"], 0))
-            if_instruction = self.length
-            self.append_bytecode(["To replace IF"])
-
-            elif_instructions = []
-            for elif_statement in node.elif_statements:
-                self.add_instructions(elif_statement.condition)
-                elif_instructions.append(self.length)
-                self.append_bytecode(["To replace ELIF START"])
-            
-            if node.else_block:
-                self.generate_bytecode(node.else_block)
+                        self.add_instructions(setter)
+                        self.append_bytecode((opcodes["LIST_ACCESS"], -1))
 
-            self.append_bytecode(["To replace ELSE"])
-    
-            else_instruction = self.length - 1
-            for i in range(len(elif_instructions)):
-                self.generate_bytecode(node.elif_statements[i].then_block)
-                ins = self.length
-                self.bytecode[elif_instructions[i]] = (opcodes["JUMP_IF"], ins)
-                elif_instructions[i] = self.length
-                self.append_bytecode(["To replace ELIF END"])
-    
-            self.bytecode[if_instruction] = (opcodes["JUMP_IF"], self.length)
-            self.generate_bytecode(node.then_block)
-            end_if_pos = self.length
-            
-            self.bytecode[else_instruction] = (opcodes["JUMP"], end_if_pos)
-
-            for elif_instruction in elif_instructions:
-                self.bytecode[elif_instruction] = (opcodes["JUMP"], end_if_pos)
-
-        elif isinstance(node, WhileStatement):
-            self.in_loop = True
-            # self.append_bytecode((opcodes["CREATE_SCOPE"], 0))
-            while_condition = self.length
-            self.loop_condition = while_condition
-            self.add_instructions(node.condition)
-            self.append_bytecode((opcodes["NOT"], 0))
-            while_check = self.length
-            self.append_bytecode((opcodes["JUMP_IF"]))
-            self.generate_bytecode(node.body)
-
-            if 'Continue' in self.b_c_statement: 
-                self.bytecode[self.b_c_statement[0]] = (opcodes["JUMP"], self.length)
-                self.b_c_statement = [0, '']
-
-            self.append_bytecode((opcodes["JUMP"], while_condition))
-            self.bytecode[while_check] = (self.bytecode[while_check], self.length)
-
-            if 'Break' in self.b_c_statement: 
-                self.bytecode[self.b_c_statement[0]] = (opcodes["JUMP"], self.length)
-                self.b_c_statement = [0, '']
-
-            self.in_loop = False
-
-        elif isinstance(node, ForStatement):
-            self.in_loop = True
-            # self.append_bytecode((opcodes["CREATE_SCOPE"], 0))
-            self.add_instructions(node.variable)
-            for_condition = self.length
-            self.loop_condition = for_condition
-            self.add_instructions(node.condition)
-            self.append_bytecode((opcodes["NOT"], 0))
-            for_check = self.length
-            self.append_bytecode((opcodes["JUMP_IF"]))
-            self.generate_bytecode(node.body)
-
-            if 'Continue' in self.b_c_statement: 
-                self.bytecode[self.b_c_statement[0]] = (opcodes["JUMP"], self.length)
-                self.b_c_statement = [0, '']
-
-            self.append_bytecode((opcodes["LOAD"], self.identifiers[node.variable.identifier]))
-            self.append_bytecode((opcodes["STORE"], 1))
-            self.append_bytecode((opcodes["ADD"], 0))
-            self.append_bytecode((opcodes["STORE_MEM"], self.identifiers[node.variable.identifier]))
-            self.append_bytecode((opcodes["JUMP"], for_condition))
-            self.bytecode[for_check] = (self.bytecode[for_check], self.length)
-
-            if 'Break' in self.b_c_statement: 
-                self.bytecode[self.b_c_statement[0]] = (opcodes["JUMP"], self.length)
-                self.b_c_statement = [0, '']
-
-            self.in_loop = False
-        
-        elif isinstance(node, ReturnStatement):
-            self.add_instructions(node.expression)
-            self.append_bytecode((opcodes["RETURN"], 0))
+                if isinstance(node.identifier.attribute, Literal) and node.identifier.attribute.value_type != "VARIABLE":
+                    self.append_bytecode((opcodes["LIST_SET"], node.identifier.attribute.value))
+                else:
+                    self.add_instructions(node.identifier.attribute)
+                    self.append_bytecode((opcodes["LIST_SET"], -1))
+        else:
+            self.add_store(node.address, node.local)
+
+    def add_if_statement(self, node: IfStatement):
+        # self.append_bytecode((opcodes["CREATE_SCOPE"], 0))
+        if_instruction = self.add_jump_if(node.condition)
+
+        elif_instructions = []
+        for elif_statement in node.elif_statements:
+            elif_instructions.append(self.add_jump_if(elif_statement.condition))
 
-        elif isinstance(node, BreakStatement):
-            if self.in_loop:
-                self.b_c_statement = [self.length, 'Break']
-                self.append_bytecode(0)
-
-        elif isinstance(node, ContinueStatement):
-            if self.in_loop:
-                self.b_c_statement = [self.length, 'Continue']
-                self.append_bytecode(0)
-        # else:
-        #     raise Exception(f"ASTNode uncontrolled: {node}")
+        if node.else_block:
+            self.generate_bytecode(node.else_block)
+
+        self.append_bytecode(["To replace ELSE"])
+
+        else_instruction = self.length - 1
+        for i in range(len(elif_instructions)):
+            self.generate_bytecode(node.elif_statements[i].then_block)
+            ins = self.length
+            self.patch_jump(elif_instructions[i], ins)
+            elif_instructions[i] = self.length
+            self.append_bytecode(["To replace ELIF END"])
+
+        self.patch_jump(if_instruction, self.length)
+        self.generate_bytecode(node.then_block)
+        end_if_pos = self.length
+
+        self.bytecode[else_instruction] = (opcodes["JUMP"], end_if_pos)
+
+        for elif_instruction in elif_instructions:
+            self.bytecode[elif_instruction] = (opcodes["JUMP"], end_if_pos)
+
+    def add_while_statement(self, node: WhileStatement):
+        self.in_loop = True
+        # self.append_bytecode((opcodes["CREATE_SCOPE"], 0))
+        while_condition = self.length
+        self.loop_condition = while_condition
+        while_check = self.add_jump_if(node.condition, negated=True)
+        self.generate_bytecode(node.body)
+
+        if 'Continue' in self.b_c_statement: 
+            self.bytecode[self.b_c_statement[0]] = (opcodes["JUMP"], self.length)
+            self.b_c_statement = [0, '']
+
+        self.append_bytecode((opcodes["JUMP"], while_condition))
+        self.patch_jump(while_check, self.length)
+
+        if 'Break' in self.b_c_statement: 
+            self.bytecode[self.b_c_statement[0]] = (opcodes["JUMP"], self.length)
+            self.b_c_statement = [0, '']
+
+        self.in_loop = False
+
+    def add_for_statement(self, node: ForStatement):
+        self.in_loop = True
+        # self.append_bytecode((opcodes["CREATE_SCOPE"], 0))
+        self.add_instructions(node.variable)
+        for_condition = self.length
+        self.loop_condition = for_condition
+        for_check = self.add_jump_if(node.condition, negated=True)
+        self.generate_bytecode(node.body)
+
+        if 'Continue' in self.b_c_statement: 
+            self.bytecode[self.b_c_statement[0]] = (opcodes["JUMP"], self.length)
+            self.b_c_statement = [0, '']
+
+        self.add_increment(node.variable.address, node.variable.local, 1)
+        self.append_bytecode((opcodes["JUMP"], for_condition))
+        self.patch_jump(for_check, self.length)
+
+        if 'Break' in self.b_c_statement: 
+            self.bytecode[self.b_c_statement[0]] = (opcodes["JUMP"], self.length)
+            self.b_c_statement = [0, '']
+
+        self.in_loop = False
+
+    def add_return_statement(self, node: ReturnStatement):
+        self.add_instructions(node.expression)
+        self.append_bytecode((opcodes["RETURN"], 0))
+
+    def add_break_statement(self, node: BreakStatement):
+        if self.in_loop:
+            self.b_c_statement = [self.length, 'Break']
+            self.append_bytecode(0)
+
+    def add_continue_statement(self, node: ContinueStatement):
+        if self.in_loop:
+            self.b_c_statement = [self.length, 'Continue']
+            self.append_bytecode(0)
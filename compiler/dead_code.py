@@ -0,0 +1,142 @@
+from utils.syntax_tree import *
+from optimizer import is_constant, to_word
+
+TERMINATORS = (ReturnStatement, BreakStatement, ContinueStatement)
+
+class DeadCodeEliminator:
+    """
+    AST pass run after the Optimizer (-O flag), once the constant conditions are folded:
+        statements after a return, break or continue  -> removed
+        if/elif/while/for with a constant condition    -> only the reachable branches are kept
+        functions not reachable from the program       -> removed
+    A function is reachable when its name is used by the top-level statements or
+    by a reachable function, so unused recursive functions are removed as well.
+    """
+    def __init__(self):
+        self.removed_statements = 0
+        self.removed_functions = []
+
+    def eliminate(self, ast: BlockNode) -> BlockNode:
+        ast.statements = self.visit_statements(ast.statements)
+
+        functions = {}
+        names = set()
+        for statement in ast.statements:
+            self.collect_names(statement, names, functions)
+
+        used = set()
+        pending = [name for name in names if name in functions]
+        while pending:
+            name = pending.pop()
+            if name in used: continue
+            used.add(name)
+            pending.extend(called for called in functions[name] if called in functions)
+
+        self.remove_functions(ast, used)
+        return ast
+
+    def visit_statements(self, statements: list) -> list:
+        result = []
+        for i, statement in enumerate(statements):
+            kept = self.visit(statement)
+            result.extend(kept)
+            if kept and isinstance(kept[-1], TERMINATORS):
+                self.removed_statements += len(statements) - i - 1
+                break
+
+        return result
+
+    def visit_block(self, block: BlockNode) -> BlockNode:
+        block.statements = self.visit_statements(block.statements)
+        return block
+
+    def visit(self, node: ASTNode) -> list:
+        """ Statements replacing node """
+        if isinstance(node, IfStatement):
+            return self.visit_if(node)
+        elif isinstance(node, WhileStatement):
+            if is_false(node.condition):
+                self.removed_statements += 1
+                return []
+            node.body = self.visit_block(node.body)
+        elif isinstance(node, ForStatement):
+            initializer = node.variable.initializer
+            if is_false(node.condition) and (initializer is None or is_constant(initializer)):
+                self.removed_statements += 1
+                return []
+            node.body = self.visit_block(node.body)
+        elif isinstance(node, FunctionDeclaration):
+            node.body = self.visit_block(node.body)
+        elif isinstance(node, BlockNode):
+            return [self.visit_block(node)]
+
+        return [node]
+
+    def visit_if(self, node: IfStatement) -> list:
+        else_block = self.visit_block(node.else_block) if node.else_block else None
+        branches = []
+        candidates = [node] + node.elif_statements
+        for i, branch in enumerate(candidates):
+            branch.then_block = self.visit_block(branch.then_block)
+            if is_false(branch.condition):
+                self.removed_statements += len(branch.then_block.statements)
+            elif is_true(branch.condition):
+                # Taken whenever it is reached: the following branches are dead
+                for skipped in [c.then_block for c in candidates[i + 1:]] + [else_block]:
+                    if skipped: self.removed_statements += len(skipped.statements)
+                else_block = branch.then_block
+                break
+            else:
+                branches.append(branch)
+
+        if not branches:
+            if else_block is None:
+                self.removed_statements += 1
+                return []
+            return self.inline_block(else_block)
+
+        node.condition, node.then_block = branches[0].condition, branches[0].then_block
+        node.elif_statements = branches[1:]
+        node.else_block = else_block
+        return [node]
+
+    def inline_block(self, block: BlockNode) -> list:
+        # Declarations would leak out of the block's scope
+        if any(isinstance(statement, DeclarationNode) for statement in block.statements):
+            return [IfStatement(Literal('BOOL_LITERAL', True), block)]
+
+        return block.statements
+
+    def collect_names(self, node: ASTNode, names: set, functions: dict):
+        """ Adds the identifiers used by node to 'names', those used by the functions declared in it go to 'functions' """
+        if isinstance(node, FunctionDeclaration):
+            self.collect_names(node.body, functions.setdefault(node.identifier, set()), functions)
+            return
+
+        if isinstance(node, FunctionCall):
+            names.add(node.identifier)
+        elif isinstance(node, Literal) and node.value_type == 'VARIABLE':
+            names.add(node.value)
+
+        for child in node.children():
+            self.collect_names(child, names, functions)
+
+    def remove_functions(self, node: ASTNode, used: set):
+        if isinstance(node, BlockNode):
+            statements = []
+            for statement in node.statements:
+                if isinstance(statement, FunctionDeclaration) and statement.identifier not in used:
+                    self.removed_functions.append(statement.identifier)
+                else:
+                    statements.append(statement)
+            node.statements = statements
+
+        for child in node.children():
+            if isinstance(child, (StatementNode, DeclarationNode, BlockNode)):
+                self.remove_functions(child, used)
+
+def is_true(condition: ExpressionNode) -> bool:
+    return is_constant(condition) and condition.value_type != 'STRING_LITERAL' and to_word(condition) != 0
+
+def is_false(condition: ExpressionNode) -> bool:
+    return is_constant(condition) and condition.value_type != 'STRING_LITERAL' and to_word(condition) == 0
@@ -0,0 +1,118 @@
+import copy
+from utils.syntax_tree import *
+from utils.utils import built_in_funcs, method_opcodes
+from optimizer import Optimizer
+
+INLINE_THRESHOLD = 16 # Maximum number of nodes of the returned expression
+
+class Inliner:
+    """
+    AST pass run after the Optimizer (-O flag): replaces the calls to small leaf
+    functions (a single 'return expression;' that calls no other function) by an
+    InlineCall, which binds the arguments to slots of the caller's frame and
+    evaluates a copy of the expression in place of CALL, ENTER and RETURN.
+    Number literals passed as arguments are substituted in the expression, which
+    is folded again. Functions declared with 'noinline' are always called.
+    """
+    def __init__(self, threshold: int = INLINE_THRESHOLD):
+        self.threshold = threshold
+        self.functions = {}
+        self.inlined = 0
+        self.optimizer = Optimizer()
+
+    def inline(self, ast: BlockNode) -> BlockNode:
+        declarations = {}
+        self.collect_functions(ast, declarations)
+        self.functions = {
+            name: functions[0] for name, functions in declarations.items()
+            if len(functions) == 1 and self.is_inlinable(functions[0])
+        }
+
+        if self.functions:
+            self.visit(ast)
+
+        return ast
+
+    def collect_functions(self, node: ASTNode, declarations: dict):
+        if isinstance(node, FunctionDeclaration):
+            declarations.setdefault(node.identifier, []).append(node)
+
+        for child in node.children():
+            if isinstance(child, (StatementNode, DeclarationNode, BlockNode)):
+                self.collect_functions(child, declarations)
+
+    def is_inlinable(self, node: FunctionDeclaration) -> bool:
+        statements = node.body.statements
+        if not node.inline or len(statements) != 1: return False
+        if not isinstance(statements[0], ReturnStatement) or statements[0].expression is None: return False
+
+        return count_nodes(statements[0].expression, self.threshold) <= self.threshold
+
+    def visit(self, node: ASTNode):
+        transform(node, self.replace)
+
+    def replace(self, node: ASTNode) -> ASTNode:
+        self.visit(node)
+
+        is_plain_call = isinstance(node, FunctionCall) and node.from_obj == 'System'
+        if not is_plain_call or node.identifier not in self.functions:
+            return node
+
+        function = self.functions[node.identifier]
+        expression = copy.deepcopy(function.body.statements[0].expression)
+        objects = get_object_names(expression)
+
+        args, parameters, constants = [], [], {}
+        for param, arg in zip(function.parameters, node.args):
+            if is_number(arg) and param.identifier not in objects:
+                constants[param.identifier] = arg
+            else:
+                args.append(arg)
+                parameters.append(ParameterNode(param.type, param.identifier))
+
+        if constants:
+            expression = self.substitute(expression, constants)
+            expression = self.optimizer.visit(expression)
+
+        self.inlined += 1
+        return InlineCall(node.identifier, args, parameters, expression)
+
+    def substitute(self, node: ASTNode, constants: dict) -> ASTNode:
+        if isinstance(node, Literal) and node.value_type == 'VARIABLE' and node.value in constants:
+            return copy.copy(constants[node.value])
+
+        transform(node, lambda child: self.substitute(child, constants))
+        return node
+
+def transform(node: ASTNode, replace):
+    """ Replaces every child of node by replace(child) """
+    for field in node.fields():
+        value = getattr(node, field, None)
+        if isinstance(value, ASTNode):
+            setattr(node, field, replace(value))
+        elif isinstance(value, list):
+            setattr(node, field, [replace(item) if isinstance(item, ASTNode) else item for item in value])
+
+def is_number(node: ASTNode) -> bool:
+    return isinstance(node, Literal) and node.value_type in ('INT_LITERAL', 'FLOAT_LITERAL', 'BOOL_LITERAL', 'BYTE_LITERAL')
+
+def get_object_names(node: ASTNode) -> set:
+    """ Identifiers used as objects (x.size(), x[0]), which a literal can't replace """
+    names = set()
+    if isinstance(node, FunctionCall) and isinstance(node.from_obj, str):
+        names.add(node.from_obj)
+    elif isinstance(node, MemberAccess) and isinstance(node.object, str):
+        names.add(node.object)
+
+    for child in node.children():
+        names |= get_object_names(child)
+
+    return names
+
+def count_nodes(node: ASTNode, limit: int) -> int:
+    """ Size of the expression, more than limit as soon as a non built-in function is called """
+    identifier = getattr(node, 'identifier', None)
+    if isinstance(node, (FunctionCall, NewCall)) and identifier not in built_in_funcs and identifier not in method_opcodes:
+        return limit + 1
+
+    return 1 + sum(count_nodes(child, limit) for child in node.children())
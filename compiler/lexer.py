@@ -1,10 +1,10 @@
-import ply.lex as lex
+import re
 
 tokens = [
     'INT_LITERAL', 'FLOAT_LITERAL', 'STRING_LITERAL', 'BOOL_LITERAL',
     'IDENTIFIER', 'PLUS', 'MINUS', 'MULTIPLY', 'DIVIDE', 'MOD', 'POW',
     'LPAREN', 'RPAREN', 'LBRACE', 'RBRACE', 'ASSIGN', 'SEMICOLON',
-    'COMMA', 'EQ', 'NEQ', 'LT', 'GT', 'LE', 'GE',
+    'COMMA', 'COLON', 'EQ', 'NEQ', 'LT', 'GT', 'LE', 'GE',
     'START_LIST', 'END_LIST', 'EMPTY_ARR', 'POINT', 'RET'
 ]
 
@@ -16,6 +16,7 @@ keywords = {
     'for'       : 'FOR',
     'return'    : 'RETURN',
     'func'      : 'FUNC',
+    'noinline'  : 'NOINLINE',
     'try'       : 'TRY',
     'catch'     : 'CATCH',
     'throw'     : 'THROW',
@@ -33,6 +34,7 @@ keywords = {
     'or'        : 'OR',
     'not'       : 'NOT',
     'Array'     : 'ARRAY',
+    'Map'       : 'MAP',
     'struct'    : 'STRUCT',
     'continue'  : 'CONTINUE',
     'break'     : 'BREAK',
@@ -40,75 +42,128 @@ keywords = {
 
 tokens += list(keywords.values())
 
-t_CONTINUE = r'continue'
-t_BREAK = r'break'
-t_RET = r'->'
-t_PLUS = r'\+'
-t_MINUS = r'-'
-t_MULTIPLY = r'\*'
-t_DIVIDE = r'/'
-t_MOD = r'\%'
-t_POW = r'\^'
-t_LPAREN = r'\('
-t_RPAREN = r'\)'
-t_EMPTY_ARR = r'\[\]'
-t_START_LIST = r'\['
-t_END_LIST = r'\]'
-t_LBRACE = r'\{'
-t_RBRACE = r'\}'
-t_ASSIGN = r'='
-t_SEMICOLON = r';'
-t_COMMA = r','
-
-t_EQ = r'=='
-t_NEQ = r'!='
-t_LT = r'<'
-t_GT = r'>'
-t_LE = r'<='
-t_GE = r'>='
-t_POINT = r'.'
-
-def t_FLOAT_LITERAL(t):
-    r'-?\d+\.\d+'
-    t.value = float(t.value)
-    return t
-
-def t_INT_LITERAL(t):
-    r'-?\d+'
-    t.value = int(t.value)
-    return t
-
-def t_STRING_LITERAL(t):
-    r'\"([^\\\n]|(\\.))*?\"'
-    t.value = t.value[1:-1]
-    return t
-
-def t_BOOL_LITERAL(t):
-    r'\b(true|false)\b'
-    t.value = True if t.value == 'true' else False
-    return t
-
-def t_comment_singleline(t):
-    r'//.*'
-    pass
-
-def t_comment_multiline(t):
-    r'/\*[^*]*\*+(?:[^/*][^*]*\*+)*/'
-    pass
-
-def t_IDENTIFIER(t):
-    r'[a-zA-Z_][a-zA-Z0-9_]*'
-    t.type = keywords.get(t.value, 'IDENTIFIER')
-    return t
-
-t_ignore = ' \t'
-
-def t_newline(t):
-    r'\n+'
-    t.lexer.lineno += len(t.value)
-
-def t_error(t):
-    print(f"Caracter ilegal '{t.value[0]}' en línea {t.lexer.lineno}")
-    t.lexer.skip(1)
-
-lexer = lex.lex()
\ No newline at end of file
+# Same rules, in the same order of priority, as the PLY specification this
+# scanner replaces: the first alternative that matches wins. Building the
+# PLY lexer at import time (and importing PLY itself) used to dominate the
+# startup time of every compiler invocation.
+rules = [
+    ('FLOAT_LITERAL',       r'-?\d+\.\d+'),
+    ('INT_LITERAL',         r'-?\d+'),
+    ('STRING_LITERAL',      r'\"(?:[^\\\n]|(?:\\.))*?\"'),
+    ('BOOL_LITERAL',        r'\b(?:true|false)\b'),
+    ('comment_singleline',  r'//.*'),
+    ('comment_multiline',   r'/\*[^*]*\*+(?:[^/*][^*]*\*+)*/'),
+    ('IDENTIFIER',          r'[a-zA-Z_][a-zA-Z0-9_]*'),
+    ('newline',             r'\n+'),
+    ('CONTINUE',            r'continue'),
+    ('BREAK',               r'break'),
+    ('EMPTY_ARR',           r'\[\]'),
+    ('RET',                 r'->'),
+    ('PLUS',                r'\+'),
+    ('MULTIPLY',            r'\*'),
+    ('MOD',                 r'\%'),
+    ('POW',                 r'\^'),
+    ('LPAREN',              r'\('),
+    ('RPAREN',              r'\)'),
+    ('START_LIST',          r'\['),
+    ('END_LIST',            r'\]'),
+    ('LBRACE',              r'\{'),
+    ('RBRACE',              r'\}'),
+    ('EQ',                  r'=='),
+    ('NEQ',                 r'!='),
+    ('LE',                  r'<='),
+    ('GE',                  r'>='),
+    ('MINUS',               r'-'),
+    ('DIVIDE',              r'/'),
+    ('ASSIGN',              r'='),
+    ('SEMICOLON',           r';'),
+    ('COMMA',               r','),
+    ('COLON',               r':'),
+    ('LT',                  r'<'),
+    ('GT',                  r'>'),
+    ('POINT',               r'.'),
+]
+
+master_regex = re.compile('|'.join(f'(?P<{name}>{regex})' for name, regex in rules))
+
+ignore = ' \t'
+
+class LexToken:
+    __slots__ = ('type', 'value', 'lineno', 'lexpos')
+
+    def __init__(self, type: str, value, lineno: int, lexpos: int):
+        self.type = type
+        self.value = value
+        self.lineno = lineno
+        self.lexpos = lexpos
+
+    def __repr__(self):
+        return f"LexToken({self.type},{self.value!r},{self.lineno},{self.lexpos})"
+
+class Lexer:
+    """ Single-pass scanner with the interface of a PLY lexer: input(), token() and iteration """
+    def __init__(self):
+        self.input('')
+
+    def input(self, data: str):
+        self.lexdata = data
+        self.lexpos = 0
+        self.lineno = 1
+
+    def token(self):
+        data = self.lexdata
+        length = len(data)
+        position = self.lexpos
+        match = master_regex.match
+
+        while position < length:
+            if data[position] in ignore:
+                position += 1
+                continue
+
+            found = match(data, position)
+            if found is None:
+                print(f"Caracter ilegal '{data[position]}' en línea {self.lineno}")
+                position += 1
+                continue
+
+            kind = found.lastgroup
+            value = found.group()
+            end = found.end()
+
+            if kind == 'newline':
+                self.lineno += len(value)
+            elif kind == 'IDENTIFIER':
+                self.lexpos = end
+                return LexToken(keywords.get(value, 'IDENTIFIER'), value, self.lineno, position)
+            elif kind == 'INT_LITERAL':
+                self.lexpos = end
+                return LexToken(kind, int(value), self.lineno, position)
+            elif kind == 'FLOAT_LITERAL':
+                self.lexpos = end
+                return LexToken(kind, float(value), self.lineno, position)
+            elif kind == 'STRING_LITERAL':
+                self.lexpos = end
+                return LexToken(kind, value[1:-1], self.lineno, position)
+            elif kind == 'BOOL_LITERAL':
+                self.lexpos = end
+                return LexToken(kind, value == 'true', self.lineno, position)
+            elif kind not in ('comment_singleline', 'comment_multiline'):
+                self.lexpos = end
+                return LexToken(kind, value, self.lineno, position)
+
+            position = end
+
+        self.lexpos = position
+        return None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        token = self.token()
+        if token is None:
+            raise StopIteration
+        return token
+
+lexer = Lexer()
@@ -1,36 +1,113 @@
 import sys
-import struct
 import utils.tools as tools
 from utils.utils import opcodes
-from lexer import lexer
-from parser import Parser
-from bytecode_gen import ByteCodeCompiler
 from utils.error import CompilationException
+from utils.image import build_image
+from utils.cache import CompilationCache
 
 class Compiler:
     def __init__(self, filename, output_file="output.o"):
         self.filename = filename
         self.output_file = output_file
 
-        self.lexer = lexer
+        self.lexer = None
+        self.source = None
+        self.cache_key = None
         self.ast = None
         self.bytecode = None
-    
+        self.code_addresses = {}
+        self.constants = []
+        self.removed_instructions = 0
+        self.inlined_calls = 0
+        self.removed_statements = 0
+        self.removed_functions = []
+        self.codegen_timings = {}
+
+    def read_source(self) -> str:
+        if self.source is None:
+            try:
+                with open(self.filename, "r") as file:
+                    self.source = file.read()
+            except FileNotFoundError:
+                raise CompilationException(f"No such file or directory: {self.filename}")
+
+        return self.source
+
+    # The compilation stages are imported on first use, so a cache hit doesn't pay for them
+
     def generate_lexer(self):
-        try:
-            with open(self.filename, "r") as file:
-                self.lexer.input(file.read())
-        except FileNotFoundError:
-            raise CompilationException(f"No such file or directory: {self.filename}")
+        from lexer import lexer
+        self.lexer = lexer
+        self.lexer.input(self.read_source())
 
     def generate_ast(self):
+        from parser import Parser
         parser = Parser(self.lexer)
         self.ast = parser.get_program()
+
+    def optimize_ast(self):
+        from optimizer import Optimizer
+        from inliner import Inliner
+        from dead_code import DeadCodeEliminator
+        optimizer = Optimizer()
+        self.ast = optimizer.optimize(self.ast)
+
+        # Before the elimination, which removes the functions left without calls
+        inliner = Inliner()
+        self.ast = inliner.inline(self.ast)
+        self.inlined_calls = inliner.inlined
+
+        eliminator = DeadCodeEliminator()
+        self.ast = eliminator.eliminate(self.ast)
+        self.removed_statements = eliminator.removed_statements
+        self.removed_functions = eliminator.removed_functions
     
-    def generate_bytecode(self):
-        bytecode_generator = ByteCodeCompiler()
-        bytecode_generator.generate_bytecode(self.ast)
+    def generate_bytecode(self, profile: bool = False):
+        from resolver import Resolver
+        from bytecode_gen import ByteCodeCompiler
+        resolver = Resolver()
+        resolver.resolve(self.ast)
+        bytecode_generator = ByteCodeCompiler(profile)
+        bytecode_generator.generate_bytecode(self.ast, resolver.frame_size)
         self.bytecode = bytecode_generator.get_bytecode()
+        self.code_addresses = bytecode_generator.code_addresses
+        self.constants = bytecode_generator.constants
+        self.codegen_timings = bytecode_generator.timings
+
+    def optimize_bytecode(self) -> int:
+        from peephole import Peephole
+        peephole = Peephole(self.bytecode, self.code_addresses)
+        self.bytecode = peephole.optimize()
+        self.code_addresses = peephole.code_addresses
+        self.removed_instructions = peephole.removed
+        return peephole.removed
+
+    def load_from_cache(self, cache: CompilationCache, flags: list) -> bool:
+        """ On a hit the lexer, parser and code generation are skipped """
+        self.cache_key = cache.get_key(self.read_source().encode(), flags)
+        entry = cache.load(self.cache_key)
+        if entry is None:
+            return False
+
+        self.bytecode = entry["bytecode"]
+        self.constants = entry["constants"]
+        self.code_addresses = entry["code_addresses"]
+        self.removed_instructions = entry["removed_instructions"]
+        self.inlined_calls = entry["inlined_calls"]
+        self.removed_statements = entry["removed_statements"]
+        self.removed_functions = entry["removed_functions"]
+        return True
+
+    def save_to_cache(self, cache: CompilationCache):
+        cache.store(self.cache_key, {
+            "bytecode": self.bytecode,
+            "constants": self.constants,
+            "code_addresses": self.code_addresses,
+            "removed_instructions": self.removed_instructions,
+            "inlined_calls": self.inlined_calls,
+            "removed_statements": self.removed_statements,
+            "removed_functions": self.removed_functions
+        })
 
     def export_bytecode_doc(self, use_keywords: bool):
         extension = self.output_file[::-1][:4][::-1]
@@ -45,19 +122,21 @@ class Compiler:
                 file.write(f" {arg}\n")
 
     def export_binary(self):
-        with open(self.output_file, "wb") as file:
-            for opcode, arg in self.bytecode:
-                file.write(opcode.to_bytes(1, byteorder='big'))
+        functions = {name: self.bytecode[i][1] for i, name in self.code_addresses.items()}
+        image = build_image(self.bytecode, self.constants, functions, self.filename)
 
-                if isinstance(arg, int):
-                    file.write(struct.pack("i", arg))
-                elif isinstance(arg, float):
-                    file.write(struct.pack("f", arg))
+        with open(self.output_file, "wb") as file:
+            file.write(image)
 
 def exit_with_output(argument):
     tools.pretty_print(argument)
     sys.exit()
 
+def print_codegen_timings(timings: dict):
+    print(f"{'Node':<20} {'Count':>8} {'Time (ms)':>10}")
+    for node_type, (count, seconds) in sorted(timings.items(), key=lambda item: -item[1][1]):
+        print(f"{node_type:<20} {count:>8} {seconds * 1000:>10.2f}")
+
 def parse_arguments():
     if len(sys.argv) < 2:
         raise Exception("File to compile is needed")
@@ -66,10 +145,13 @@ def parse_arguments():
         "only_lexer": "-l" in sys.argv,
         "only_parser": "-p" in sys.argv,
         "bytecode_doc": "-d" in sys.argv,
-        "bytecode_doc_bin": "-b" in sys.argv
+        "bytecode_doc_bin": "-b" in sys.argv,
+        "optimize": "-O" in sys.argv,
+        "cache": "--no-cache" not in sys.argv,
+        "profile_codegen": "--profile-codegen" in sys.argv
     }
 
-    output_file = sys.argv[-1] if len(sys.argv) > 2 and len(sys.argv[-1]) > 2 else "output.o"
+    output_file = sys.argv[-1] if len(sys.argv) > 2 and not sys.argv[-1].startswith("-") else "output.o"
     return sys.argv[1], output_file, options
 
 if __name__ == "__main__":
@@ -77,15 +159,39 @@ if __name__ == "__main__":
     
     compiler = Compiler(filename, output_file)
 
-    compiler.generate_lexer()
-    if options["only_lexer"]: 
-        exit_with_output(list(compiler.lexer))
+    # Only the flags that change the generated bytecode are part of the key
+    use_cache = options["cache"] and not (options["only_lexer"] or options["only_parser"] or options["profile_codegen"])
+    cache = CompilationCache() if use_cache else None
+    cached = cache is not None and compiler.load_from_cache(cache, ["-O"] if options["optimize"] else [])
+
+    if not cached:
+        compiler.generate_lexer()
+        if options["only_lexer"]: 
+            exit_with_output(list(compiler.lexer))
+
+        compiler.generate_ast()
+        if options["optimize"]:
+            compiler.optimize_ast()
+
+        if options["only_parser"]: 
+            exit_with_output(compiler.ast.to_dict())
+
+        compiler.generate_bytecode(options["profile_codegen"])
+        if options["profile_codegen"]:
+            print_codegen_timings(compiler.codegen_timings)
+
+        if options["optimize"]:
+            compiler.optimize_bytecode()
 
-    compiler.generate_ast()
-    if options["only_parser"]: 
-        exit_with_output(compiler.ast.to_dict())
+        if cache is not None:
+            compiler.save_to_cache(cache)
 
-    compiler.generate_bytecode()
+    if options["optimize"] and options["bytecode_doc"]:
+        print(f"Inliner: {compiler.inlined_calls} calls inlined")
+        print(f"Dead code eliminator: {compiler.removed_statements} statements removed")
+        if compiler.removed_functions:
+            print(f"Unused functions removed: {', '.join(compiler.removed_functions)}")
+        print(f"Peephole optimizer: {compiler.removed_instructions} instructions removed")
 
     if options["bytecode_doc"] or options["bytecode_doc_bin"]: 
         compiler.export_bytecode_doc(options["bytecode_doc"])
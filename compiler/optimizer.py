@@ -0,0 +1,257 @@
+import math
+import struct
+from utils.syntax_tree import *
+from utils.error import SemanticError
+from semantic_analyzer import Semantic
+
+class Optimizer:
+    """
+    AST pass run between the Parser and the ByteCodeCompiler (-O flag).
+    Folds operations between constant literals and removes identity
+    operations, always producing the same value (and runtime type) the VM
+    would have computed.
+    """
+    def __init__(self):
+        self.semantic = Semantic()
+        self.folded = 0
+        self.simplified = 0
+
+    def optimize(self, ast: BlockNode) -> BlockNode:
+        return self.visit_block(ast, False)
+
+    def get_type(self, expression: ExpressionNode):
+        try:
+            return self.semantic.get_type(expression)
+        except (SemanticError, KeyError):
+            return None
+
+    def visit_block(self, block: BlockNode, new_context: bool = True) -> BlockNode:
+        if new_context: self.semantic.new_no_named_context()
+        block.statements = [self.visit(statement) for statement in block.statements]
+        if new_context: self.semantic.return_context()
+        return block
+
+    def visit(self, node: ASTNode) -> ASTNode:
+        if isinstance(node, BinaryExpression):
+            return self.visit_binary(node)
+        elif isinstance(node, Literal):
+            if isinstance(node.value, list):
+                node.value = [self.visit(item) for item in node.value]
+        elif isinstance(node, FunctionCall):
+            node.args = [self.visit(arg) for arg in node.args]
+            if isinstance(node.from_obj, ASTNode):
+                node.from_obj = self.visit(node.from_obj)
+        elif isinstance(node, NewCall):
+            node.args = [self.visit(arg) for arg in node.args]
+        elif isinstance(node, MapLiteral):
+            node.keys = [self.visit(key) for key in node.keys]
+            node.values = [self.visit(value) for value in node.values]
+        elif isinstance(node, MemberAccess):
+            if isinstance(node.object, MemberAccess):
+                node.object = self.visit(node.object)
+            if node.list_access:
+                node.attribute = self.visit(node.attribute)
+        elif isinstance(node, CastingExpression):
+            node.expression = self.visit(node.expression)
+            return self.fold_casting(node)
+        elif isinstance(node, VariableDeclaration):
+            self.semantic.add_table_type(node.identifier, node.var_type)
+            if isinstance(node.initializer, ASTNode):
+                node.initializer = self.visit(node.initializer)
+        elif isinstance(node, FunctionDeclaration):
+            self.semantic.add_new_func(node.identifier, node.return_type, node.parameters)
+            self.semantic.change_context(node.identifier)
+            node.body = self.visit_block(node.body, False)
+            self.semantic.return_context()
+        elif isinstance(node, ClassDeclaration):
+            self.semantic.add_new_type(node.identifier, node.attributes)
+        elif isinstance(node, AssignmentNode):
+            if isinstance(node.identifier, MemberAccess):
+                node.identifier = self.visit(node.identifier)
+            node.value = self.visit(node.value)
+        elif isinstance(node, IfStatement):
+            node.condition = self.visit(node.condition)
+            node.then_block = self.visit_block(node.then_block)
+            for elif_statement in node.elif_statements:
+                elif_statement.condition = self.visit(elif_statement.condition)
+                elif_statement.then_block = self.visit_block(elif_statement.then_block)
+            if node.else_block:
+                node.else_block = self.visit_block(node.else_block)
+        elif isinstance(node, WhileStatement):
+            node.condition = self.visit(node.condition)
+            node.body = self.visit_block(node.body)
+        elif isinstance(node, ForStatement):
+            self.semantic.new_no_named_context()
+            node.variable = self.visit(node.variable)
+            node.condition = self.visit(node.condition)
+            node.body = self.visit_block(node.body, False)
+            self.semantic.return_context()
+        elif isinstance(node, ReturnStatement):
+            node.expression = self.visit(node.expression)
+        elif isinstance(node, BlockNode):
+            return self.visit_block(node)
+
+        return node
+
+    def visit_binary(self, node: BinaryExpression) -> ExpressionNode:
+        # Parser.binary_expression stores the left operand in 'right'
+        node.right = self.visit(node.right)
+        if node.left is not None:
+            node.left = self.visit(node.left)
+
+        lhs, rhs, operator = node.right, node.left, node.operator
+        if operator == 'not':
+            if is_constant(lhs) and lhs.value_type != 'STRING_LITERAL':
+                self.folded += 1
+                return Literal('BOOL_LITERAL', not to_word(lhs))
+
+            is_double_not = isinstance(lhs, BinaryExpression) and lhs.operator == 'not'
+            if is_double_not and self.get_type(lhs.right) == 'BOOL':
+                self.simplified += 1
+                return lhs.right
+
+            return node
+
+        if is_constant(lhs) and is_constant(rhs):
+            result = fold(operator, lhs, rhs)
+            if result is not None:
+                self.folded += 1
+                return result
+
+        result = self.simplify_identity(operator, lhs, rhs)
+        if result is not None:
+            self.simplified += 1
+            return result
+
+        return node
+
+    def simplify_identity(self, operator: str, lhs: ExpressionNode, rhs: ExpressionNode):
+        """ x + 0, x - 0, x * 1, x and true, x or false (and their mirrored forms) """
+        for operand, constant, mirrored in ((lhs, rhs, False), (rhs, lhs, True)):
+            if not is_constant(constant) or is_constant(operand):
+                continue
+
+            operand_type = self.get_type(operand)
+            if operand_type not in ('INT', 'FLOAT', 'BOOL'):
+                continue
+
+            value_type = constant.value_type
+            is_number = value_type in ('INT_LITERAL', 'FLOAT_LITERAL')
+            same_type = value_type.replace('_LITERAL', '') == operand_type or (is_number and operand_type == 'FLOAT')
+
+            if operand_type == 'BOOL':
+                if operator == 'and' and value_type == 'BOOL_LITERAL' and constant.value:
+                    return operand
+                if operator == 'or' and value_type == 'BOOL_LITERAL' and not constant.value:
+                    return operand
+                continue
+
+            if not same_type: continue
+
+            # -0.0 + 0 is 0.0, so additions are only an identity for ints
+            if operator == '+' and constant.value == 0 and operand_type == 'INT':
+                return operand
+            if operator == '-' and constant.value == 0 and not mirrored:
+                return operand
+            if operator == '*' and constant.value == 1:
+                return operand
+
+        return None
+
+    def fold_casting(self, node: CastingExpression) -> ExpressionNode:
+        expression = node.expression
+        if not is_constant(expression):
+            return node
+
+        if node.new_type == 'FLOAT' and expression.value_type == 'INT_LITERAL':
+            self.folded += 1
+            return Literal('FLOAT_LITERAL', to_float(to_int32(expression.value)))
+        if node.new_type == 'INT' and expression.value_type == 'FLOAT_LITERAL' and math.isfinite(expression.value):
+            self.folded += 1
+            return Literal('INT_LITERAL', int(expression.value))
+
+        return node
+
+def is_constant(node: ASTNode) -> bool:
+    return isinstance(node, Literal) and node.value_type in ('INT_LITERAL', 'FLOAT_LITERAL', 'BOOL_LITERAL', 'BYTE_LITERAL', 'STRING_LITERAL')
+
+def to_int32(value: int) -> int:
+    return ((value + 2**31) % 2**32) - 2**31
+
+def to_float(value) -> float:
+    """ Rounds to single precision, as the VM stores every float in 32 bits """
+    return struct.unpack('f', struct.pack('f', value))[0]
+
+def to_word(literal: Literal) -> int:
+    """ The raw 32-bit value that would be pushed onto the VM stack """
+    if literal.value_type == 'FLOAT_LITERAL':
+        return struct.unpack('I', struct.pack('f', literal.value))[0]
+
+    return int(literal.value) & 0xFFFFFFFF
+
+def format_number(literal: Literal) -> str:
+    if literal.value_type == 'FLOAT_LITERAL':
+        return '%g' % to_float(literal.value)
+
+    return str(to_int32(int(literal.value)))
+
+def fold(operator: str, lhs: Literal, rhs: Literal):
+    """ Mirrors alu(): returns None when the operation can't be folded safely """
+    if operator in ('and', 'or'):
+        if 'STRING' in lhs.value_type or 'STRING' in rhs.value_type: return None
+        left, right = to_word(lhs), to_word(rhs)
+        return Literal('BOOL_LITERAL', bool(left and right) if operator == 'and' else bool(left or right))
+
+    if lhs.value_type == 'STRING_LITERAL':
+        if operator != '+': return None
+        if rhs.value_type == 'STRING_LITERAL':
+            return Literal('STRING_LITERAL', lhs.value + rhs.value)
+        return Literal('STRING_LITERAL', lhs.value + format_number(rhs))
+
+    if rhs.value_type == 'STRING_LITERAL':
+        return None
+
+    try:
+        if lhs.value_type == 'FLOAT_LITERAL' or rhs.value_type == 'FLOAT_LITERAL' or operator in ('/', '%'):
+            return fold_float(operator, to_float(float(lhs.value)), to_float(float(rhs.value)))
+
+        return fold_int(operator, to_int32(int(lhs.value)), to_int32(int(rhs.value)))
+    except (OverflowError, ValueError):
+        return None
+
+def fold_int(operator: str, left: int, right: int):
+    operations = {
+        '+': lambda: to_int32(left + right),
+        '-': lambda: to_int32(left - right),
+        '*': lambda: to_int32(left * right),
+        '==': lambda: int(left == right),
+        '!=': lambda: int(left != right),
+        '<': lambda: int(left < right),
+        '>': lambda: int(left > right),
+        '<=': lambda: int(left <= right),
+        '>=': lambda: int(left >= right),
+    }
+
+    if operator not in operations: return None
+    return Literal('INT_LITERAL', operations[operator]())
+
+def fold_float(operator: str, left: float, right: float):
+    if operator in ('/', '%') and right == 0:
+        return None # Keep the runtime behaviour (inf / nan)
+
+    operations = {
+        '+': lambda: left + right,
+        '-': lambda: left - right,
+        '*': lambda: left * right,
+        '/': lambda: left / right,
+        '%': lambda: left - to_float(right * math.floor(to_float(left / right))),
+        '==': lambda: float(left == right),
+        '!=': lambda: float(left != right),
+        '<': lambda: float(left < right),
+        '>': lambda: float(left > right),
+        '<=': lambda: float(left <= right),
+        '>=': lambda: float(left >= right),
+    }
+
+    if operator not in operations: return None
+    return Literal('FLOAT_LITERAL', to_float(operations[operator]()))
@@ -1,10 +1,17 @@
 from utils.syntax_tree import *
 from utils.utils import literals
-from utils.tools import module
 from lexer import keywords
 from utils.error import ParserError
 from semantic_analyzer import Semantic
 
+binary_precedence = {
+    'AND': 1, 'OR': 1,
+    'EQ': 2, 'NEQ': 2, 'LT': 2, 'GT': 2, 'LE': 2, 'GE': 2,
+    'PLUS': 3, 'MINUS': 3,
+    'MULTIPLY': 4, 'DIVIDE': 4, 'MOD': 4,
+    'POW': 5,
+}
+
 class Parser:
     def __init__(self, lexer):
         self.lexer = lexer
@@ -24,7 +31,7 @@ class Parser:
             return self.current_token.type.replace('_', ' ').lower()
         elif self.current_token.type in ['PLUS', 'MINUS', 'MULTIPLY', 'DIVIDE', 'MOD', 'POW']:
             return self.current_token.type.lower() + ' symbol'
-        elif self.current_token.type in ['LPAREN', 'RPAREN', 'LBRACE', 'RBRACE', 'ASSIGN', 'START_LIST', 'END_LIST', 'EMPTY_ARR', 'POINT', 'RET']:
+        elif self.current_token.type in ['LPAREN', 'RPAREN', 'LBRACE', 'RBRACE', 'ASSIGN', 'START_LIST', 'END_LIST', 'EMPTY_ARR', 'POINT', 'RET', 'COLON']:
             return self.current_token.value
         elif self.current_token.type in ['EQ', 'NEQ', 'LT', 'GT', 'LE', 'GE']:
             return 'logic operator'
@@ -51,6 +58,13 @@ class Parser:
                 return self.block()
             case 'FUNC':
                 return self.function_declaration()
+            case 'NOINLINE':
+                self.next_token() # Consume 'noinline'
+                if self.current_token.type != 'FUNC':
+                    self.throw_error(f"Expected a function declaration after 'noinline', but found '{self.get_token_info()}' instead")
+                declaration = self.function_declaration()
+                declaration.inline = False
+                return declaration
             case 'STRUCT':
                 return self.struct_declaration()
             case 'IDENTIFIER':
@@ -100,25 +114,20 @@ class Parser:
         
         return self.binary_expression()
 
-    def binary_expression(self, operator_group: int = 0):
-        operators = (
-            ('AND', 'OR'),
-            ('EQ', 'NEQ', 'LT', 'GT', 'LE', 'GE'),
-            ('PLUS', 'MINUS'),
-            ('MULTIPLY', 'DIVIDE', 'MOD'),
-            ('POW'),
-        )
-
-        if operator_group == len(operators):
-            return self.unary_expression()
+    def binary_expression(self, min_precedence: int = 1):
+        """ Precedence climbing: every binary operator is left-associative """
+        left = self.unary_expression()
 
-        left = self.binary_expression(operator_group + 1)
+        while self.current_token:
+            precedence = binary_precedence.get(self.current_token.type)
+            if precedence is None or precedence < min_precedence:
+                break
 
-        while self.current_token and self.current_token.type in operators[operator_group]:
             operator = self.current_token.value
             self.next_token()
-            right = self.binary_expression(operator_group + 1)
+            right = self.binary_expression(precedence + 1)
             left = BinaryExpression(operator, left, right)
+            left.operand_type = self.semantic.get_operand_type(left)
 
         return left
     
@@ -137,6 +146,9 @@ class Parser:
             self.next_token() # Consume ']'
             return Literal(self.semantic.get_list_type(new_list), new_list)
 
+        if self.current_token.type == 'LBRACE':
+            return self.map_literal()
+
         if self.current_token.type == 'LPAREN':
             self.next_token()  # Consume '('
             expr = self.binary_expression()
@@ -161,14 +173,17 @@ class Parser:
             return self.function_call(identifier)
         elif self.current_token.type != 'POINT':
             self.semantic.lineno = self.current_token.lineno
-            self.semantic.get_var_type(identifier) # Throws an error if identifier doesn't exits
+            var_type = self.semantic.get_var_type(identifier) # Throws an error if identifier doesn't exits
             if self.current_token.type == 'START_LIST':
                 self.next_token() # Consume '['
                 index = self.expression()
                 if self.current_token.type != 'END_LIST':
                     self.throw_error(f"Expected a ']' symbol, but found '{self.get_token_info()}' instead")
                 self.next_token() # Consume ']'
-                identifier = MemberAccess(identifier, index, True)
+                if self.semantic.is_map(var_type):
+                    identifier = MapAccess(identifier, self.semantic.check_map_key(identifier, index))
+                else:
+                    identifier = MemberAccess(identifier, index, True)
                 while self.current_token.type == 'START_LIST':
                     self.next_token() # Consume '['
                     index = self.expression()
@@ -186,6 +201,49 @@ class Parser:
         
         return self.function_call(access_attr, identifier)
 
+    def map_literal(self):
+        self.next_token() # Consume '{'
+
+        keys, values = [], []
+        while self.current_token.type != 'RBRACE':
+            keys.append(self.expression())
+            if self.current_token.type != 'COLON':
+                self.throw_error(f"Expected a ':' after the key, but found '{self.get_token_info()}' instead")
+            self.next_token() # Consume ':'
+            values.append(self.expression())
+
+            if self.current_token.type == 'COMMA':
+                self.next_token() # Consume ','
+            elif self.current_token.type != 'RBRACE':
+                self.throw_error(f"Expected a ',' or a '}}' symbol, but found '{self.get_token_info()}' instead")
+
+        self.next_token() # Consume '}'
+        return MapLiteral(self.semantic.get_map_literal_type(keys, values), keys, values)
+
+    def map_type(self) -> str:
+        """ 'MAP<K,V>' from the '<K, V>' following the 'Map' keyword """
+        if self.current_token.type != 'LT':
+            self.throw_error(f"Expected a '<' after 'Map', but found '{self.get_token_info()}' instead")
+        self.next_token() # Consume '<'
+
+        key_type = self.current_token.type
+        self.next_token() # Consume KEY_TYPE_INFO
+        if self.current_token.type != 'COMMA':
+            self.throw_error(f"Expected a ',' after the key type, but found '{self.get_token_info()}' instead")
+        self.next_token() # Consume ','
+
+        value_type = self.current_token.value if self.current_token.type == 'IDENTIFIER' else self.current_token.type
+        self.next_token() # Consume VALUE_TYPE_INFO
+        if value_type == 'MAP': value_type = self.map_type()
+        while self.current_token.type == 'EMPTY_ARR':
+            self.next_token() # Consume '[]'
+            value_type += '[]'
+
+        if self.current_token.type != 'GT':
+            self.throw_error(f"Expected a '>' to close the map type, but found '{self.get_token_info()}' instead")
+        self.next_token() # Consume '>'
+        return self.semantic.get_map_type(key_type, value_type)
+
     def new_call(self):
         struct_name = self.current_token.value
         self.next_token() # Consume STRUCT_NAME_INFO
@@ -233,6 +291,7 @@ class Parser:
         
         self.semantic.lineno = self.current_token.lineno
         self.next_token() # Consume VAR_TYPE_INFO
+        if var_type == 'MAP': var_type = self.map_type()
         while self.current_token.type == 'EMPTY_ARR': 
             self.next_token() # Consume '[]'
             var_type += '[]'
@@ -271,6 +330,7 @@ class Parser:
             if arg_type == 'IDENTIFIER': arg_type = self.current_token.value
             if arg_type == 'EMPTY_ARR': arg_type = '[]'
             self.next_token() # LITERAL_TYPE_INFO
+            if arg_type == 'MAP': arg_type = self.map_type()
             while self.current_token.type == 'EMPTY_ARR': 
                 self.next_token() # Consume '[]'
                 var_type += '[]'
@@ -287,11 +347,11 @@ class Parser:
             self.next_token() # Consume '->'
             return_type = self.current_token.type
             self.next_token() # Conseume RETURN_TYPE_INFO
+            if return_type == 'MAP': return_type = self.map_type()
         
         self.semantic.add_new_func(func_name, return_type, arguments)
         self.semantic.change_context(func_name)
         func_body = self.block(False)
-        func_body = module(func_name, [arg.identifier for arg in arguments], func_body)
         self.semantic.return_context()
         return FunctionDeclaration(func_name, return_type, arguments, func_body)
     
@@ -341,7 +401,12 @@ class Parser:
                 self.throw_error(f"Expected a ']' symbol, but found '{self.get_token_info()}' instead")
             self.next_token() # Consume ']'
 
-            identifier = MemberAccess(identifier, index, True)
+            if self.semantic.is_map(self.semantic.get_var_type(identifier)):
+                identifier = MapAccess(identifier, self.semantic.check_map_key(identifier, index))
+                if self.current_token.type != 'ASSIGN':
+                    self.throw_error(f"Expected an assignment operator '=' after the map key, but got '{self.get_token_info()}' instead")
+            else:
+                identifier = MemberAccess(identifier, index, True)
             while self.current_token.type == 'START_LIST':
                 self.next_token() # Consume '['
                 index = self.expression()
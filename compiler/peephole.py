@@ -0,0 +1,109 @@
+from utils.utils import opcodes
+
+JUMPS = (
+    opcodes["JUMP"], opcodes["JUMP_IF"], opcodes["JUMP_IF_FALSE"],
+    opcodes["JUMP_IF_LT"], opcodes["JUMP_IF_GE"], opcodes["JUMP_IF_GT"], opcodes["JUMP_IF_LE"]
+)
+
+class Peephole:
+    """
+    Rewrites small windows of the generated bytecode (-O flag):
+        NOT; JUMP_IF x          -> JUMP_IF_FALSE x
+        STORE_MEM x; LOAD x     -> STORE_MEM_LOAD x
+        JUMP x (x: JUMP y)      -> JUMP y
+        JUMP next               -> (removed)
+    Instructions are only marked as removed while the windows are rewritten,
+    so every jump target and function address is fixed up once at the end.
+    """
+    def __init__(self, bytecode: list, code_addresses: dict):
+        self.bytecode = list(bytecode)
+        self.code_addresses = dict(code_addresses) # STORE instructions holding a function start
+        self.removed = 0
+
+    def optimize(self) -> list:
+        self.targets = self.get_jump_targets()
+        self.thread_jumps()
+        self.fuse_not_jump_if()
+        self.fuse_store_load()
+        self.remove_useless_jumps()
+        return self.compact()
+
+    def get_jump_targets(self) -> set:
+        targets = {arg for opcode, arg in self.bytecode if opcode in JUMPS}
+        targets |= {self.bytecode[i][1] for i in self.code_addresses}
+        return targets
+
+    def next_instruction(self, index: int) -> int:
+        while index < len(self.bytecode) and self.bytecode[index] is None:
+            index += 1
+
+        return index
+
+    def remove(self, index: int):
+        self.bytecode[index] = None
+        self.removed += 1
+
+    def thread_jumps(self):
+        for i, instruction in enumerate(self.bytecode):
+            if instruction is None or instruction[0] not in JUMPS: continue
+
+            target = self.next_instruction(instruction[1])
+            visited = {i}
+            while target < len(self.bytecode) and self.bytecode[target][0] == opcodes["JUMP"] and target not in visited:
+                visited.add(target)
+                target = self.next_instruction(self.bytecode[target][1])
+
+            if target != instruction[1]:
+                self.bytecode[i] = (instruction[0], target)
+                self.targets.add(target)
+
+    def fuse_not_jump_if(self):
+        for i in range(len(self.bytecode) - 1):
+            if self.bytecode[i] is None or self.bytecode[i][0] != opcodes["NOT"]: continue
+
+            j = self.next_instruction(i + 1)
+            if j == len(self.bytecode) or j in self.targets: continue
+            if self.bytecode[j][0] != opcodes["JUMP_IF"]: continue
+
+            self.bytecode[i] = (opcodes["JUMP_IF_FALSE"], self.bytecode[j][1])
+            self.remove(j)
+
+    def fuse_store_load(self):
+        for i in range(len(self.bytecode) - 1):
+            if self.bytecode[i] is None or self.bytecode[i][0] != opcodes["STORE_MEM"]: continue
+
+            address = self.bytecode[i][1]
+            j = self.next_instruction(i + 1)
+            if address == -1 or j == len(self.bytecode) or j in self.targets: continue
+            if self.bytecode[j] != (opcodes["LOAD"], address): continue
+
+            self.bytecode[i] = (opcodes["STORE_MEM_LOAD"], address)
+            self.remove(j)
+
+    def remove_useless_jumps(self):
+        for i, instruction in enumerate(self.bytecode):
+            if instruction is None or instruction[0] != opcodes["JUMP"]: continue
+            if self.next_instruction(instruction[1]) == self.next_instruction(i + 1):
+                self.remove(i)
+
+    def compact(self) -> list:
+        # new_position[i]: where instruction i (or the next surviving one) ends up
+        new_position = []
+        position = 0
+        for instruction in self.bytecode:
+            new_position.append(position)
+            if instruction is not None: position += 1
+        new_position.append(position)
+
+        bytecode = []
+        for i, instruction in enumerate(self.bytecode):
+            if instruction is None: continue
+
+            opcode, arg = instruction
+            if opcode in JUMPS or i in self.code_addresses:
+                arg = new_position[arg]
+
+            bytecode.append((opcode, arg))
+
+        self.code_addresses = {new_position[i]: name for i, name in self.code_addresses.items()}
+        return bytecode
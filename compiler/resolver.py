@@ -0,0 +1,163 @@
+from utils.syntax_tree import *
+from utils.utils import built_in_funcs, method_opcodes
+from semantic_analyzer import Scope
+
+class Resolver:
+    """
+    Pass run right before the ByteCodeCompiler: binds every identifier to the
+    memory address of its declaration and stores it on the node ('address'),
+    so the code generation emits it directly.
+    Addresses are handed out following the order the ByteCodeCompiler emits the
+    declarations, which is the order of their STORE_MEM -1 in the bytecode.
+    Parameters and variables declared inside a function get instead a slot of
+    the function frame ('local' is set on the node), so every call has its own.
+    """
+    def __init__(self):
+        self.memory = 0
+        self.global_scope = Scope()
+        self.scope = self.global_scope
+        self.function = None # FunctionDeclaration whose frame gets the new slots
+        self.frame_size = 0 # Slots of the top-level code, only used by inlined calls
+
+    def resolve(self, ast: BlockNode) -> BlockNode:
+        for statement in ast.statements:
+            self.visit(statement)
+
+        return ast
+
+    def declare(self, identifier: str, var_type: str) -> tuple:
+        """ (address or frame slot, is local) """
+        if self.function is not None:
+            return self.declare_slot(identifier), True
+
+        address = self.memory
+        self.scope.symbols[identifier] = (address, False)
+        self.memory += 1 if var_type in ('BOOL', 'CHAR') else 4
+        return address, False
+
+    def declare_slot(self, identifier: str) -> int:
+        frame = self.function if self.function is not None else self
+        slot = frame.frame_size
+        frame.frame_size += 1
+        self.scope.symbols[identifier] = (slot, True)
+        return slot
+
+    def lookup(self, identifier: str) -> tuple:
+        scope = self.scope
+        while scope is not None:
+            if identifier in scope.symbols:
+                return scope.symbols[identifier]
+            scope = scope.parent
+
+        raise Exception(f"Unfound identifier '{identifier}'")
+
+    def visit_block(self, block: BlockNode, scope: Scope = None):
+        previous = self.scope
+        self.scope = scope or Scope(previous)
+        for statement in block.statements:
+            self.visit(statement)
+        self.scope = previous
+
+    def visit(self, node: ASTNode):
+        if isinstance(node, BinaryExpression):
+            self.visit(node.right)
+            if node.left is not None:
+                self.visit(node.left)
+        elif isinstance(node, Literal):
+            if node.value_type == 'VARIABLE':
+                node.address, node.local = self.lookup(node.value)
+            elif isinstance(node.value, list):
+                for item in node.value:
+                    self.visit(item)
+        elif isinstance(node, FunctionCall):
+            for arg in node.args:
+                self.visit(arg)
+
+            if isinstance(node.from_obj, ASTNode):
+                self.visit(node.from_obj)
+            elif node.from_obj != 'System':
+                node.object_address, node.object_local = self.lookup(node.from_obj)
+
+            if node.identifier not in built_in_funcs and node.identifier not in method_opcodes:
+                node.address, node.local = self.lookup(node.identifier)
+        elif isinstance(node, InlineCall):
+            for arg in node.args:
+                self.visit(arg)
+
+            # Without side effects in the arguments no variable can change before the
+            # expression reads it, so the parameters bound to one become its alias
+            is_simple = all(isinstance(arg, Literal) and not isinstance(arg.value, list) for arg in node.args)
+
+            # The expression only sees the parameters and the global symbols, as in its function
+            previous = self.scope
+            self.scope = Scope(self.global_scope)
+            for param, arg in zip(node.parameters, node.args):
+                if is_simple and arg.value_type == 'VARIABLE':
+                    self.scope.symbols[param.identifier] = (arg.address, arg.local)
+                    param.address = None
+                else:
+                    param.address = self.declare_slot(param.identifier)
+
+            self.visit(node.expression)
+            self.scope = previous
+        elif isinstance(node, NewCall):
+            for arg in node.args:
+                self.visit(arg)
+        elif isinstance(node, MapLiteral):
+            for key, value in zip(node.keys, node.values):
+                self.visit(key)
+                self.visit(value)
+        elif isinstance(node, MemberAccess):
+            if isinstance(node.object, MemberAccess):
+                self.visit(node.object)
+            else:
+                node.address, node.local = self.lookup(node.object)
+
+            if node.list_access:
+                self.visit(node.attribute)
+        elif isinstance(node, CastingExpression):
+            self.visit(node.expression)
+        elif isinstance(node, VariableDeclaration):
+            node.address, node.local = self.declare(node.identifier, node.var_type)
+            if isinstance(node.initializer, ASTNode):
+                self.visit(node.initializer)
+        elif isinstance(node, FunctionDeclaration):
+            node.address, node.local = self.declare(node.identifier, 'FUNCTION')
+
+            # Functions only see their own symbols and the global ones
+            previous, previous_function = self.scope, self.function
+            self.scope, self.function = Scope(self.global_scope), node
+            node.frame_size = 0
+            for arg in node.parameters:
+                arg.address = self.declare_slot(arg.identifier)
+
+            self.visit_block(node.body, self.scope)
+            self.scope, self.function = previous, previous_function
+        elif isinstance(node, AssignmentNode):
+            self.visit(node.value)
+            if isinstance(node.identifier, MemberAccess):
+                self.visit(node.identifier)
+            else:
+                node.address, node.local = self.lookup(node.identifier)
+        elif isinstance(node, IfStatement):
+            # Same order as the generated code: conditions, else block, elif blocks and then block
+            self.visit(node.condition)
+            for elif_statement in node.elif_statements:
+                self.visit(elif_statement.condition)
+            if node.else_block:
+                self.visit_block(node.else_block)
+            for elif_statement in node.elif_statements:
+                self.visit_block(elif_statement.then_block)
+            self.visit_block(node.then_block)
+        elif isinstance(node, WhileStatement):
+            self.visit(node.condition)
+            self.visit_block(node.body)
+        elif isinstance(node, ForStatement):
+            previous = self.scope
+            self.scope = Scope(previous)
+            self.visit(node.variable)
+            self.visit(node.condition)
+            self.visit_block(node.body, self.scope)
+            self.scope = previous
+        elif isinstance(node, ReturnStatement):
+            self.visit(node.expression)
@@ -7,18 +7,21 @@ operations = {
     '+': "add", '-': "substract", '*': "multiply", '/': "divide", '%': "modulize",
 }
 
+class Scope:
+    """ Symbols declared in a block, function or the global context, linked to the enclosing scope """
+    def __init__(self, parent = None, symbols: dict = None):
+        self.parent = parent
+        self.symbols = {} if symbols is None else symbols
+
 class Semantic:
     def __init__(self):
         self.lineno = 0
-        self.context = 'MAIN'
-        self.context_history = []
-        self.non_named_contexts = 0
 
         self.primitive_types = [
             'INT', 'BYTE', 'FLOAT', 'BOOL', 'CHAR', 'STRING'
         ]
 
-        self.non_primitive_types = ['[]']
+        self.non_primitive_types = ['[]', 'MAP']
         self.table_type = {
             'exit'      : 'VOID',
             'print'     : 'VOID',
@@ -41,24 +44,32 @@ class Semantic:
             'lower'     : 'STRING',
             'upper'     : 'STRING',
             'toString'  : 'STRING',
+            'open'      : 'INT',
+            'close'     : 'VOID',
+            'read_chunk': 'BYTE[]',
         }
         self.functions = {}
         self.structs = {}
 
+        self.global_scope = Scope(None, self.table_type)
+        self.function_scopes = {}
+        self.scope = self.global_scope
+        self.context_history = []
+
     def clone(self):
         return copy.deepcopy(self)
     
     def new_no_named_context(self):
-        self.non_named_contexts += 1
-        self.context_history.insert(0, self.context)
-        self.context = f'{self.context}.{self.non_named_contexts}'
+        self.context_history.append(self.scope)
+        self.scope = Scope(self.scope)
     
     def change_context(self, context_name):
-        self.context_history.insert(0, self.context)
-        self.context = context_name
+        # Functions only see their own symbols (parameters included) and the global ones
+        self.context_history.append(self.scope)
+        self.scope = Scope(self.global_scope, self.function_scopes.setdefault(context_name, {}))
     
     def return_context(self):
-        self.context = 'MAIN' if not self.context_history else self.context_history.pop(0)
+        self.scope = self.context_history.pop() if self.context_history else self.global_scope
 
     def throw_error(self, result_type: str, expected_type: str):
         raise SemanticError(f'Type mismatch: Cannot assign a {result_type} value to a {expected_type} variable', self.lineno)
@@ -77,23 +88,58 @@ class Semantic:
             self.structs[new_type][arg_type.identifier] = arg_type.type
 
     def add_new_func(self, func_name, return_type, args):
-        if func_name in self.table_type:
+        if func_name in self.table_type or func_name in utils.built_in_funcs or func_name in utils.method_opcodes:
             raise SemanticError(f'NameError: Variable {func_name} is already declared', self.lineno)
 
         self.table_type[func_name] = return_type
         self.functions[func_name] = [arg.type for arg in args]
-
-        func_context = func_name + '.'
-        for arg in args:
-            self.table_type[func_context + arg.identifier] = arg.type
+        self.function_scopes[func_name] = {arg.identifier: arg.type for arg in args}
 
     def add_table_type(self, key_name, value_type):
-        complete_name = self.context + '.' + key_name if self.context != 'MAIN' else key_name
-        if complete_name in self.table_type:
+        if key_name in self.scope.symbols:
             raise SemanticError(f'NameError: Variable {key_name} is already declared', self.lineno)
 
-        self.table_type[complete_name] = value_type
+        self.scope.symbols[key_name] = value_type
     
+    def is_map(self, var_type) -> bool:
+        return isinstance(var_type, str) and var_type.startswith('MAP') and not var_type.endswith('[]')
+
+    def get_map_type(self, key_type: str, value_type: str) -> str:
+        if key_type not in self.primitive_types:
+            raise SemanticError(f'TypeError: Map keys must have a primitive type, but got {key_type}', self.lineno)
+
+        return f'MAP<{key_type},{value_type}>'
+
+    def get_map_types(self, map_type: str) -> tuple:
+        """ (K, V) of 'MAP<K,V>', K is primitive so the first comma splits them """
+        if not self.is_map(map_type) or map_type == 'MAP':
+            raise SemanticError(f'TypeError: Expected a map, but got a {map_type} value', self.lineno)
+
+        key_type, value_type = map_type[4:-1].split(',', 1)
+        return key_type, value_type
+
+    def get_map_literal_type(self, keys: list, values: list) -> str:
+        if not keys: return 'MAP'
+
+        key_type, value_type = self.get_type(keys[0]), self.get_type(values[0])
+        for key, value in zip(keys, values):
+            for expected_type, item_type in ((key_type, self.get_type(key)), (value_type, self.get_type(value))):
+                if item_type != expected_type:
+                    raise SemanticError(f'Type mismatch: Cannot insert a {item_type} into a map of {expected_type}', self.lineno)
+
+        return self.get_map_type(key_type, value_type)
+
+    def check_map_literal(self, expected_type: str, literal: MapLiteral) -> MapLiteral:
+        """ Casts the keys and values of the literal to the ones of the map it's assigned to """
+        key_type, value_type = self.get_map_types(expected_type)
+        literal.keys = [self.check_value_type(key_type, key) for key in literal.keys]
+        literal.values = [self.check_value_type(value_type, value) for value in literal.values]
+        literal.map_type = expected_type
+        return literal
+
+    def check_map_key(self, map_id: str, key: ExpressionNode) -> ExpressionNode:
+        return self.check_value_type(self.get_map_types(self.get_var_type(map_id))[0], key)
+
     def literal_casting(self, expected_type: str, result: Literal) -> any:
         match expected_type:
             case 'BOOL':
@@ -123,18 +169,27 @@ class Semantic:
             
             return self.get_var_type(expr.value)
         elif isinstance(expr, FunctionCall):
+            # Map methods aren't symbols, so variables can still be called 'keys' or 'values'
+            if expr.identifier in ('keys', 'values', 'has') and isinstance(expr.from_obj, str):
+                key_type, value_type = self.get_map_types(self.get_var_type(expr.from_obj))
+                return {'keys': f'{key_type}[]', 'values': f'{value_type}[]', 'has': 'BOOL'}[expr.identifier]
+
             return self.table_type[expr.identifier]
+        elif isinstance(expr, MapAccess):
+            return self.get_map_types(self.get_var_type(expr.object))[1]
+        elif isinstance(expr, MapLiteral):
+            return expr.map_type
         elif isinstance(expr, MemberAccess):
             if expr.list_access:
                 list_id = expr.object
                 num_access = 1
-                while True:
-                    if isinstance(list_id, MemberAccess):
-                        list_id = list_id.object
-                        num_access += 1
-                    else:
-                        if self.get_var_type(list_id) == 'STRING': return 'CHAR'
-                        return self.get_var_type(list_id).replace('[]', '', num_access)
+                while isinstance(list_id, MemberAccess) and not isinstance(list_id, MapAccess):
+                    list_id = list_id.object
+                    num_access += 1
+
+                list_type = self.get_unary_type(list_id) if isinstance(list_id, MapAccess) else self.get_var_type(list_id)
+                if list_type == 'STRING': return 'CHAR'
+                return list_type.replace('[]', '', num_access)
             else:
                 return self.structs[self.get_var_type(expr.object)][expr.attribute]
         elif isinstance(expr, NewCall):
@@ -177,20 +232,34 @@ class Semantic:
         else:
             return 'BYTE'
         
+    def get_operand_type(self, operation: BinaryExpression):
+        """ INT or FLOAT when both operands have that type, STRING for a concatenation, None otherwise """
+        if operation.left is None: return None # not
+
+        try:
+            left = self.get_type(operation.left)
+            right = self.get_type(operation.right)
+        except (SemanticError, KeyError):
+            return None
+
+        if operation.operator == '+' and 'STRING' in (left, right): return 'STRING'
+        if left != right or left not in ('INT', 'FLOAT'): return None
+
+        # The VM computes / and % in floating point, even between two ints
+        operands = (operation.left, operation.right)
+        if left == 'INT' and any(isinstance(operand, BinaryExpression) and operand.operator in ('/', '%') for operand in operands):
+            return None
+
+        return left
+
     def get_var_type(self, var_name):
-        if var_name in self.table_type: return self.table_type[var_name]
+        scope = self.scope
+        while scope is not None:
+            if var_name in scope.symbols:
+                return scope.symbols[var_name]
+            scope = scope.parent
 
-        complete_name = self.context + '.' + var_name
-        if complete_name in self.table_type:
-            return self.table_type[complete_name]
-        else:
-            scopes = self.context.split('.')[::-1]
-            for scope in scopes:
-                complete_name = complete_name.replace(scope + '.', '', 1)
-                if complete_name in self.table_type:
-                    return self.table_type[complete_name]
-            
-            raise SemanticError(f"NameError: Undefined variable '{var_name}'", self.lineno)
+        raise SemanticError(f"NameError: Undefined variable '{var_name}'", self.lineno)
         
     def get_type(self, expression: ExpressionNode):
         if isinstance(expression, UnaryExpressionNode):
@@ -267,10 +336,21 @@ class Semantic:
 
     def check_types_assigment(self, variable, result: ExpressionNode):
         expected_type = self.get_var_type(variable) if isinstance(variable, str) else self.get_type(variable)
+        return self.check_value_type(expected_type, result)
+
+    def check_value_type(self, expected_type: str, result: ExpressionNode):
         result_type = self.get_type(result)
 
         if expected_type == result_type:
             return result
+
+        # Maps only take a map of the same types, or a literal whose items can be cast to them
+        if self.is_map(expected_type) or self.is_map(result_type):
+            if not self.is_map(expected_type) or not self.is_map(result_type):
+                self.throw_error(result_type, expected_type)
+            if isinstance(result, MapLiteral):
+                return self.check_map_literal(expected_type, result)
+            self.throw_error(result_type, expected_type)
         
         is_not_primitive = lambda x: x not in self.primitive_types
         count_sublists = lambda x: x.count('[]') + (1 if x == 'STRING' else 0)
@@ -299,7 +379,7 @@ class Semantic:
         return self.throw_error(result_type, expected_type)
 
     def check_function_call(self, func_name, arguments):
-        if func_name in utils.built_in_funcs: # or func_name in utils.built_in_obj_funcs
+        if func_name in utils.built_in_funcs or func_name in utils.method_opcodes: # or func_name in utils.built_in_obj_funcs
             return arguments # TODO
 
         expected_num_args = len(self.functions[func_name])
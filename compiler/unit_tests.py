@@ -1,6 +1,13 @@
 import os
+import struct
+import tempfile
 import unittest
 from main import Compiler
+from utils.utils import opcodes, sections, encode_inc_arg
+from utils.image import HEADER, SECTION, INSTRUCTION, build_image
+from utils.cache import CompilationCache
+
+opcodes_names = {value: key for key, value in opcodes.items()}
 
 class TestCompiler(unittest.TestCase):
     def setUp(self):
@@ -29,6 +36,175 @@ class TestCompiler(unittest.TestCase):
                 with open(self.output_file, "r") as output, open(expected_file, "r") as expected:
                     self.assertEqual(output.read(), expected.read(), f"Output mismatch for {test_file}")
 
+    def compile_source(self, source: str, optimize: bool = False) -> list:
+        source_file = "compiler/expected_outputs/source-to-check.lx"
+        with open(source_file, "w") as file:
+            file.write(source)
+
+        try:
+            compiler = Compiler(source_file, self.output_file)
+            compiler.generate_lexer()
+            compiler.generate_ast()
+            if optimize: compiler.optimize_ast()
+            compiler.generate_bytecode()
+            if optimize: compiler.optimize_bytecode()
+        finally:
+            os.remove(source_file)
+
+        self.compiler = compiler
+        self.constants = compiler.constants
+        return [(opcodes_names[opcode], arg) for opcode, arg in compiler.bytecode]
+
+    def test_constant_folding(self):
+        source = 'int x = 60 * 60 * 24;\nint y = x * 1 + 0;\nstring s = "a" + "b" + 1;\nfloat f = 7 % 2.5;'
+        self.assertEqual(self.compile_source(source, optimize=True), [
+            ("STORE", 86400), ("STORE_MEM", -1),
+            ("LOAD", 0), ("STORE_MEM", -1),
+            ("LOAD_CONST", 0), ("STORE_MEM", -1),
+            ("STORE_FLOAT", 2.0), ("STORE_MEM", -1),
+        ])
+        self.assertEqual(self.constants, [(4, 3, b"ab1")])
+
+    def test_peephole(self):
+        source = 'noinline func twice(int a) -> int { return a * 2; }\nint x = 0;\nwhile (x != 4) { x = x + twice(1); }'
+        self.assertEqual(self.compile_source(source, optimize=True), [
+            ("STORE", 3), ("STORE_MEM", -1), ("JUMP", 9),
+            ("ENTER", 1), ("STORE_LOCAL", 0), ("LOAD_LOCAL", 0), ("STORE", 2), ("MUL_I", 0), ("RETURN", 0),
+            ("STORE", 0), ("STORE_MEM", -1),
+            ("LOAD", 4), ("STORE", 4), ("NEQ_I", 0), ("JUMP_IF_FALSE", 21),
+            ("LOAD", 4), ("STORE", 1), ("CALL", 0), ("ADD_I", 0), ("STORE_MEM", 4), ("JUMP", 11),
+        ])
+
+    def test_superinstructions(self):
+        source = 'int t = 0;\nfor (int i = 0; i < 10) { t = t + i; }\nwhile (t > 3) { t = t + -2; }'
+        self.assertEqual(self.compile_source(source), [
+            ("STORE", 0), ("STORE_MEM", -1), ("STORE", 0), ("STORE_MEM", -1),
+            ("LOAD", 4), ("STORE", 10), ("JUMP_IF_GE", 13),
+            ("LOAD", 0), ("LOAD", 4), ("ADD_I", 0), ("STORE_MEM", 0), ("INC_MEM", encode_inc_arg(4, 1)), ("JUMP", 4),
+            ("LOAD", 0), ("STORE", 3), ("JUMP_IF_LE", 18), ("INC_MEM", encode_inc_arg(0, -2)), ("JUMP", 13),
+        ])
+
+    def test_typed_operations(self):
+        source = 'float f = 1.5;\nint i = 2;\nprint(f * f < f);\nprint(i * f);\nprint("n: " + i);\nprint(i % 2 - i);'
+        operations = [opcode for opcode, _ in self.compile_source(source) if opcode not in ("LOAD", "STORE", "LOAD_CONST", "SYSCALL")]
+        # Mixed operands and the float result of '%' keep the untyped opcodes
+        self.assertEqual(operations, [
+            "STORE_FLOAT", "STORE_MEM", "STORE_MEM", "MUL_F", "LT_F", "MUL", "CONCAT", "MOD", "SUB",
+        ])
+
+    def test_string_append(self):
+        source = 'string s = "a";\nint n = 1;\ns = s + n;\ns = "b" + s;\nfunc f(string t) -> int { t = t + "c"; return 0; }'
+        self.assertEqual([instruction for instruction in self.compile_source(source) if instruction[0].startswith(("APPEND", "CONCAT"))], [
+            ("APPEND_MEM", 0), ("CONCAT", 0), ("APPEND_LOCAL", 0),
+        ])
+
+    def test_maps(self):
+        source = 'Map<string, int> m = {"a": 1};\nm["b"] = 2;\nprint(m["a"]);\nprint(m.has("b"));\nMap<int, float> e;'
+        # The map is always on top of the key (and of the value, for BUILD_MAP and MAP_SET)
+        self.assertEqual(self.compile_source(source), [
+            ("STORE", 1), ("LOAD_CONST", 0), ("BUILD_MAP", 1), ("STORE_MEM", -1),
+            ("STORE", 2), ("LOAD_CONST", 1), ("LOAD", 0), ("MAP_SET", 0),
+            ("LOAD_CONST", 0), ("LOAD", 0), ("MAP_GET", 0), ("SYSCALL", 1),
+            ("LOAD_CONST", 1), ("LOAD", 0), ("MAP_HAS", 0), ("SYSCALL", 1),
+            ("BUILD_MAP", 0), ("STORE_MEM", -1),
+        ])
+
+    def test_dead_code(self):
+        source = (
+            'func f(int a) -> int { return f(a); }\nfunc h(int a) -> int { return a; print(a); }\n'
+            'if (false) { print(1); } else { print(h(2)); }\nwhile (1 > 2) { print(3); }'
+        )
+        self.assertEqual(self.compile_source(source, optimize=True), [
+            ("STORE", 3), ("STORE_MEM", -1), ("JUMP", 7),
+            ("ENTER", 1), ("STORE_LOCAL", 0), ("LOAD_LOCAL", 0), ("RETURN", 0),
+            ("STORE", 2), ("CALL", 0), ("SYSCALL", 1),
+        ])
+        # print(a) after the return, the if (false) branch and the while
+        self.assertEqual(self.compiler.removed_statements, 3)
+        self.assertEqual(self.compiler.removed_functions, ["f"])
+
+    def test_inliner(self):
+        source = (
+            'func scale(int a, int b) -> int { return a * b + 1; }\nnoinline func twice(int a) -> int { return a * 2; }\n'
+            'int x = 3;\nprint(scale(x, 2));\nprint(scale(twice(x), x));'
+        )
+        bytecode = self.compile_source(source, optimize=True)
+        # The top-level code reserves the slots of the second call, 'scale' is removed once inlined
+        self.assertEqual(bytecode[:4], [("ENTER", 2), ("STORE", 4), ("STORE_MEM", -1), ("JUMP", 10)])
+        self.assertEqual(self.compiler.removed_functions, ["scale"])
+        # Constant and variable arguments are used in place
+        self.assertEqual(bytecode[12:18], [("LOAD", 4), ("STORE", 2), ("MUL_I", 0), ("STORE", 1), ("ADD_I", 0), ("SYSCALL", 1)])
+        # Otherwise they are stored in the caller's frame, in the order CALL would
+        self.assertEqual(bytecode[18:25], [
+            ("LOAD", 4), ("LOAD", 4), ("CALL", 0), ("STORE_LOCAL", 0), ("STORE_LOCAL", 1), ("LOAD_LOCAL", 0), ("LOAD_LOCAL", 1),
+        ])
+
+    def test_constant_pool(self):
+        source = 'string[] x = ["ab", "c"];\nprint("ab");\nint[][] m = [[1], [2]];'
+        self.assertEqual(self.compile_source(source), [
+            ("LOAD_CONST", 2), ("STORE_MEM", -1),
+            ("LOAD_CONST", 0), ("SYSCALL", 1),
+            ("LOAD_CONST", 5), ("STORE_MEM", -1),
+        ])
+        self.assertEqual(self.constants, [
+            (4, 2, b"ab"), (4, 1, b"c"), (5, 2, struct.pack("2I", 0, 1)),
+            (2, 1, struct.pack("I", 1)), (2, 1, struct.pack("I", 2)), (5, 2, struct.pack("2I", 3, 4)),
+        ])
+
+    def test_resolver(self):
+        source = (
+            'int a = 1;\nfunc f(int a) -> int {\n    int b = 0;\n    b = b + a;\n    return b;\n}\n'
+            'if (a > 0) {\n    int c = a;\n} else {\n    float a = 2.5;\n}\na = f(a);'
+        )
+        bytecode = self.compile_source(source)
+        # Parameter 'a' (slot 0) shadows the global one (0), even in assignments
+        self.assertEqual(bytecode[5:7], [("ENTER", 2), ("STORE_LOCAL", 0)])
+        self.assertEqual(bytecode[9:13], [("LOAD_LOCAL", 1), ("LOAD_LOCAL", 0), ("ADD_I", 0), ("STORE_LOCAL", 1)])
+        # The 'a' declared in the else block doesn't leak out of it
+        self.assertEqual(bytecode[21], ("LOAD", 0))
+        self.assertEqual(bytecode[-3:], [("LOAD", 0), ("CALL", 4), ("STORE_MEM", 0)])
+
+    def test_binary_image(self):
+        bytecode = [(opcodes["STORE_FLOAT"], 1.5), (opcodes["STORE_MEM"], -1), (opcodes["LOAD_CONST"], 0)]
+        image = build_image(bytecode, [(4, 2, b"hi")], {"main": 0}, "test.lx")
+
+        magic, version, section_count, size = HEADER.unpack_from(image, 0)
+        self.assertEqual((magic, version, section_count, size), (b"BSTK", 2, 4, len(image)))
+
+        table = [SECTION.unpack_from(image, HEADER.size + i * SECTION.size) for i in range(section_count)]
+        for _, offset, _, _ in table:
+            self.assertEqual(offset % 8, 0)
+
+        section_type, offset, length, count = table[0]
+        self.assertEqual((section_type, length, count), (sections["CODE"], 4 * INSTRUCTION.size, 4))
+        self.assertEqual(INSTRUCTION.unpack_from(image, offset + INSTRUCTION.size), (opcodes["STORE_MEM"], 0xFFFFFFFF))
+        self.assertEqual(INSTRUCTION.unpack_from(image, offset + 3 * INSTRUCTION.size), (opcodes["HALT"], 0))
+        self.assertEqual(image[table[2][1]:table[2][1] + table[2][2]], b"test.lx")
+
+    def test_compilation_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            compiler = Compiler(self.test_files[1], self.output_file)
+            cache = CompilationCache(directory)
+            self.assertFalse(compiler.load_from_cache(cache, []))
+            compiler.generate_lexer()
+            compiler.generate_ast()
+            compiler.generate_bytecode()
+            compiler.save_to_cache(cache)
+
+            cached = Compiler(self.test_files[1], self.output_file)
+            self.assertTrue(cached.load_from_cache(cache, []))
+            self.assertEqual(cached.bytecode, compiler.bytecode)
+            self.assertEqual(cached.constants, compiler.constants)
+            self.assertFalse(Compiler(self.test_files[1], self.output_file).load_from_cache(cache, ["-O"]))
+
+            # Only the most recently used entries are kept
+            cache.max_size = 2 * os.path.getsize(cache.get_path(cached.cache_key))
+            for i in range(3):
+                compiler.cache_key = cache.get_key(str(i).encode(), [])
+                compiler.save_to_cache(cache)
+            self.assertEqual(len(os.listdir(directory)), 2)
+            self.assertIsNone(cache.load(cached.cache_key))
+
     def tearDown(self):
         # Clean up the generated output file
         if os.path.exists(self.output_file):
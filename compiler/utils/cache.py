@@ -0,0 +1,88 @@
+import os
+import sys
+import marshal
+import hashlib
+from utils.utils import IMAGE_VERSION
+
+COMPILER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_DIRECTORY = os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "bytestack")
+DEFAULT_MAX_SIZE = 64 * 1024 * 1024
+
+_compiler_version = None
+
+def compiler_version() -> str:
+    """ Digest of the compiler sources, so any change to the compiler invalidates old entries """
+    global _compiler_version
+    if _compiler_version is None:
+        # marshal's format can change between Python versions
+        digest = hashlib.sha256(f"{IMAGE_VERSION} {sys.version}".encode())
+        for directory, subdirectories, files in os.walk(COMPILER_DIR):
+            subdirectories.sort()
+            for name in sorted(files):
+                if not name.endswith(".py"): continue
+                with open(os.path.join(directory, name), "rb") as file:
+                    digest.update(file.read())
+        _compiler_version = digest.hexdigest()
+
+    return _compiler_version
+
+class CompilationCache:
+    """
+    Content-addressed store of compiled programs: the key is the hash of the
+    source, the compiler version and the flags that change the bytecode.
+    Entries are files whose modification time is refreshed on every hit, so
+    the oldest ones are evicted first once the directory exceeds max_size.
+    """
+    def __init__(self, directory: str = DEFAULT_DIRECTORY, max_size: int = DEFAULT_MAX_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+
+    def get_key(self, source: bytes, flags: list) -> str:
+        digest = hashlib.sha256(compiler_version().encode())
+        digest.update(" ".join(sorted(flags)).encode() + b"\0")
+        digest.update(source)
+        return digest.hexdigest()
+
+    def get_path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def load(self, key: str):
+        path = self.get_path(key)
+        try:
+            with open(path, "rb") as file:
+                entry = marshal.load(file)
+            os.utime(path)
+        except (OSError, ValueError, EOFError, TypeError):
+            return None
+
+        return entry
+
+    def store(self, key: str, entry):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # Write to a temporary file first so concurrent builds never read half an entry
+            temporary = f"{self.get_path(key)}.{os.getpid()}.tmp"
+            with open(temporary, "wb") as file:
+                marshal.dump(entry, file)
+            os.replace(temporary, self.get_path(key))
+            self.evict()
+        except OSError:
+            pass # The cache is only an optimization
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            try:
+                stat = os.stat(self.get_path(name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_size: break
+            try:
+                os.remove(self.get_path(name))
+            except OSError:
+                pass
+            total -= size
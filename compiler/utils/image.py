@@ -0,0 +1,66 @@
+import struct
+from utils.utils import IMAGE_MAGIC, IMAGE_VERSION, opcodes, sections
+
+# Every section starts at an 8-byte boundary so the VM can mmap the file and
+# use the code section in place: each instruction has the layout of the VM's
+# Instruction struct (1 byte opcode, 3 bytes of padding, 4 bytes argument)
+HEADER = struct.Struct("<4sHHI")     # magic, version, number of sections, image size
+SECTION = struct.Struct("<IIII")     # type, offset, size in bytes, number of items
+INSTRUCTION = struct.Struct("<B3xI")
+ALIGNMENT = 8
+
+def align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) & ~(ALIGNMENT - 1)
+
+def pack_code(bytecode: list) -> bytearray:
+    """ The instructions plus a final HALT, which is also where the jumps to the end of the program land """
+    code = bytearray(INSTRUCTION.size * (len(bytecode) + 1))
+    for i, (opcode, arg) in enumerate(bytecode):
+        if isinstance(arg, float):
+            arg = struct.unpack("<I", struct.pack("<f", arg))[0]
+
+        INSTRUCTION.pack_into(code, i * INSTRUCTION.size, opcode, arg & 0xFFFFFFFF)
+
+    INSTRUCTION.pack_into(code, len(bytecode) * INSTRUCTION.size, opcodes["HALT"], 0)
+    return code
+
+def pack_constants(constants: list) -> bytes:
+    """ [count] and then [type (1B)][length (4B)][data] for each constant """
+    data = [struct.pack("<I", len(constants))]
+    for data_type, length, raw_data in constants:
+        data.append(struct.pack("<BI", data_type, length))
+        data.append(raw_data)
+
+    return b"".join(data)
+
+def pack_functions(functions: dict) -> bytes:
+    """ [start position (4B)][name length (4B)][name] for each function """
+    data = []
+    for name, position in functions.items():
+        encoded_name = name.encode()
+        data.append(struct.pack("<II", position, len(encoded_name)))
+        data.append(encoded_name)
+
+    return b"".join(data)
+
+def build_image(bytecode: list, constants: list, functions: dict, source: str) -> bytearray:
+    content = [
+        (sections["CODE"], pack_code(bytecode), len(bytecode) + 1),
+        (sections["CONSTANTS"], pack_constants(constants), len(constants)),
+        (sections["DEBUG"], source.encode(), 1),
+        (sections["FUNCTIONS"], pack_functions(functions), len(functions)),
+    ]
+
+    offsets = []
+    offset = align(HEADER.size + SECTION.size * len(content))
+    for _, data, _ in content:
+        offsets.append(offset)
+        offset = align(offset + len(data))
+
+    image = bytearray(offset)
+    HEADER.pack_into(image, 0, IMAGE_MAGIC, IMAGE_VERSION, len(content), len(image))
+    for i, ((section_type, data, count), section_offset) in enumerate(zip(content, offsets)):
+        SECTION.pack_into(image, HEADER.size + i * SECTION.size, section_type, section_offset, len(data), count)
+        image[section_offset:section_offset + len(data)] = data
+
+    return image
@@ -1,8 +1,26 @@
+# Nodes use __slots__: generated programs produce millions of them
 class ASTNode:
+    __slots__ = ()
+
     def to_dict(self) -> dict:
         return {"type": self.__class__.__name__}
 
+    def fields(self):
+        """ Names of the attributes of the node, declared in the __slots__ of its classes """
+        for cls in type(self).__mro__:
+            yield from getattr(cls, '__slots__', ())
+
+    def children(self):
+        for field in self.fields():
+            value = getattr(self, field, None)
+            if isinstance(value, ASTNode):
+                yield value
+            elif isinstance(value, list):
+                yield from (item for item in value if isinstance(item, ASTNode))
+
 class BlockNode(ASTNode):
+    __slots__ = ('statements',)
+
     def __init__(self, statements: list[ASTNode]):
         self.statements: list = statements
 
@@ -13,8 +31,8 @@ class BlockNode(ASTNode):
         }
 
 class ExpressionNode(ASTNode):
-    def __init__(self, expression_type: str):
-        self.expression_type = expression_type
+    __slots__ = ()
+    expression_type = None
 
     def to_dict(self) -> dict:
         return {
@@ -22,11 +40,14 @@ class ExpressionNode(ASTNode):
         }
 
 class BinaryExpression(ExpressionNode):
+    __slots__ = ('operator', 'right', 'left', 'operand_type')
+    expression_type = 'Binary Expression'
+
     def __init__(self, operator: str, right: ExpressionNode, left: ExpressionNode):
-        super().__init__('Binary Expression')
         self.operator = operator
         self.right = right
         self.left = left
+        self.operand_type = None # Set by the Semantic analyzer, selects the typed opcode
 
     def to_dict(self) -> dict:
         return {
@@ -37,9 +58,9 @@ class BinaryExpression(ExpressionNode):
         }
 
 class UnaryExpressionNode(ExpressionNode):
-    def __init__(self, unary_expression_type: str):
-        super().__init__('Unary Expression')
-        self.unary_expression_type = unary_expression_type
+    __slots__ = ()
+    expression_type = 'Unary Expression'
+    unary_expression_type = None
 
     def to_dict(self) -> dict:
         return {
@@ -47,10 +68,14 @@ class UnaryExpressionNode(ExpressionNode):
         }
 
 class Literal(UnaryExpressionNode):
+    __slots__ = ('value_type', 'value', 'address', 'local')
+    unary_expression_type = 'Literal'
+
     def __init__(self, value_type: str, value):
-        super().__init__('Literal')
         self.value_type = value_type
         self.value = value
+        self.address = None # Set by the Resolver when value_type is VARIABLE
+        self.local = False
 
     def to_dict(self) -> dict:
         return {
@@ -60,11 +85,17 @@ class Literal(UnaryExpressionNode):
         }
 
 class FunctionCall(UnaryExpressionNode):
+    __slots__ = ('identifier', 'args', 'from_obj', 'address', 'local', 'object_address', 'object_local')
+    unary_expression_type = 'Function Call'
+
     def __init__(self, identifier: str, args: list[ExpressionNode], from_obj: str = 'System'):
-        super().__init__('Function Call')
         self.identifier = identifier
         self.args = args
         self.from_obj = from_obj
+        self.address = None
+        self.local = False
+        self.object_address = None
+        self.object_local = False
 
     def to_dict(self) -> dict:
         return {
@@ -74,9 +105,29 @@ class FunctionCall(UnaryExpressionNode):
             "from_obj": self.from_obj
         }
 
+class InlineCall(UnaryExpressionNode):
+    __slots__ = ('identifier', 'args', 'parameters', 'expression')
+    unary_expression_type = 'Function Call'
+
+    def __init__(self, identifier: str, args: list[ExpressionNode], parameters: list, expression: ExpressionNode):
+        self.identifier = identifier
+        self.args = args
+        self.parameters = parameters # Copies of the function parameters, bound to slots of the caller's frame
+        self.expression = expression # Copy of the returned expression
+
+    def to_dict(self) -> dict:
+        return {
+            **super().to_dict(),
+            "identifier": self.identifier,
+            "args": [arg.to_dict() for arg in self.args],
+            "expression": self.expression.to_dict()
+        }
+
 class NewCall(UnaryExpressionNode):
+    __slots__ = ('struct', 'args')
+    unary_expression_type = 'Function Call'
+
     def __init__(self, identifier: str, args: list[ExpressionNode]):
-        super().__init__('Function Call')
         self.struct = identifier
         self.args = args
 
@@ -88,11 +139,15 @@ class NewCall(UnaryExpressionNode):
         }
 
 class MemberAccess(UnaryExpressionNode):
+    __slots__ = ('object', 'attribute', 'list_access', 'address', 'local')
+    unary_expression_type = 'Member Access'
+
     def __init__(self, obj: str, attribute: any, list_access: bool = False):
-        super().__init__('Member Access')
         self.object = obj
         self.attribute = attribute
         self.list_access = list_access
+        self.address = None # Address of 'object' when it is an identifier
+        self.local = False
 
     def to_dict(self) -> dict:
         return {
@@ -101,9 +156,42 @@ class MemberAccess(UnaryExpressionNode):
             "attribute": self.attribute
         }
 
+class MapAccess(MemberAccess):
+    """ map[key], 'attribute' is the key expression """
+    __slots__ = ()
+    unary_expression_type = 'Map Access'
+
+    def __init__(self, obj: str, key: ExpressionNode):
+        super().__init__(obj, key, True)
+
+    def to_dict(self) -> dict:
+        return {
+            **super().to_dict(),
+            "attribute": self.attribute.to_dict()
+        }
+
+class MapLiteral(UnaryExpressionNode):
+    __slots__ = ('map_type', 'keys', 'values')
+    unary_expression_type = 'Map Literal'
+
+    def __init__(self, map_type: str, keys: list[ExpressionNode], values: list[ExpressionNode]):
+        self.map_type = map_type # 'MAP<K,V>', or just 'MAP' while the literal is empty
+        self.keys = keys
+        self.values = values
+
+    def to_dict(self) -> dict:
+        return {
+            **super().to_dict(),
+            "map_type": self.map_type,
+            "keys": [key.to_dict() for key in self.keys],
+            "values": [value.to_dict() for value in self.values]
+        }
+
 class CastingExpression(UnaryExpressionNode):
+    __slots__ = ('new_type', 'old_type', 'expression')
+    unary_expression_type = 'Casting Expression'
+
     def __init__(self, new_type: str, old_type: str, expression: ExpressionNode):
-        super().__init__('Casting Expression')
         self.new_type = new_type
         self.old_type = old_type
         self.expression = expression
@@ -117,6 +205,8 @@ class CastingExpression(UnaryExpressionNode):
         }
 
 class DeclarationNode(ASTNode):
+    __slots__ = ('obj_declarated', 'identifier')
+
     def __init__(self, obj_declarated, identifier: str):
         self.obj_declarated = obj_declarated
         self.identifier = identifier
@@ -128,10 +218,14 @@ class DeclarationNode(ASTNode):
         }
 
 class VariableDeclaration(DeclarationNode):
+    __slots__ = ('var_type', 'initializer', 'address', 'local')
+
     def __init__(self, identifier: str, var_type: str, initializer: ExpressionNode = None):
         super().__init__('Variable', identifier)
         self.var_type = var_type
         self.initializer = initializer
+        self.address = None
+        self.local = False
 
     def to_dict(self) -> dict:
         return {
@@ -141,9 +235,12 @@ class VariableDeclaration(DeclarationNode):
         }
 
 class ParameterNode(ASTNode):
+    __slots__ = ('type', 'identifier', 'address')
+
     def __init__(self, p_type: str, identifier: str):
         self.type = p_type
         self.identifier = identifier
+        self.address = None # Always a slot of the function frame
 
     def to_dict(self) -> dict:
         return {
@@ -153,11 +250,17 @@ class ParameterNode(ASTNode):
         }
 
 class FunctionDeclaration(DeclarationNode):
+    __slots__ = ('return_type', 'parameters', 'body', 'address', 'local', 'frame_size', 'inline')
+
     def __init__(self, identifier: str, return_type: str, parameters: list[ParameterNode], body: BlockNode):
         super().__init__('Function', identifier)
         self.return_type = return_type
         self.parameters = parameters
         self.body = body
+        self.address = None
+        self.local = False
+        self.frame_size = 0 # Slots needed by its parameters and variables
+        self.inline = True # False when declared with 'noinline'
 
     def to_dict(self) -> dict:
         return {
@@ -168,6 +271,8 @@ class FunctionDeclaration(DeclarationNode):
         }
 
 class ClassDeclaration(DeclarationNode):
+    __slots__ = ('attributes',)
+
     def __init__(self, identifier: str, attr: list[ParameterNode]):
         super().__init__('Struct', identifier)
         self.attributes = attr
@@ -180,6 +285,8 @@ class ClassDeclaration(DeclarationNode):
         }
 
 class StatementNode(ASTNode):
+    __slots__ = ('statement',)
+
     def __init__(self, statement):
         super().__init__()
         self.statement = statement
@@ -190,10 +297,14 @@ class StatementNode(ASTNode):
         }
 
 class AssignmentNode(StatementNode):
+    __slots__ = ('identifier', 'value', 'address', 'local')
+
     def __init__(self, identifier: str, value: ExpressionNode):
         super().__init__("Assignment")
         self.identifier = identifier
         self.value = value
+        self.address = None
+        self.local = False
     
     def to_dict(self) -> dict:
         return {
@@ -203,6 +314,8 @@ class AssignmentNode(StatementNode):
         }
 
 class IfStatement(StatementNode):
+    __slots__ = ('condition', 'then_block', 'elif_statements', 'else_block')
+
     def __init__(self, condition: ExpressionNode, then_block: BlockNode, else_if_statements: list[StatementNode] = None, else_block: BlockNode = None):
         super().__init__("IfStatement")
         self.condition = condition
@@ -220,6 +333,8 @@ class IfStatement(StatementNode):
         }
 
 class WhileStatement(StatementNode):
+    __slots__ = ('condition', 'body')
+
     def __init__(self, condition: ExpressionNode, body: BlockNode):
         super().__init__("WhileStatement")
         self.condition = condition
@@ -233,6 +348,8 @@ class WhileStatement(StatementNode):
         }
 
 class ForStatement(StatementNode):
+    __slots__ = ('variable', 'condition', 'increment', 'body')
+
     def __init__(self, variable: str, condition: ExpressionNode, increment: ExpressionNode, body: BlockNode):
         super().__init__("ForStatement")
         self.variable = variable
@@ -250,6 +367,8 @@ class ForStatement(StatementNode):
         }
 
 class BreakStatement(StatementNode):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__("BreakStatement")
 
@@ -257,6 +376,8 @@ class BreakStatement(StatementNode):
         return {**super().to_dict()}
 
 class ContinueStatement(StatementNode):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__("ContinueStatement")
 
@@ -264,6 +385,8 @@ class ContinueStatement(StatementNode):
         return {**super().to_dict()}
 
 class ReturnStatement(StatementNode):
+    __slots__ = ('expression',)
+
     def __init__(self, expression: ExpressionNode):
         super().__init__("ReturnStatement")
         self.expression = expression
@@ -1,4 +1,5 @@
 opcodes = {
+    "HALT"          : 0x00,
     "ADD"           : 0x01,
     "SUB"           : 0x02,
     "MUL"           : 0x03,
@@ -29,9 +30,57 @@ opcodes = {
     "DEFINE_TYPE"   : 0x1C,
     "NEW"           : 0x1D,
     "CAST"          : 0x1E,
+    "JUMP_IF_FALSE" : 0x1F,
+    "STORE_MEM_LOAD": 0x20,
+    "LOAD_CONST"    : 0x21,
+    "LOAD_LOCAL"    : 0x22,
+    "STORE_LOCAL"   : 0x23,
+    "ENTER"         : 0x24,
+    "INC_MEM"       : 0x25,
+    "INC_LOCAL"     : 0x26,
+    "JUMP_IF_LT"    : 0x27,
+    "JUMP_IF_GE"    : 0x28,
+    "JUMP_IF_GT"    : 0x29,
+    "JUMP_IF_LE"    : 0x2A,
+    "ADD_I"         : 0x2B,
+    "SUB_I"         : 0x2C,
+    "MUL_I"         : 0x2D,
+    "EQ_I"          : 0x2E,
+    "NEQ_I"         : 0x2F,
+    "LT_I"          : 0x30,
+    "GT_I"          : 0x31,
+    "LE_I"          : 0x32,
+    "GE_I"          : 0x33,
+    "ADD_F"         : 0x34,
+    "SUB_F"         : 0x35,
+    "MUL_F"         : 0x36,
+    "DIV_F"         : 0x37,
+    "EQ_F"          : 0x38,
+    "NEQ_F"         : 0x39,
+    "LT_F"          : 0x3A,
+    "GT_F"          : 0x3B,
+    "LE_F"          : 0x3C,
+    "GE_F"          : 0x3D,
+    "CONCAT"        : 0x3E,
+    "APPEND_MEM"    : 0x3F,
+    "APPEND_LOCAL"  : 0x40,
+    "BUILD_MAP"     : 0x41,
+    "MAP_GET"       : 0x42,
+    "MAP_SET"       : 0x43,
+    "MAP_HAS"       : 0x44,
     "SYSCALL"       : 0xFF
 }
 
+IMAGE_MAGIC = b"BSTK"
+IMAGE_VERSION = 2
+
+sections = {
+    "CODE"      : 1,
+    "CONSTANTS" : 2,
+    "DEBUG"     : 3,
+    "FUNCTIONS" : 4,
+}
+
 operations = {
     '+': "ADD", '-': "SUB", '*': "MUL", '/': "DIV", '%': "MOD",
     'and': "AND", 'or': "OR", 'not': "NOT",
@@ -39,6 +88,21 @@ operations = {
     '<': "LT", '<=': "LE", '>': "GT", '>=': "GE",
 }
 
+# Operand type (BinaryExpression.operand_type): operator -> typed opcode
+typed_operations = {
+    'INT': {
+        '+': "ADD_I", '-': "SUB_I", '*': "MUL_I",
+        '==': "EQ_I", '!=': "NEQ_I",
+        '<': "LT_I", '<=': "LE_I", '>': "GT_I", '>=': "GE_I",
+    },
+    'FLOAT': {
+        '+': "ADD_F", '-': "SUB_F", '*': "MUL_F", '/': "DIV_F",
+        '==': "EQ_F", '!=': "NEQ_F",
+        '<': "LT_F", '<=': "LE_F", '>': "GT_F", '>=': "GE_F",
+    },
+    'STRING': {'+': "CONCAT"},
+}
+
 literals = ['INT_LITERAL', 'FLOAT_LITERAL', 'STRING_LITERAL', 'BOOL_LITERAL']
 
 built_in_funcs = {
@@ -62,6 +126,17 @@ built_in_funcs = {
     'lower'     : 17,
     'upper'     : 18,
     'toString'  : 19,
+    'open'      : 20,
+    'close'     : 21,
+    'read_chunk': 22,
+    'keys'      : 23,
+    'values'    : 24,
+    'remove'    : 25,
+}
+
+# Methods compiled to an opcode instead of a syscall, the object is pushed after the arguments
+method_opcodes = {
+    'has'       : "MAP_HAS",
 }
 
 TYPE_IDS = {
@@ -71,6 +146,7 @@ TYPE_IDS = {
     "FLOAT": 3,
     "CHAR": 4,
     "STRING": 5,
+    "POINTER": 5,
 }
 
 def get_type_info(type_str):
@@ -82,6 +158,10 @@ def get_type_info(type_str):
     else:
         return TYPE_IDS[base_type], depth
 
+def encode_inc_arg(address: int, step: int) -> int:
+    """ INC_MEM / INC_LOCAL argument: the address (24 bits) and the step as a signed byte """
+    return ((step & 0xFF) << 24) | address
+
 def encode_cast_arg(from_type_str, to_type_str):
     from_id, from_depth = get_type_info(from_type_str)
     to_id, to_depth = get_type_info(to_type_str)
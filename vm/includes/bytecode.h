@@ -0,0 +1,31 @@
+#pragma once
+#include <stdint.h>
+#include "structs-type.h"
+
+// Layout of the files generated by the compiler (compiler/utils/image.py):
+// [ImageHeader][SectionHeader * section_count][sections, each one 8-byte aligned]
+#define IMAGE_MAGIC "BSTK"
+#define IMAGE_VERSION 2
+
+typedef enum {
+    CODE_SECTION = 1,       // Instruction[] ending with HALT, used in place
+    CONSTANTS_SECTION,      // [count] + [type (1B)][length (4B)][data] per constant
+    DEBUG_SECTION,          // Source filename
+    FUNCTIONS_SECTION       // [start position (4B)][name length (4B)][name] per function
+} SectionType;
+
+typedef struct {
+    char magic[4];
+    uint16_t version;
+    uint16_t section_count;
+    uint32_t image_size;
+} ImageHeader;
+
+typedef struct {
+    uint32_t type;
+    uint32_t offset;
+    uint32_t size;
+    uint32_t count;
+} SectionHeader;
+
+_Static_assert(sizeof(Instruction) == 8, "Instruction must match the code section layout");
@@ -3,9 +3,9 @@
 #include <stdlib.h>
 #include <stdint.h>
 #include "structs-type.h"
-#define ERR_COUNT 11
+#define ERR_COUNT 13
 
-Instruction instr_pc_log;
+extern Instruction instr_pc_log;
 
 typedef enum {
     FILE_NOT_FOUND,
@@ -18,6 +18,8 @@ typedef enum {
     FILE_PERMISSION_ERROR,
     UNSUPPORTED_COMPLEX_TYPE_WRITE,
     UNSUPPORTED_BINARY_WRITE,
+    INVALID_BYTECODE,
+    KEY_NOT_FOUND,
     UNDEFINED_ERROR
 } ErrorCode;
 
@@ -0,0 +1,5 @@
+#pragma once
+#include "../virtual_machine.h"
+
+void gc_collect(VM*);
+void gc_print_stats(const Heap*);
@@ -0,0 +1,27 @@
+#pragma once
+#include "memory.h"
+#include "stack.h"
+
+#define MAP_INITIAL_CAPACITY 8 // Slots of a new map, kept at most half full
+
+// A map is a MAP_TYPE heap block: the header followed by a power of two of slots.
+// Open addressing with linear probing, a slot with hash 0 is empty
+typedef struct {
+    uint32_t count;
+    uint32_t capacity;
+} MapHeader;
+
+typedef struct {
+    uint32_t hash; // Never 0 in a used slot
+    uint32_t key;  // String keys are interned blocks
+    uint32_t value;
+    uint8_t key_type;
+    uint8_t value_type;
+} MapEntry;
+
+size_t map_new(Heap*, size_t);
+int map_get(Heap*, size_t, Item, Item*);
+void map_set(Heap*, size_t, Item, Item);
+void map_remove(Heap*, size_t, Item);
+size_t map_count(Heap*, size_t);
+MapEntry *map_entries(Heap*, size_t, size_t*);
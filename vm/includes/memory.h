@@ -4,18 +4,66 @@
 #include <stdlib.h>
 #include <string.h>
 
-extern size_t sizes[POINTER_TYPE + 1];
+#define HEAP_INITIAL_CAPACITY 64
+#define POOL_SLOT_SIZE 16      // Heap blocks start in a pooled slot of this many bytes
+#define POOL_CHUNK_SLOTS 4096
+#define INTERN_INITIAL_CAPACITY 64 // Slots of the intern table, kept at most half full
+
+// Garbage collector: it runs once this many blocks are in use, then waits until the
+// blocks in use are GC_GROWTH times the ones that survived (-D to change them)
+#ifndef GC_INITIAL_THRESHOLD
+#define GC_INITIAL_THRESHOLD 4096
+#endif
+#ifndef GC_GROWTH
+#define GC_GROWTH 2
+#endif
+
+extern size_t sizes[MAP_TYPE + 1];
+
+typedef struct PoolChunk {
+    struct PoolChunk *next;
+    uint8_t slots[POOL_CHUNK_SLOTS][POOL_SLOT_SIZE];
+} PoolChunk;
+
+typedef struct {
+    PoolChunk *chunks;
+    size_t used;      // Slots handed out of the newest chunk
+    void *free_slots; // Released slots, each one holding the next
+} Pool;
 
 typedef struct {
     uint8_t *data;
     DataType *table_type;
-    size_t size;
+    size_t size;     // Bytes in use
+    size_t capacity; // Bytes allocated, grows geometrically
+    Pool *pool;      // Set while data is a slot of this pool
+    uint32_t hash;   // Interned strings only (never 0), the block is read-only from then on
+    uint8_t builder; // String only referenced by the variable APPEND grows it in
 } Memory;
 
+typedef struct {
+    size_t collections;
+    size_t blocks_freed;
+    size_t bytes_freed;
+    double pause_ms; // Time spent collecting
+} GCStats;
+
 typedef struct {
     Memory *blocks;
     DataType *table_type;
     size_t size;
+    size_t capacity;
+    size_t constants; // Blocks [0, constants) come from the constant pool and are read-only
+    Pool pool;
+    size_t *free_blocks; // Released block indexes, reused before the table grows
+    size_t free_count;
+    size_t free_capacity;
+    size_t *strings; // Intern table: index + 1 of every interned string, 0 in the empty slots
+    size_t strings_count;
+    size_t strings_capacity;
+    size_t collect_at; // Blocks in use that make heap_add_block request a collection
+    int collect;       // Collection requested, the VM runs it between two instructions
+    GCStats gc;
 } Heap;
 
 void memory_init(Memory*);
@@ -24,12 +72,30 @@ void memory_destroy(Memory*);
 int memory_write(Memory*, uint32_t, uint32_t, size_t);
 int memory_read(Memory*, uint32_t, uint32_t*, size_t);
 int memory_expand(Memory*, size_t);
+int memory_reserve(Memory*, size_t);
+void memory_shrink(Memory*);
+
+void pool_init(Pool*);
+void pool_destroy(Pool*);
+void *pool_alloc(Pool*);
+void pool_release(Pool*, void*);
 
 void heap_init(Heap*);
 void heap_destroy(Heap*);
 
 size_t heap_add_block(Heap*, DataType);
+void heap_free_block(Heap*, size_t);
 size_t duplicate_heap_block(Heap*, size_t, DataType, int);
+size_t heap_own_block(Heap*, size_t);
 int heap_write(Heap*, size_t, uint32_t, size_t, size_t);
 int heap_read(Heap*, size_t, uint32_t*, size_t, size_t);
-int heap_remove_element(Heap*, size_t, size_t, size_t);
\ No newline at end of file
+int heap_remove_element(Heap*, size_t, size_t, size_t);
+
+size_t heap_intern(Heap*, size_t);
+uint32_t heap_hash(Heap*, size_t);
+int heap_equal(Heap*, size_t, size_t);
+
+int heap_copy(Heap*, size_t, size_t, size_t, size_t, size_t);
+int heap_concat(Heap*, size_t, size_t);
+int heap_append(Heap*, size_t, const void*, size_t);
+int heap_fill(Heap*, size_t, size_t, uint32_t, size_t, size_t);
\ No newline at end of file
@@ -0,0 +1,80 @@
+#pragma once
+
+// Same numbering as the opcodes table of the compiler (compiler/utils/utils.py)
+#define OPCODES(X) \
+    X(HALT, 0x00) \
+    X(ADD, 0x01) \
+    X(SUB, 0x02) \
+    X(MUL, 0x03) \
+    X(DIV, 0x04) \
+    X(MOD, 0x05) \
+    X(AND, 0x06) \
+    X(OR, 0x07) \
+    X(NOT, 0x08) \
+    X(EQ, 0x09) \
+    X(NEQ, 0x0A) \
+    X(LT, 0x0B) \
+    X(GT, 0x0C) \
+    X(LE, 0x0D) \
+    X(GE, 0x0E) \
+    X(STORE, 0x0F) \
+    X(STORE_BYTE, 0x10) \
+    X(STORE_FLOAT, 0x11) \
+    X(STORE_CHAR, 0x12) \
+    X(STORE_MEM, 0x13) \
+    X(LOAD, 0x14) \
+    X(JUMP, 0x15) \
+    X(JUMP_IF, 0x16) \
+    X(CALL, 0x17) \
+    X(RETURN, 0x18) \
+    X(BUILD_LIST, 0x19) \
+    X(LIST_ACCESS, 0x1A) \
+    X(LIST_SET, 0x1B) \
+    X(DEFINE_TYPE, 0x1C) \
+    X(NEW, 0x1D) \
+    X(CAST, 0x1E) \
+    X(JUMP_IF_FALSE, 0x1F) \
+    X(STORE_MEM_LOAD, 0x20) \
+    X(LOAD_CONST, 0x21) \
+    X(LOAD_LOCAL, 0x22) \
+    X(STORE_LOCAL, 0x23) \
+    X(ENTER, 0x24) \
+    X(INC_MEM, 0x25) \
+    X(INC_LOCAL, 0x26) \
+    X(JUMP_IF_LT, 0x27) \
+    X(JUMP_IF_GE, 0x28) \
+    X(JUMP_IF_GT, 0x29) \
+    X(JUMP_IF_LE, 0x2A) \
+    X(ADD_I, 0x2B) \
+    X(SUB_I, 0x2C) \
+    X(MUL_I, 0x2D) \
+    X(EQ_I, 0x2E) \
+    X(NEQ_I, 0x2F) \
+    X(LT_I, 0x30) \
+    X(GT_I, 0x31) \
+    X(LE_I, 0x32) \
+    X(GE_I, 0x33) \
+    X(ADD_F, 0x34) \
+    X(SUB_F, 0x35) \
+    X(MUL_F, 0x36) \
+    X(DIV_F, 0x37) \
+    X(EQ_F, 0x38) \
+    X(NEQ_F, 0x39) \
+    X(LT_F, 0x3A) \
+    X(GT_F, 0x3B) \
+    X(LE_F, 0x3C) \
+    X(GE_F, 0x3D) \
+    X(CONCAT, 0x3E) \
+    X(APPEND_MEM, 0x3F) \
+    X(APPEND_LOCAL, 0x40) \
+    X(BUILD_MAP, 0x41) \
+    X(MAP_GET, 0x42) \
+    X(MAP_SET, 0x43) \
+    X(MAP_HAS, 0x44) \
+    X(SYSCALL, 0xFF)
+
+typedef enum {
+#define OPCODE_ENUM(name, code) OP_##name = code,
+    OPCODES(OPCODE_ENUM)
+#undef OPCODE_ENUM
+} Opcode;
@@ -3,7 +3,7 @@
 #include "errors.h"
 
 #define STACK_SIZE 1024
-int string_format;
+extern int string_format;
 
 // Method: Tagged Struct - To see later: NaN-Boxing
 typedef struct {
@@ -8,7 +8,8 @@ typedef enum {
     FLOAT_TYPE,
     CHAR_TYPE,
     POINTER_TYPE,
-    OBJ_TYPE
+    OBJ_TYPE,
+    MAP_TYPE // Block of a hash table, see map.h
 } DataType;
 
 typedef struct {
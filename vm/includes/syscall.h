@@ -4,6 +4,7 @@
 #include "errors.h"
 #include "stack.h"
 #include "structs-type.h"
+#include "map.h"
 
 #include <stdlib.h>
 #include <stdio.h>
@@ -21,6 +22,9 @@ void built_in_scan(VM*);
 void built_in_type(VM*);
 void built_in_read(VM*);
 void built_in_write(VM*);
+void built_in_open(VM*);
+void built_in_close(VM*);
+void built_in_read_chunk(VM*);
 
 // List Functions
 void built_in_size(VM*);
@@ -35,4 +39,9 @@ void built_in_min(VM*);
 void built_in_max(VM*);
 void built_in_lower(VM*);
 void built_in_upper(VM*);
-void built_in_toString(VM*);
\ No newline at end of file
+void built_in_toString(VM*);
+
+// Map Functions
+void built_in_keys(VM*);
+void built_in_values(VM*);
+void built_in_remove(VM*);
\ No newline at end of file
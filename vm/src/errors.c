@@ -1,5 +1,7 @@
 #include "../includes/errors.h"
 
+Instruction instr_pc_log;
+
 char* error_messages[ERR_COUNT] = {
     "\033[1;35mFileNotFound:\033[0m unable to locate the specified file.",
     "\033[1;35mRecursionOverflow:\033[0m maximum recursion depth exceeded, resulting in a stack overflow.",
@@ -11,6 +13,8 @@ char* error_messages[ERR_COUNT] = {
     "\033[1;35mFileOpenError:\033[0m failed to open the file, please check file permissions or path validity.",
     "\033[1;35mUnsupportedSerialization:\033[0m attempted to serialize a complex data structure in an unsupported format.",
     "\033[1;35mBinaryWriteError:\033[0m attempted to write a complex data structure to a binary file, which is not permitted.",
+    "\033[1;35mInvalidBytecode:\033[0m the file is not a bytecode image generated by a compatible compiler version.",
+    "\033[1;35mKeyError:\033[0m the key is not in the map.",
     "\033[1;35mUnknownError:\033[0m an unexpected error occurred, please check the logs for more details."
 };
 
@@ -0,0 +1,102 @@
+#include "../includes/gc.h"
+#include "../includes/map.h"
+#include <time.h>
+
+typedef struct {
+    Heap *heap;
+    uint8_t *marks;
+    size_t *pending; // Marked blocks whose items haven't been marked yet
+    size_t count;
+} Marker;
+
+// Constants are never freed, and values that only look like an index are ignored
+static void mark(Marker *marker, uint32_t index) {
+    Heap *heap = marker->heap;
+    if (index < heap->constants || index >= heap->size || marker->marks[index]) return;
+    if (heap->blocks[index].data == NULL) return; // Already free
+
+    marker->marks[index] = 1;
+    marker->pending[marker->count++] = index;
+}
+
+// Arrays and maps nest to any depth, so the marked blocks are traced from a stack instead of recursively
+static void trace(Marker *marker) {
+    Heap *heap = marker->heap;
+    while (marker->count > 0) {
+        size_t index = marker->pending[--marker->count];
+        if (heap->table_type[index] == MAP_TYPE) {
+            size_t capacity;
+            MapEntry *entries = map_entries(heap, index, &capacity);
+            for (size_t i = 0; i < capacity; i++) {
+                if (!entries[i].hash) continue;
+                if (entries[i].key_type == POINTER_TYPE) mark(marker, entries[i].key);
+                if (entries[i].value_type == POINTER_TYPE) mark(marker, entries[i].value);
+            }
+            continue;
+        }
+        if (heap->table_type[index] != POINTER_TYPE) continue;
+
+        Memory *block = &heap->blocks[index];
+        for (size_t i = 0; i + sizes[POINTER_TYPE] <= block->size; i += sizes[POINTER_TYPE]) {
+            uint32_t child;
+            memory_read(block, i, &child, sizes[POINTER_TYPE]);
+            mark(marker, child);
+        }
+    }
+}
+
+// Mark and sweep. The roots are the operand stack, the locals of the active calls and
+// the global variables holding a pointer; everything else goes back to the free list
+void gc_collect(VM *vm) {
+    clock_t start = clock();
+    Heap *heap = &vm->heap;
+
+    Marker marker = { heap, calloc(heap->size, 1), malloc(sizeof(size_t) * heap->size), 0 };
+    if (heap->size > 0 && (!marker.marks || !marker.pending)) handle_error(UNDEFINED_ERROR);
+
+    for (int i = 0; i <= vm->stack.top; i++)
+        if (vm->stack.data[i].type == POINTER_TYPE) mark(&marker, vm->stack.data[i].value);
+
+    for (int i = 0; i < vm->locals_top; i++)
+        if (vm->locals[i].type == POINTER_TYPE) mark(&marker, vm->locals[i].value);
+
+    for (size_t address = 0; address + sizes[POINTER_TYPE] <= vm->memory.size; address++) {
+        if (vm->memory.table_type[address] != POINTER_TYPE) continue;
+
+        uint32_t index;
+        memory_read(&vm->memory, address, &index, sizes[POINTER_TYPE]);
+        mark(&marker, index);
+    }
+
+    trace(&marker);
+
+    for (size_t i = heap->constants; i < heap->size; i++) {
+        if (heap->blocks[i].data == NULL) continue;
+
+        // Survivors that lost most of their items give back the unused capacity
+        if (marker.marks[i]) {
+            if (heap->blocks[i].capacity >= 4 * heap->blocks[i].size) memory_shrink(&heap->blocks[i]);
+            continue;
+        }
+
+        heap->gc.blocks_freed++;
+        heap->gc.bytes_freed += heap->blocks[i].size;
+        heap_free_block(heap, i);
+    }
+
+    free(marker.marks);
+    free(marker.pending);
+
+    size_t in_use = heap->size - heap->free_count;
+    heap->collect_at = (in_use * GC_GROWTH > GC_INITIAL_THRESHOLD) ? in_use * GC_GROWTH : GC_INITIAL_THRESHOLD;
+    heap->collect = 0;
+    heap->gc.collections++;
+    heap->gc.pause_ms += 1000.0 * (clock() - start) / CLOCKS_PER_SEC;
+}
+
+void gc_print_stats(const Heap *heap) {
+    fprintf(stderr, "gc collections: %zu\n", heap->gc.collections);
+    fprintf(stderr, "gc pause (ms): %.3f\n", heap->gc.pause_ms);
+    fprintf(stderr, "gc blocks freed: %zu\n", heap->gc.blocks_freed);
+    fprintf(stderr, "gc bytes freed: %zu\n", heap->gc.bytes_freed);
+}
@@ -0,0 +1,150 @@
+#include "../includes/map.h"
+
+static MapHeader *map_header(Heap *heap, size_t map) {
+    if (map >= heap->size || heap->table_type[map] != MAP_TYPE) handle_error(TYPE_CAST_ERROR);
+    return (MapHeader *) heap->blocks[map].data;
+}
+
+// Murmur3's finalizer: consecutive ints land all over the table instead of in a single run
+static uint32_t key_hash(Heap *heap, Item key) {
+    if (key.type == POINTER_TYPE) return heap_hash(heap, key.value);
+
+    uint32_t hash = key.value;
+    hash ^= hash >> 16;
+    hash *= 0x85ebca6bu;
+    hash ^= hash >> 13;
+    hash *= 0xc2b2ae35u;
+    hash ^= hash >> 16;
+    return hash ? hash : 1;
+}
+
+// Strings by content, any other key by value (as the ALU compares a byte with an int)
+static int key_equal(Heap *heap, const MapEntry *entry, Item key) {
+    if ((entry->key_type == POINTER_TYPE) != (key.type == POINTER_TYPE)) return 0;
+    if (key.type == POINTER_TYPE) return heap_equal(heap, entry->key, key.value);
+
+    return entry->key == key.value;
+}
+
+// Linear probing from the hash: the slot holding the key or the empty one ending the run
+static size_t map_find(Heap *heap, MapHeader *header, uint32_t hash, Item key) {
+    MapEntry *entries = (MapEntry *) (header + 1);
+    size_t mask = header->capacity - 1;
+    size_t slot = hash & mask;
+
+    while (entries[slot].hash) {
+        if (entries[slot].hash == hash && key_equal(heap, &entries[slot], key)) break;
+        slot = (slot + 1) & mask;
+    }
+
+    return slot;
+}
+
+// Doubles the slots and inserts every entry again
+static MapHeader *map_grow(Heap *heap, size_t map) {
+    Memory *block = &heap->blocks[map];
+    MapHeader *header = (MapHeader *) block->data;
+    size_t old_capacity = header->capacity, capacity = old_capacity * 2;
+
+    MapEntry *old = malloc(sizeof(MapEntry) * old_capacity);
+    if (old == NULL) handle_error(UNDEFINED_ERROR);
+    memcpy(old, header + 1, sizeof(MapEntry) * old_capacity);
+
+    if (memory_expand(block, sizeof(MapHeader) + sizeof(MapEntry) * capacity) != 0) handle_error(UNDEFINED_ERROR);
+    header = (MapHeader *) block->data;
+    header->capacity = capacity;
+
+    MapEntry *entries = (MapEntry *) (header + 1);
+    memset(entries, 0, sizeof(MapEntry) * capacity);
+    for (size_t i = 0; i < old_capacity; i++) {
+        if (!old[i].hash) continue;
+
+        size_t slot = old[i].hash & (capacity - 1);
+        while (entries[slot].hash) slot = (slot + 1) & (capacity - 1);
+        entries[slot] = old[i];
+    }
+
+    free(old);
+    return header;
+}
+
+// Empty map with room for count entries before it has to grow
+size_t map_new(Heap *heap, size_t count) {
+    size_t capacity = MAP_INITIAL_CAPACITY;
+    while (capacity < 2 * count) capacity *= 2;
+
+    size_t map = heap_add_block(heap, MAP_TYPE);
+    if (map == (size_t) -1) handle_error(UNDEFINED_ERROR);
+    if (memory_expand(&heap->blocks[map], sizeof(MapHeader) + sizeof(MapEntry) * capacity) != 0)
+        handle_error(UNDEFINED_ERROR);
+
+    MapHeader *header = (MapHeader *) heap->blocks[map].data;
+    header->count = 0;
+    header->capacity = capacity;
+    return map;
+}
+
+// 1 and the value of the key in *value, 0 when the map doesn't hold it
+int map_get(Heap *heap, size_t map, Item key, Item *value) {
+    MapHeader *header = map_header(heap, map);
+    MapEntry *entry = (MapEntry *) (header + 1) + map_find(heap, header, key_hash(heap, key), key);
+    if (!entry->hash) return 0;
+
+    *value = (Item) { entry->value_type, entry->value };
+    return 1;
+}
+
+// The map owns the values stored (see heap_own_block) and keeps its own interned copy of the keys
+void map_set(Heap *heap, size_t map, Item key, Item value) {
+    MapHeader *header = map_header(heap, map);
+    uint32_t hash = key_hash(heap, key);
+    size_t slot = map_find(heap, header, hash, key);
+    if (value.type == POINTER_TYPE) value.value = heap_own_block(heap, value.value);
+
+    MapEntry *entry = (MapEntry *) (header + 1) + slot;
+    if (!entry->hash) {
+        if (2 * (header->count + 1) > header->capacity) {
+            header = map_grow(heap, map);
+            slot = map_find(heap, header, hash, key);
+        }
+        if (key.type == POINTER_TYPE) key.value = heap_intern(heap, key.value);
+
+        entry = (MapEntry *) (header + 1) + slot;
+        *entry = (MapEntry) { hash, key.value, 0, key.type, 0 };
+        header->count++;
+    }
+
+    entry->value = value.value;
+    entry->value_type = value.type;
+}
+
+// Backward shift, as in the intern table: nothing happens when the key isn't in the map
+void map_remove(Heap *heap, size_t map, Item key) {
+    MapHeader *header = map_header(heap, map);
+    MapEntry *entries = (MapEntry *) (header + 1);
+    size_t mask = header->capacity - 1;
+    size_t slot = map_find(heap, header, key_hash(heap, key), key);
+    if (!entries[slot].hash) return;
+
+    for (size_t next = (slot + 1) & mask; entries[next].hash; next = (next + 1) & mask) {
+        size_t home = entries[next].hash & mask;
+        if (((next - home) & mask) >= ((next - slot) & mask)) {
+            entries[slot] = entries[next];
+            slot = next;
+        }
+    }
+
+    entries[slot].hash = 0;
+    header->count--;
+}
+
+size_t map_count(Heap *heap, size_t map) {
+    return map_header(heap, map)->count;
+}
+
+// The slots of the map (*capacity of them), the empty ones have hash 0
+MapEntry *map_entries(Heap *heap, size_t map, size_t *capacity) {
+    MapHeader *header = map_header(heap, map);
+    *capacity = header->capacity;
+    return (MapEntry *) (header + 1);
+}
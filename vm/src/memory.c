@@ -1,22 +1,31 @@
 #include "../includes/memory.h"
 
-size_t sizes[POINTER_TYPE + 1] = {
+size_t sizes[MAP_TYPE + 1] = {
     [UNASSIGNED_TYPE] = 4,
     [BOOL_TYPE]  = 1,
     [INT_TYPE]   = 4,
     [FLOAT_TYPE] = 4,
     [CHAR_TYPE]  = 1,
-    [POINTER_TYPE] = 4
+    [POINTER_TYPE] = 4,
+    [MAP_TYPE] = 16 // A whole entry: maps can't be read as lists
 };
 
 void memory_init(Memory *mem) {
     mem->data = malloc(sizeof(uint8_t));
     mem->table_type = malloc(sizeof(DataType));
     mem->size = 0;
+    mem->capacity = 1;
+    mem->pool = NULL;
+    mem->hash = 0;
+    mem->builder = 0;
 }
 
 void memory_destroy(Memory *mem) {
-    if (mem->data) {
+    if (mem->pool) {
+        pool_release(mem->pool, mem->data);
+        mem->pool = NULL;
+        mem->data = NULL;
+    } else if (mem->data) {
         free(mem->data);
         mem->data = NULL;
     }
@@ -27,22 +36,80 @@ void memory_destroy(Memory *mem) {
     }
 
     mem->size = 0;
+    mem->capacity = 0;
+    mem->hash = 0;
+    mem->builder = 0;
 }
 
-int memory_expand(Memory *mem, size_t new_size) {
+// Makes room for capacity bytes, the size doesn't change
+int memory_reserve(Memory *mem, size_t capacity) {
+    if (capacity <= mem->capacity) return 0;
+
+    uint8_t *new_data;
+    if (mem->pool) {
+        // Outgrows its slot: moves to its own allocation
+        new_data = malloc(capacity);
+        if (!new_data) return -1;
+
+        memcpy(new_data, mem->data, mem->size);
+        pool_release(mem->pool, mem->data);
+        mem->pool = NULL;
+    } else {
+        new_data = realloc(mem->data, capacity);
+        if (!new_data) return -1;
+    }
+    mem->data = new_data;
+
+    // Heap blocks keep the type of their items in the heap table instead
+    if (mem->table_type) {
+        DataType *new_table_type = realloc(mem->table_type, sizeof(DataType) * capacity);
+        if (!new_table_type) return -1;
+        mem->table_type = new_table_type;
+    }
+
+    mem->capacity = capacity;
+    return 0;
+}
+
+// Grows the size, doubling the capacity when it's reached so appends are amortized O(1).
+// Reused slots and the bytes past the size still hold old data: they are cleared unless
+// the caller overwrites all of them
+static int memory_grow(Memory *mem, size_t new_size, int clear) {
     if (new_size <= mem->size) return 0;
 
-    uint8_t *new_data = realloc(mem->data, new_size);
-    DataType *new_table_type = realloc(mem->table_type, new_size);
-    if (!new_data) return -1;
+    if (new_size > mem->capacity) {
+        size_t capacity = mem->capacity * 2;
+        if (memory_reserve(mem, (capacity < new_size) ? new_size : capacity) != 0) return -1;
+    }
 
-    mem->data = new_data;
-    mem->table_type = new_table_type;
-    mem->size = new_size;
+    if (clear) memset(mem->data + mem->size, 0, new_size - mem->size);
+    if (mem->table_type) memset(mem->table_type + mem->size, 0, sizeof(DataType) * (new_size - mem->size));
 
+    mem->size = new_size;
     return 0;
 }
 
+int memory_expand(Memory *mem, size_t new_size) {
+    return memory_grow(mem, new_size, 1);
+}
+
+// Frees the capacity past the size (a pooled block keeps its slot)
+void memory_shrink(Memory *mem) {
+    if (mem->pool || mem->size == 0 || mem->size == mem->capacity) return;
+
+    uint8_t *new_data = realloc(mem->data, mem->size);
+    if (!new_data) return;
+    mem->data = new_data;
+
+    if (mem->table_type) {
+        DataType *new_table_type = realloc(mem->table_type, sizeof(DataType) * mem->size);
+        if (!new_table_type) return;
+        mem->table_type = new_table_type;
+    }
+
+    mem->capacity = mem->size;
+}
+
 int memory_write(Memory *mem, uint32_t address, uint32_t value, size_t size) {
     if (size == 0 || size > 4) 
         handle_error(MEMORY_ACCESS_OUT_OF_BOUNDS);
@@ -75,62 +142,309 @@ int memory_read(Memory *mem, uint32_t address, uint32_t *value, size_t size) {
     return 0;
 }
 
+void pool_init(Pool *pool) {
+    pool->chunks = NULL;
+    pool->used = POOL_CHUNK_SLOTS;
+    pool->free_slots = NULL;
+}
+
+void pool_destroy(Pool *pool) {
+    while (pool->chunks) {
+        PoolChunk *next = pool->chunks->next;
+        free(pool->chunks);
+        pool->chunks = next;
+    }
+
+    pool_init(pool);
+}
+
+void *pool_alloc(Pool *pool) {
+    if (pool->free_slots) {
+        void *slot = pool->free_slots;
+        pool->free_slots = *(void **) slot;
+        return slot;
+    }
+
+    if (pool->used == POOL_CHUNK_SLOTS) {
+        PoolChunk *chunk = malloc(sizeof(PoolChunk));
+        if (!chunk) return NULL;
+
+        chunk->next = pool->chunks;
+        pool->chunks = chunk;
+        pool->used = 0;
+    }
+
+    return pool->chunks->slots[pool->used++];
+}
+
+void pool_release(Pool *pool, void *slot) {
+    *(void **) slot = pool->free_slots;
+    pool->free_slots = slot;
+}
+
 void heap_init(Heap *heap) {
     heap->blocks = NULL;
     heap->table_type = NULL;
     heap->size = 0;
+    heap->capacity = 0;
+    heap->constants = 0;
+    pool_init(&heap->pool);
+    heap->free_blocks = NULL;
+    heap->free_count = 0;
+    heap->free_capacity = 0;
+    heap->strings = NULL;
+    heap->strings_count = 0;
+    heap->strings_capacity = 0;
+    heap->collect_at = GC_INITIAL_THRESHOLD;
+    heap->collect = 0;
+    heap->gc = (GCStats) { 0 };
 }
 
 void heap_destroy(Heap *heap) {
+    // The pooled slots go away with their chunks
     for (size_t i = 0; i < heap->size; ++i)
-        memory_destroy(&heap->blocks[i]);
+        if (!heap->blocks[i].pool) free(heap->blocks[i].data);
 
+    pool_destroy(&heap->pool);
     free(heap->blocks);
     free(heap->table_type);
-    heap->blocks = NULL;
-    heap->table_type = NULL;
-    heap->size = 0;
+    free(heap->free_blocks);
+    free(heap->strings);
+    heap_init(heap);
 }
 
-size_t heap_add_block(Heap *heap, DataType type) {
-    Memory *new_blocks = realloc(heap->blocks, sizeof(Memory) * (heap->size + 1));
-    DataType *new_types = realloc(heap->table_type, sizeof(DataType) * (heap->size + 1));
-    if (new_types == NULL || new_blocks == NULL) return -1;
+static int heap_reserve(Heap *heap, size_t capacity) {
+    if (capacity <= heap->capacity) return 0;
 
+    size_t new_capacity = heap->capacity ? heap->capacity : HEAP_INITIAL_CAPACITY;
+    while (new_capacity < capacity) new_capacity *= 2;
+
+    Memory *new_blocks = realloc(heap->blocks, sizeof(Memory) * new_capacity);
+    if (new_blocks == NULL) return -1;
     heap->blocks = new_blocks;
+
+    DataType *new_types = realloc(heap->table_type, sizeof(DataType) * new_capacity);
+    if (new_types == NULL) return -1;
     heap->table_type = new_types;
 
-    memory_init(&heap->blocks[heap->size]);
-    heap->table_type[heap->size] = type;
+    heap->capacity = new_capacity;
+    return 0;
+}
+
+size_t heap_add_block(Heap *heap, DataType type) {
+    void *slot = pool_alloc(&heap->pool);
+    if (slot == NULL) return -1;
+
+    size_t index;
+    if (heap->free_count > 0) {
+        index = heap->free_blocks[--heap->free_count];
+    } else {
+        if (heap_reserve(heap, heap->size + 1) != 0) {
+            pool_release(&heap->pool, slot);
+            return -1;
+        }
+        index = heap->size++;
+    }
+
+    Memory *block = &heap->blocks[index];
+    block->data = slot;
+    block->table_type = NULL;
+    block->size = 0;
+    block->capacity = POOL_SLOT_SIZE;
+    block->pool = &heap->pool;
+    block->hash = 0;
+    block->builder = 0;
+    heap->table_type[index] = type;
+
+    if (heap->size - heap->free_count >= heap->collect_at) heap->collect = 1;
+    return index;
+}
+
+// FNV-1a, 0 is kept to tell the blocks that aren't interned
+static uint32_t string_hash(const uint8_t *data, size_t length) {
+    uint32_t hash = 2166136261u;
+    for (size_t i = 0; i < length; i++)
+        hash = (hash ^ data[i]) * 16777619u;
+
+    return hash ? hash : 1;
+}
+
+// Linear probing from the hash: the slot holding an equal string or the empty one ending the run
+static size_t intern_find(const Heap *heap, uint32_t hash, const uint8_t *data, size_t length) {
+    size_t mask = heap->strings_capacity - 1;
+    size_t slot = hash & mask;
+
+    while (heap->strings[slot]) {
+        Memory *string = &heap->blocks[heap->strings[slot] - 1];
+        if (string->hash == hash && string->size == length && memcmp(string->data, data, length) == 0) break;
+        slot = (slot + 1) & mask;
+    }
+
+    return slot;
+}
+
+static void intern_grow(Heap *heap) {
+    size_t *old = heap->strings, old_capacity = heap->strings_capacity;
+    size_t capacity = old_capacity ? old_capacity * 2 : INTERN_INITIAL_CAPACITY;
+
+    heap->strings = calloc(capacity, sizeof(size_t));
+    if (heap->strings == NULL) handle_error(UNDEFINED_ERROR);
+    heap->strings_capacity = capacity;
+
+    for (size_t i = 0; i < old_capacity; i++) {
+        if (!old[i]) continue;
+
+        size_t slot = heap->blocks[old[i] - 1].hash & (capacity - 1);
+        while (heap->strings[slot]) slot = (slot + 1) & (capacity - 1);
+        heap->strings[slot] = old[i];
+    }
+
+    free(old);
+}
+
+// Backward shift: the strings after the removed one move up when their probe run allows it
+static void intern_remove(Heap *heap, size_t index) {
+    Memory *block = &heap->blocks[index];
+    size_t mask = heap->strings_capacity - 1;
+    size_t slot = block->hash & mask;
+    while (heap->strings[slot] != index + 1) slot = (slot + 1) & mask;
+
+    for (size_t next = (slot + 1) & mask; heap->strings[next]; next = (next + 1) & mask) {
+        size_t home = heap->blocks[heap->strings[next] - 1].hash & mask;
+        if (((next - home) & mask) >= ((next - slot) & mask)) {
+            heap->strings[slot] = heap->strings[next];
+            slot = next;
+        }
+    }
+
+    heap->strings[slot] = 0;
+    heap->strings_count--;
+    block->hash = 0;
+}
+
+// The interned string equal to the string block: an earlier one, or else the block itself when
+// it's a constant or a copy of it otherwise, as its owner can still mutate it. The interned
+// block becomes read-only with its hash cached (its size is the cached length)
+size_t heap_intern(Heap *heap, size_t index) {
+    if (index >= heap->size) handle_error(MEMORY_ACCESS_OUT_OF_BOUNDS);
+
+    Memory *block = &heap->blocks[index];
+    DataType type = heap->table_type[index];
+    if (type != CHAR_TYPE && !(type == UNASSIGNED_TYPE && block->size == 0)) handle_error(TYPE_CAST_ERROR);
+    if (block->hash) return index;
+
+    if (2 * (heap->strings_count + 1) > heap->strings_capacity) intern_grow(heap);
+
+    uint32_t hash = string_hash(block->data, block->size);
+    size_t slot = intern_find(heap, hash, block->data, block->size);
+    if (heap->strings[slot]) return heap->strings[slot] - 1;
+
+    if (index >= heap->constants) {
+        size_t copy = heap_add_block(heap, CHAR_TYPE);
+        if (copy == (size_t) -1) handle_error(UNDEFINED_ERROR);
+        heap_concat(heap, copy, index);
+        index = copy;
+    }
+
+    heap->blocks[index].hash = hash;
+    heap->strings[slot] = index + 1;
+    heap->strings_count++;
+    return index;
+}
+
+// Hash of a string block, the cached one when it's interned
+uint32_t heap_hash(Heap *heap, size_t index) {
+    if (index >= heap->size) handle_error(MEMORY_ACCESS_OUT_OF_BOUNDS);
+
+    Memory *block = &heap->blocks[index];
+    return block->hash ? block->hash : string_hash(block->data, block->size);
+}
+
+// Same item type and bytes (any empty blocks are equal, as the "" literal has no type)
+int heap_equal(Heap *heap, size_t a, size_t b) {
+    if (a == b) return 1;
+    if (a >= heap->size || b >= heap->size) handle_error(MEMORY_ACCESS_OUT_OF_BOUNDS);
+
+    Memory *left = &heap->blocks[a], *right = &heap->blocks[b];
+    // There's a single interned block for every content
+    if (left->hash && right->hash) return 0;
+    if (left->size != right->size) return 0;
+    if (left->size == 0) return 1;
+    if (heap->table_type[a] != heap->table_type[b]) return 0;
+
+    return memcmp(left->data, right->data, left->size) == 0;
+}
+
+// The index is handed out again by a later heap_add_block
+void heap_free_block(Heap *heap, size_t index) {
+    if (index < heap->constants || index >= heap->size) handle_error(MEMORY_ACCESS_OUT_OF_BOUNDS);
+    if (heap->blocks[index].hash) intern_remove(heap, index);
+
+    if (heap->free_count == heap->free_capacity) {
+        size_t new_capacity = heap->free_capacity ? heap->free_capacity * 2 : HEAP_INITIAL_CAPACITY;
+        size_t *new_free = realloc(heap->free_blocks, sizeof(size_t) * new_capacity);
+        if (new_free == NULL) handle_error(UNDEFINED_ERROR);
+
+        heap->free_blocks = new_free;
+        heap->free_capacity = new_capacity;
+    }
 
-    heap->size++;
-    return heap->size - 1;
+    memory_destroy(&heap->blocks[index]);
+    heap->blocks[index].size = 0;
+    heap->free_blocks[heap->free_count++] = index;
 }
 
 size_t duplicate_heap_block(Heap *heap, size_t address, DataType to_type, int depth) {
     if (address >= heap->size) handle_error(MEMORY_ACCESS_OUT_OF_BOUNDS);
-    
-    Memory src = heap->blocks[address];
-    
+
     DataType type = (depth == 1) ? to_type : heap->table_type[address];
     size_t new_index = heap_add_block(heap, type);
     if (new_index == -1) return -1;
-    
-    Memory *dst = &heap->blocks[new_index];
-    if (memory_expand(dst, src.size) != 0) return -1;
-    
-    for (size_t i = 0; i < src.size; i++) {
-        if (depth <= 1) {
-            uint32_t value;
-            heap_read(heap, address, &value, i * sizes[to_type], sizes[to_type]);
-            heap_write(heap, new_index, value, i * sizes[to_type], sizes[to_type]);
-        } else {
-            uint32_t child_address = src.data[i];
-            size_t new_child = duplicate_heap_block(heap, child_address, to_type, depth - 1);
-            if (new_child == -1) return -1;
-
-            heap_write(heap, new_index, new_child, i, 1);
-        }
+
+    size_t length = heap->blocks[address].size;
+    if (depth <= 1) {
+        heap_copy(heap, new_index, 0, address, 0, length);
+        return new_index;
+    }
+
+    // Nested array: every item is a block to duplicate too
+    if (memory_reserve(&heap->blocks[new_index], length) != 0) return -1;
+    for (size_t i = 0; i + sizes[POINTER_TYPE] <= length; i += sizes[POINTER_TYPE]) {
+        uint32_t child;
+        heap_read(heap, address, &child, i, sizes[POINTER_TYPE]);
+
+        size_t new_child = duplicate_heap_block(heap, child, to_type, depth - 1);
+        if (new_child == -1) return -1;
+
+        heap_write(heap, new_index, new_child, i, sizes[POINTER_TYPE]);
+    }
+
+    return new_index;
+}
+
+static int is_read_only(const Heap *heap, size_t index) {
+    return index < heap->constants || (index < heap->size && heap->blocks[index].hash);
+}
+
+// Constant blocks are shared by every LOAD_CONST of the same literal and interned strings
+// by every equal string, so they are copied (with their nested constants) before being
+// stored anywhere or mutated. Any other block stored is no longer a builder: it may be shared
+size_t heap_own_block(Heap *heap, size_t index) {
+    if (!is_read_only(heap, index)) {
+        if (index < heap->size) heap->blocks[index].builder = 0;
+        return index;
+    }
+
+    size_t new_index = heap_add_block(heap, heap->table_type[index]);
+    if (new_index == -1) handle_error(UNDEFINED_ERROR);
+    heap_copy(heap, new_index, 0, index, 0, heap->blocks[index].size);
+
+    if (heap->table_type[new_index] != POINTER_TYPE) return new_index;
+
+    for (size_t i = 0; i < heap->blocks[new_index].size; i += sizes[POINTER_TYPE]) {
+        uint32_t child;
+        heap_read(heap, new_index, &child, i, sizes[POINTER_TYPE]);
+        heap_write(heap, new_index, heap_own_block(heap, child), i, sizes[POINTER_TYPE]);
     }
 
     return new_index;
@@ -176,7 +490,58 @@ int heap_remove_element(Heap *heap, size_t block_index, size_t element_index, si
                 move_size);
     }
 
-    block->size -= 1;
+    block->size -= element_size;
+
+    return 0;
+}
+
+// Copies length bytes of block src, from src_offset, to block dst at dst_offset. Both
+// can be the same block with overlapping ranges
+int heap_copy(Heap *heap, size_t dst, size_t dst_offset, size_t src, size_t src_offset, size_t length) {
+    if (dst >= heap->size || src >= heap->size) handle_error(UNDEFINED_ERROR);
+    if (src_offset + length > heap->blocks[src].size) handle_error(MEMORY_ACCESS_OUT_OF_BOUNDS);
+
+    Memory *block = &heap->blocks[dst];
+    if (memory_grow(block, dst_offset + length, dst_offset > block->size) != 0) handle_error(UNDEFINED_ERROR);
+
+    memmove(heap->blocks[dst].data + dst_offset, heap->blocks[src].data + src_offset, length);
+    return 0;
+}
+
+// Appends block src at the end of block dst
+int heap_concat(Heap *heap, size_t dst, size_t src) {
+    if (dst >= heap->size || src >= heap->size) handle_error(UNDEFINED_ERROR);
+    return heap_copy(heap, dst, heap->blocks[dst].size, src, 0, heap->blocks[src].size);
+}
+
+// Appends length bytes from outside the heap at the end of the block
+int heap_append(Heap *heap, size_t index, const void *data, size_t length) {
+    if (index >= heap->size) handle_error(UNDEFINED_ERROR);
+
+    Memory *block = &heap->blocks[index];
+    size_t offset = block->size;
+    if (memory_grow(block, offset + length, 0) != 0) handle_error(UNDEFINED_ERROR);
+
+    memcpy(block->data + offset, data, length);
+    return 0;
+}
+
+// Writes count items of size bytes holding value, from offset on
+int heap_fill(Heap *heap, size_t index, size_t offset, uint32_t value, size_t size, size_t count) {
+    if (index >= heap->size || size == 0 || size > 4) handle_error(UNDEFINED_ERROR);
+    if (count == 0) return 0;
+
+    Memory *block = &heap->blocks[index];
+    size_t length = size * count;
+    if (memory_grow(block, offset + length, offset > block->size) != 0) handle_error(UNDEFINED_ERROR);
+
+    uint8_t *data = block->data + offset;
+    for (size_t i = 0; i < size; i++)
+        data[i] = (uint8_t) (value >> (8 * i));
+
+    // Every copy doubles the filled bytes
+    for (size_t filled = size; filled < length; filled *= 2)
+        memcpy(data + filled, data, (filled < length - filled) ? filled : length - filled);
 
     return 0;
 }
\ No newline at end of file
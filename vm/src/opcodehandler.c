@@ -1,66 +1,122 @@
 #include "../includes/opcode_handlers.h"
 
-void run_function(VM* vm, uint32_t func_id) {
-    if (vm->frame_pointer > RECURSION_LIMIT) handle_error(MAX_RECURSION_DEPTH_EXCEEDED);
-    vm->return_address[vm->frame_pointer++] = vm->pc;
-    vm->pc = vm->bytecode + func_id;
-    vm_run(vm);
+void handle_store_mem(VM *vm, Instruction instr) {
+    Item aux = pop(&vm->stack);
+    if (aux.type == POINTER_TYPE) aux.value = heap_own_block(&vm->heap, aux.value);
+    int address = memory_write(&vm->memory, instr.arg, aux.value, sizes[aux.type]);
+    if (address == -1) handle_error(MEMORY_ACCESS_OUT_OF_BOUNDS);
+    vm->memory.table_type[address] = aux.type;
 }
 
-void handle_store(VM *vm, Instruction instr) {
-    Item data = { INT_TYPE, instr.arg };
-    push(&vm->stack, data);
+// What LOAD would push from the address
+static Item load_mem(VM *vm, uint32_t address) {
+    uint32_t value;
+    DataType type = vm->memory.table_type[address];
+    type = (type >= 0 && type <= 5) ? type : 0;
+    memory_read(&vm->memory, address, &value, sizes[type]);
+    return (Item) { type, value };
 }
 
-void handle_store_byte(VM *vm, Instruction instr) {
-    Item arg = { BOOL_TYPE, instr.arg };
-    push(&vm->stack, arg);
+// STORE_MEM x; LOAD x
+void handle_store_mem_load(VM *vm, Instruction instr) {
+    handle_store_mem(vm, instr);
+    push(&vm->stack, load_mem(vm, instr.arg));
 }
 
-void handle_store_float(VM *vm, Instruction instr) {
-    Item arg = { FLOAT_TYPE, instr.arg };
-    push(&vm->stack, arg);
+void handle_store_local(VM *vm, Instruction instr) {
+    if (instr.arg >= (uint32_t) (vm->locals_top - vm->frame_base)) handle_error(MEMORY_ACCESS_OUT_OF_BOUNDS);
+    Item aux = pop(&vm->stack);
+    if (aux.type == POINTER_TYPE) aux.value = heap_own_block(&vm->heap, aux.value);
+    vm->locals[vm->frame_base + instr.arg] = aux;
 }
 
-void handle_store_char(VM *vm, Instruction instr) {
-    Item arg = { CHAR_TYPE, instr.arg };
-    push(&vm->stack, arg);
+// Any other type goes through the ALU, as the instructions replaced would
+static void add_in_place(VM *vm, Item item, int8_t step) {
+    push(&vm->stack, item);
+    push(&vm->stack, (Item) { INT_TYPE, (uint32_t) (int32_t) step });
+    alu(&vm->stack, 0x01); // ADD
+    if (string_format) string_format_proc(vm);
 }
 
-void handle_store_mem(VM *vm, Instruction instr) {
-    Item aux = pop(&vm->stack);
-    int address = memory_write(&vm->memory, instr.arg, aux.value, sizes[aux.type]);
-    if (address == -1) handle_error(MEMORY_ACCESS_OUT_OF_BOUNDS);
-    vm->memory.table_type[address] = aux.type;
+// LOAD x; STORE k; ADD; STORE_MEM x (x: lower 24 bits, k: signed upper byte)
+void handle_inc_mem(VM *vm, Instruction instr) {
+    uint32_t address = instr.arg & 0xFFFFFF, value;
+    int8_t step = (int8_t) (instr.arg >> 24);
+    if (address >= vm->memory.size) handle_error(MEMORY_ACCESS_OUT_OF_BOUNDS);
+
+    if (vm->memory.table_type[address] == INT_TYPE) {
+        memory_read(&vm->memory, address, &value, sizes[INT_TYPE]);
+        memory_write(&vm->memory, address, value + (uint32_t) (int32_t) step, sizes[INT_TYPE]);
+        return;
+    }
+
+    add_in_place(vm, load_mem(vm, address), step);
+    handle_store_mem(vm, (Instruction) { 0x13, address });
+}
+
+// LOAD_LOCAL x; STORE k; ADD; STORE_LOCAL x
+void handle_inc_local(VM *vm, Instruction instr) {
+    uint32_t slot = instr.arg & 0xFFFFFF;
+    int8_t step = (int8_t) (instr.arg >> 24);
+    if (slot >= (uint32_t) (vm->locals_top - vm->frame_base)) handle_error(MEMORY_ACCESS_OUT_OF_BOUNDS);
+
+    Item *local = &vm->locals[vm->frame_base + slot];
+    if (local->type == INT_TYPE) {
+        local->value += (uint32_t) (int32_t) step;
+        return;
+    }
+
+    add_in_place(vm, *local, step);
+    handle_store_local(vm, (Instruction) { 0x23, slot });
+}
+
+// s = s + item, the new string is written without heap_own_block, which would end the builder
+void handle_append_mem(VM *vm, Instruction instr) {
+    if (instr.arg >= vm->memory.size) handle_error(MEMORY_ACCESS_OUT_OF_BOUNDS);
+    Item item = pop(&vm->stack);
+    Item string = string_append(vm, load_mem(vm, instr.arg), item);
+
+    memory_write(&vm->memory, instr.arg, string.value, sizes[string.type]);
+    vm->memory.table_type[instr.arg] = string.type;
+}
+
+void handle_append_local(VM *vm, Instruction instr) {
+    if (instr.arg >= (uint32_t) (vm->locals_top - vm->frame_base)) handle_error(MEMORY_ACCESS_OUT_OF_BOUNDS);
+    Item item = pop(&vm->stack);
+    vm->locals[vm->frame_base + instr.arg] = string_append(vm, vm->locals[vm->frame_base + instr.arg], item);
 }
 
-void handle_load(VM *vm, Instruction instr) {
-    uint32_t buffer;
-    DataType buffer_type = vm->memory.table_type[instr.arg];
-    buffer_type = (buffer_type >= 0 && buffer_type <= 5) ? buffer_type : 0;
-    size_t size_buffer = sizes[buffer_type];
+// Result of LT/GT over the two operands on top of the stack, as the ALU computes it
+static int compare(VM *vm, uint8_t op) {
+    Item right = pop(&vm->stack), left = pop(&vm->stack);
+    if (left.type == INT_TYPE && right.type == INT_TYPE)
+        return (op == 0x0B) ? (int32_t) left.value < (int32_t) right.value : (int32_t) left.value > (int32_t) right.value;
 
-    memory_read(&vm->memory, instr.arg, &buffer, size_buffer);
-    push(&vm->stack, (Item) { buffer_type, buffer });
+    push(&vm->stack, left);
+    push(&vm->stack, right);
+    alu(&vm->stack, op);
+    if (string_format) string_format_proc(vm);
+    return pop(&vm->stack).value != 0;
 }
 
-void handle_jump(VM *vm, Instruction instr) {
-    vm->pc = vm->bytecode + instr.arg;
+// LT; JUMP_IF x
+void handle_jump_if_lt(VM *vm, Instruction instr) {
+    if (compare(vm, 0x0B)) vm->pc = vm->bytecode + instr.arg;
 }
 
-void handle_jump_if(VM *vm, Instruction instr) {
-    uint32_t aux = pop(&vm->stack).value;
-    if (aux != (uint32_t) 0)
-        vm->pc = vm->bytecode + instr.arg;
+// LT; NOT; JUMP_IF x
+void handle_jump_if_ge(VM *vm, Instruction instr) {
+    if (!compare(vm, 0x0B)) vm->pc = vm->bytecode + instr.arg;
 }
 
-void handle_call(VM *vm, Instruction instr) {
-    uint32_t dir = (instr.arg == -1) ? pop(&vm->stack).value : vm->memory.data[instr.arg];
-    run_function(vm, dir);
+// GT; JUMP_IF x
+void handle_jump_if_gt(VM *vm, Instruction instr) {
+    if (compare(vm, 0x0C)) vm->pc = vm->bytecode + instr.arg;
 }
 
-void handle_return(VM *vm, Instruction instr) {
-    vm->pc = vm->return_address[--vm->frame_pointer];
+// GT; NOT; JUMP_IF x
+void handle_jump_if_le(VM *vm, Instruction instr) {
+    if (!compare(vm, 0x0C)) vm->pc = vm->bytecode + instr.arg;
 }
 
 void handle_build_list(VM *vm, Instruction instr) {
@@ -76,10 +132,12 @@ void handle_build_list(VM *vm, Instruction instr) {
     Item item = pop(&vm->stack);
     size_t address = heap_add_block(&vm->heap, item.type);
     size_t len = sizes[item.type];
+    if (item.type == POINTER_TYPE) item.value = heap_own_block(&vm->heap, item.value);
     heap_write(&vm->heap, address, item.value, 0, len);
     
     for (uint32_t i = 1; i < instr.arg; i++) {
         item = pop(&vm->stack);
+        if (item.type == POINTER_TYPE) item.value = heap_own_block(&vm->heap, item.value);
         heap_write(&vm->heap, address, item.value, i*len, len);
     }
 
@@ -102,7 +160,7 @@ void handle_list_access(VM *vm, Instruction instr) {
 }
 
 void handle_list_set(VM *vm, Instruction instr) {
-    uint32_t value, index; DataType POINTER_TYPE;
+    uint32_t value, index; DataType items_type;
     size_t array_location, size_items;
 
     index = (instr.arg == (uint32_t) -1) ?
@@ -110,12 +168,49 @@ void handle_list_set(VM *vm, Instruction instr) {
     
     array_location = pop(&vm->stack).value;
     value = pop(&vm->stack).value;
-    POINTER_TYPE = vm->heap.table_type[array_location];
-    size_items = sizes[POINTER_TYPE];
+    items_type = vm->heap.table_type[array_location];
+    if (items_type == POINTER_TYPE) value = heap_own_block(&vm->heap, value);
+    size_items = sizes[items_type];
     
     heap_write(&vm->heap, array_location, value, index * size_items, size_items);
 }
 
+// The pairs are pushed in reverse, each key on top of its value
+void handle_build_map(VM *vm, Instruction instr) {
+    size_t map = map_new(&vm->heap, instr.arg);
+    for (uint32_t i = 0; i < instr.arg; i++) {
+        Item key = pop(&vm->stack);
+        Item value = pop(&vm->stack);
+        map_set(&vm->heap, map, key, value);
+    }
+
+    push(&vm->stack, (Item) { POINTER_TYPE, map });
+}
+
+// The map is on top of the key (and of the value to set)
+void handle_map_get(VM *vm, Instruction instr) {
+    size_t map = pop(&vm->stack).value;
+    Item key = pop(&vm->stack), value;
+
+    if (!map_get(&vm->heap, map, key, &value)) handle_error(KEY_NOT_FOUND);
+    push(&vm->stack, value);
+}
+
+void handle_map_set(VM *vm, Instruction instr) {
+    size_t map = pop(&vm->stack).value;
+    Item key = pop(&vm->stack);
+    Item value = pop(&vm->stack);
+
+    map_set(&vm->heap, map, key, value);
+}
+
+void handle_map_has(VM *vm, Instruction instr) {
+    size_t map = pop(&vm->stack).value;
+    Item key = pop(&vm->stack), value;
+
+    push(&vm->stack, (Item) { BOOL_TYPE, map_get(&vm->heap, map, key, &value) });
+}
+
 // TODO: Replantearse la implementación de structs
 void handle_define_type(VM *vm, Instruction instr) {}
 void handle_new(VM *vm, Instruction instr) {}
@@ -1,5 +1,7 @@
 #include "../includes/stack.h"
 
+int string_format;
+
 void print_stack(const Stack stack) {
     printf("Stack: ");
     for (int i = stack.top; i >= 0; i--) {
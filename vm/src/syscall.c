@@ -2,73 +2,107 @@
 
 void built_in_exit(VM *vm) { exit(EXIT_SUCCESS); }
 
+// Integers are formatted by hand, printf's parsing of the format costs more than the digits
+static void print_int(int32_t value, FILE *out) {
+    char digits[11];
+    int length = 0;
+    uint32_t magnitude = (value < 0) ? -(uint32_t) value : (uint32_t) value;
+
+    do {
+        digits[sizeof(digits) - ++length] = '0' + magnitude % 10;
+        magnitude /= 10;
+    } while (magnitude);
+
+    if (value < 0) putc('-', out);
+    fwrite(digits + sizeof(digits) - length, 1, length, out);
+}
+
 void built_in_subprint(Item item, FILE *out) {
     if (item.type == INT_TYPE) {
-        fprintf(out, "%d", (int) item.value);
+        print_int((int32_t) item.value, out);
     } else if (item.type == BOOL_TYPE) {
         if (item.value == 1)
-            fprintf(out, "True");
+            fputs("True", out);
         else if (item.value == 0)
-            fprintf(out, "False");
+            fputs("False", out);
         else
-            fprintf(out, "%d", (int8_t) item.value);
+            print_int((int8_t) item.value, out);
     } else if (item.type == FLOAT_TYPE) {
         fprintf(out, "%g", extract_float(item));
     } else if (item.type == CHAR_TYPE) {
-        fprintf(out, "%c", item.value);
+        putc(item.value, out);
     }
 }
 
-void built_in_print(VM *vm) {
-    Item element = pop(&vm->stack);
+// Strings are written at once and the items of an array read straight from its block
+static void print_item(VM *vm, Item item, FILE *out) {
+    if (item.type != POINTER_TYPE) {
+        built_in_subprint(item, out);
+        return;
+    }
 
-    if (element.type == POINTER_TYPE) {
-        Item item;
-        Memory arr = vm->heap.blocks[element.value];
-        DataType arr_type = vm->heap.table_type[element.value];
-        
-        if (arr_type == CHAR_TYPE) {
-            for (int i = 0; i < arr.size; i++) {
-                item = (Item){ arr_type, arr.data[i] };
-                built_in_subprint(item, stdout);
-            }
-        } else {
-            printf("[");
-            for (int i = 0; i < arr.size/sizes[arr_type]; i++) {
-                uint32_t value;
-                heap_read(&vm->heap, element.value, &value, i * sizes[arr_type], sizes[arr_type]);
-                item = (Item){ arr_type, value }; 
-                push(&vm->stack, item);
-                built_in_print(vm);
-                if (i != arr.size/sizes[arr_type] - 1) printf(", ");
-            }
-            printf("]");
+    if (item.value >= vm->heap.size) handle_error(MEMORY_ACCESS_OUT_OF_BOUNDS);
+    Memory *block = &vm->heap.blocks[item.value];
+    DataType arr_type = vm->heap.table_type[item.value];
+
+    if (arr_type == CHAR_TYPE) {
+        fwrite(block->data, 1, block->size, out);
+        return;
+    }
+
+    if (arr_type == MAP_TYPE) {
+        size_t capacity, printed = 0;
+        MapEntry *entries = map_entries(&vm->heap, item.value, &capacity);
+        putc('{', out);
+        for (size_t i = 0; i < capacity; i++) {
+            if (!entries[i].hash) continue;
+            if (printed++) fputs(", ", out);
+
+            print_item(vm, (Item) { entries[i].key_type, entries[i].key }, out);
+            fputs(": ", out);
+            print_item(vm, (Item) { entries[i].value_type, entries[i].value }, out);
         }
-    } else {
-        built_in_subprint(element, stdout);
+        putc('}', out);
+        return;
     }
+
+    size_t count = block->size / sizes[arr_type];
+    putc('[', out);
+    for (size_t i = 0; i < count; i++) {
+        uint32_t value = 0;
+        heap_read(&vm->heap, item.value, &value, i * sizes[arr_type], sizes[arr_type]);
+        print_item(vm, (Item) { arr_type, value }, out);
+        if (i != count - 1) fputs(", ", out);
+    }
+    putc(']', out);
+}
+
+void built_in_print(VM *vm) {
+    print_item(vm, pop(&vm->stack), stdout);
 }
 
 void built_in_input(VM *vm) {
     Item input = {INT_TYPE, 0};
+    fflush(stdout); // The prompt printed before
     scanf("%d", &input.value);
     push(&vm->stack, input);
 }
 
 void built_in_getf(VM *vm) {
     float aux;
+    fflush(stdout); // The prompt printed before
     scanf("%g", &aux);
     push(&vm->stack, (Item){FLOAT_TYPE, format_float(aux)});
 }
 
 void built_in_scan(VM *vm) {
     char input_str[2048];
+    fflush(stdout); // The prompt printed before
     scanf("%2047s", input_str);
 
     size_t address = heap_add_block(&vm->heap, CHAR_TYPE);
-    for (int i = 0; i < 2048 && input_str[i] != '\0'; i++)
-        heap_write(&vm->heap, address, input_str[i], i, 1);
-    
+    heap_append(&vm->heap, address, input_str, strlen(input_str));
+
     push(&vm->stack, (Item) {
         POINTER_TYPE,
         address
@@ -84,8 +118,7 @@ void built_in_type(VM *vm) {
         "CHAR", "ARRAY"
     };
 
-    for (int i = 0; get_type[arg_type][i] != '\0'; i++)
-        heap_write(&vm->heap, address, get_type[arg_type][i], i, 1);
+    heap_append(&vm->heap, address, get_type[arg_type], strlen(get_type[arg_type]));
 
     push(&vm->stack, (Item) {
         POINTER_TYPE,
@@ -96,38 +129,43 @@ void built_in_type(VM *vm) {
 /*********************
 * I/O FILES SYSCALLS *
 *********************/
-void built_in_read(VM *vm) {
-    FILE *file;
-    int from, bytes_to_read;
+// The filename is a string block, copied with its terminator to open the file
+static FILE *open_file(VM *vm, uint32_t filename_address, const char *mode) {
+    if (filename_address >= vm->heap.size) handle_error(MEMORY_ACCESS_OUT_OF_BOUNDS);
 
-    uint32_t filename_address = pop(&vm->stack).value;
-    int length = vm->heap.blocks[filename_address].size;
+    Memory *block = &vm->heap.blocks[filename_address];
+    char filename[block->size + 1];
+    memcpy(filename, block->data, block->size);
+    filename[block->size] = '\0';
 
-    char filename[length + 1];
-    for (int i = 0; i < length; i++) {
-        uint32_t aux;
-        heap_read(&vm->heap, filename_address, &aux, i, 1);
-        filename[i] = (char) aux;
-    }
-    filename[length] = '\0';
-    file = fopen(filename, "rb");
+    return fopen(filename, mode);
+}
+
+// Reads up to bytes_to_read bytes from the current position straight into a new block
+static size_t read_block(VM *vm, FILE *file, size_t bytes_to_read) {
+    size_t address = heap_add_block(&vm->heap, BOOL_TYPE);
+    Memory *block = &vm->heap.blocks[address];
+    if (memory_reserve(block, bytes_to_read) != 0) handle_error(UNDEFINED_ERROR);
+
+    block->size = fread(block->data, 1, bytes_to_read, file);
+    return address;
+}
+
+void built_in_read(VM *vm) {
+    FILE *file = open_file(vm, pop(&vm->stack).value, "rb");
     if (file == NULL) handle_error(FILE_NOT_FOUND);
 
-    from = pop(&vm->stack).value;
-    bytes_to_read = pop(&vm->stack).value;
+    int from = pop(&vm->stack).value;
+    int bytes_to_read = pop(&vm->stack).value;
 
-    uint8_t aux;
     fseek(file, 0, SEEK_END);
-    int file_length = ftell(file);
-    if (from < 0) from = file_length - (from + 1);
-    fseek(file, from, SEEK_SET);
+    long file_length = ftell(file);
+    if (from < 0) from = file_length + from + 1; // -1 is the end of the file
+    if (from < 0 || from > file_length || bytes_to_read < 0) handle_error(INDEX_OUT_OF_BOUNDS);
 
-    int read_pointer = from;
-    int address = heap_add_block(&vm->heap, BOOL_TYPE);
-    while (fread(&aux, 1, 1, file) && read_pointer < from + bytes_to_read) {
-        heap_write(&vm->heap, address, aux, read_pointer - from, 1);
-        read_pointer++;
-    }
+    fseek(file, from, SEEK_SET);
+    if (bytes_to_read > file_length - from) bytes_to_read = file_length - from;
+    size_t address = read_block(vm, file, bytes_to_read);
 
     fclose(file);
     push(&vm->stack, (Item) {
@@ -137,39 +175,61 @@ void built_in_read(VM *vm) {
 }
 
 void built_in_write(VM *vm) {
-    FILE *file;
     uint32_t filename_address, value_address;
     uint32_t bytes_to_write, overwrite;
 
     filename_address = pop(&vm->stack).value;
-    int length = vm->heap.blocks[filename_address].size;
-
-    char filename[length + 1];
-    for (int i = 0; i < length; i++) {
-        uint32_t aux;
-        heap_read(&vm->heap, filename_address, &aux, i, 1);
-        filename[i] = (char) aux;
-    }
-
     value_address = pop(&vm->stack).value;
     bytes_to_write = pop(&vm->stack).value;
     overwrite = pop(&vm->stack).value;
 
-    filename[length] = '\0';
-    file = fopen(filename, (overwrite != (uint32_t) 0) ? "wb" : "ab");
+    FILE *file = open_file(vm, filename_address, (overwrite != (uint32_t) 0) ? "wb" : "ab");
     if (file == NULL) handle_error(FILE_NOT_FOUND);
 
-    size_t i;
-    uint8_t buffer; uint32_t buffer4;
-    for (i = 0; i < bytes_to_write; i++) {
-        heap_read(&vm->heap, value_address, &buffer4, i, 1);
-        buffer = (uint8_t) buffer4;
-        fwrite(&buffer, 1, 1, file);
-    }
+    if (value_address >= vm->heap.size || bytes_to_write > vm->heap.blocks[value_address].size)
+        handle_error(MEMORY_ACCESS_OUT_OF_BOUNDS);
+    size_t written = fwrite(vm->heap.blocks[value_address].data, 1, bytes_to_write, file);
+    fclose(file);
 
     push(&vm->stack, (Item) {
         INT_TYPE,
-        i
+        written
+    });
+}
+
+// Files opened to be read in chunks stay open until close (or the end of the program)
+void built_in_open(VM *vm) {
+    FILE *file = open_file(vm, pop(&vm->stack).value, "rb");
+    if (file == NULL) handle_error(FILE_NOT_FOUND);
+
+    int handle = 0;
+    while (handle < MAX_OPEN_FILES && vm->files[handle] != NULL) handle++;
+    if (handle == MAX_OPEN_FILES) handle_error(FILE_PERMISSION_ERROR);
+
+    vm->files[handle] = file;
+    push(&vm->stack, (Item) { INT_TYPE, handle });
+}
+
+static FILE *get_file(VM *vm, uint32_t handle) {
+    if (handle >= MAX_OPEN_FILES || vm->files[handle] == NULL) handle_error(FILE_NOT_FOUND);
+    return vm->files[handle];
+}
+
+void built_in_close(VM *vm) {
+    uint32_t handle = pop(&vm->stack).value;
+    fclose(get_file(vm, handle));
+    vm->files[handle] = NULL;
+}
+
+// Next bytes of an open file, an empty block once it's over
+void built_in_read_chunk(VM *vm) {
+    FILE *file = get_file(vm, pop(&vm->stack).value);
+    int bytes_to_read = pop(&vm->stack).value;
+    if (bytes_to_read < 0) handle_error(INDEX_OUT_OF_BOUNDS);
+
+    push(&vm->stack, (Item) {
+        POINTER_TYPE,
+        read_block(vm, file, bytes_to_read)
     });
 }
 
@@ -178,6 +238,11 @@ void built_in_write(VM *vm) {
 ****************************/
 void built_in_size(VM* vm) {
     Item arr = pop(&vm->stack);
+    if (vm->heap.table_type[arr.value] == MAP_TYPE) {
+        push(&vm->stack, (Item) { INT_TYPE, map_count(&vm->heap, arr.value) });
+        return;
+    }
+
     push(&vm->stack, (Item) {
         INT_TYPE,
         vm->heap.blocks[arr.value].size / sizes[vm->heap.table_type[arr.value]]
@@ -189,6 +254,8 @@ void built_in_append(VM* vm) {
     arr = pop(&vm->stack);
     item = pop(&vm->stack);
     if (item.type != vm->heap.table_type[arr.value]) handle_error(UNDEFINED_ERROR);
+    if (item.type == POINTER_TYPE) item.value = heap_own_block(&vm->heap, item.value);
+    arr.value = heap_own_block(&vm->heap, arr.value);
 
     heap_write(&vm->heap, arr.value, item.value, vm->heap.blocks[arr.value].size, sizes[arr.type]);
 }
@@ -196,6 +263,7 @@ void built_in_append(VM* vm) {
 void built_in_remove_at(VM* vm) {
     Item arr, index;
     arr = pop(&vm->stack); index = pop(&vm->stack);
+    arr.value = heap_own_block(&vm->heap, arr.value);
 
     if (index.value < 0 || index.value > vm->heap.blocks[arr.value].size)
         handle_error(INDEX_OUT_OF_BOUNDS);
@@ -207,9 +275,12 @@ void built_in_remove_at(VM* vm) {
 void built_in_is_empty(VM* vm) {
     Item arr = pop(&vm->stack);
     
+    size_t size = (vm->heap.table_type[arr.value] == MAP_TYPE) ?
+        map_count(&vm->heap, arr.value) : vm->heap.blocks[arr.value].size;
+
     Item result = {
         BOOL_TYPE,
-        (vm->heap.blocks[arr.value].size == 0) ? 1 : 0
+        (size == 0) ? 1 : 0
     };
 
     push(&vm->stack, result);
@@ -227,15 +298,15 @@ void built_in_slice(VM* vm) {
     arr_type = vm->heap.table_type[arr.value];
     size_t new_arr = heap_add_block(&vm->heap, arr_type);
 
-    int start_pos_original = start.value * sizes[arr_type];
-    int i = start.value; int j = 0;
-    int step = (end.value > start.value) ? 1 : -1;
+    size_t item_size = sizes[arr_type];
 
-    while (i != end.value + step) {
-        uint32_t buffer;
-        heap_read(&vm->heap, arr.value, &buffer, i * sizes[arr_type], sizes[arr_type]);
-        heap_write(&vm->heap, new_arr, buffer, j * sizes[arr_type], sizes[arr_type]);
-        i += step; j++;
+    // Both ends are included, a start after the end gives the items in reverse order
+    if ((int) end.value >= (int) start.value) {
+        heap_copy(&vm->heap, new_arr, 0, arr.value, start.value * item_size, (end.value - start.value + 1) * item_size);
+    } else {
+        memory_reserve(&vm->heap.blocks[new_arr], (start.value - end.value + 1) * item_size);
+        for (int i = start.value, j = 0; i >= (int) end.value; i--, j++)
+            heap_copy(&vm->heap, new_arr, j * item_size, arr.value, i * item_size, item_size);
     }
 
     push(&vm->stack, (Item){
@@ -368,13 +439,11 @@ void built_in_upper(VM* vm) {
 }
 
 void write_char(VM *vm, size_t index, char c) {
-    heap_write(&vm->heap, index, (uint32_t)c, -1, 1);
+    heap_append(&vm->heap, index, &c, 1);
 }
 
 void write_string(VM *vm, size_t index, const char *str) {
-    while (*str) {
-        write_char(vm, index, *str++);
-    }
+    heap_append(&vm->heap, index, str, strlen(str));
 }
 
 void aux_built_in_toString(VM* vm, Item item, size_t index) {
@@ -400,6 +469,18 @@ void aux_built_in_toString(VM* vm, Item item, size_t index) {
     write_string(vm, index, buffer);
 }
 
+void to_string_recursive(VM *vm, Item item, size_t index_result);
+
+// Strings in a map are written as they are, as print does
+static void map_item_to_string(VM *vm, Item item, size_t index_result) {
+    if (item.type == POINTER_TYPE && vm->heap.table_type[item.value] == CHAR_TYPE) {
+        heap_concat(&vm->heap, index_result, item.value);
+        return;
+    }
+
+    to_string_recursive(vm, item, index_result);
+}
+
 void to_string_recursive(VM *vm, Item item, size_t index_result) {
     if (item.type != POINTER_TYPE) {
         aux_built_in_toString(vm, item, index_result);
@@ -407,6 +488,22 @@ void to_string_recursive(VM *vm, Item item, size_t index_result) {
     }
 
     size_t block_index = item.value;
+    if (vm->heap.table_type[block_index] == MAP_TYPE) {
+        size_t capacity, written = 0;
+        MapEntry *entries = map_entries(&vm->heap, block_index, &capacity);
+        write_char(vm, index_result, '{');
+        for (size_t i = 0; i < capacity; i++) {
+            if (!entries[i].hash) continue;
+            if (written++) write_string(vm, index_result, ", ");
+
+            map_item_to_string(vm, (Item){entries[i].key_type, entries[i].key}, index_result);
+            write_string(vm, index_result, ": ");
+            map_item_to_string(vm, (Item){entries[i].value_type, entries[i].value}, index_result);
+        }
+        write_char(vm, index_result, '}');
+        return;
+    }
+
     Memory *block = &vm->heap.blocks[block_index];
     DataType elem_type = vm->heap.table_type[block_index];
     size_t elem_size = sizes[elem_type];
@@ -436,6 +533,43 @@ void built_in_toString(VM* vm) {
     push(&vm->stack, (Item){POINTER_TYPE, result});
 }
 
+/***************
+* MAP SYSCALLS *
+***************/
+// A new array with the keys or the values of the map, in the order of its slots
+static void map_items(VM *vm, int values) {
+    size_t map = pop(&vm->stack).value;
+    size_t list = heap_add_block(&vm->heap, UNASSIGNED_TYPE), capacity;
+    MapEntry *entries = map_entries(&vm->heap, map, &capacity);
+
+    for (size_t i = 0; i < capacity; i++) {
+        if (!entries[i].hash) continue;
+
+        Item item = values ? (Item) { entries[i].value_type, entries[i].value } : (Item) { entries[i].key_type, entries[i].key };
+        if (item.type == POINTER_TYPE) item.value = heap_own_block(&vm->heap, item.value);
+
+        vm->heap.table_type[list] = item.type;
+        heap_write(&vm->heap, list, item.value, (size_t) -1, sizes[item.type]);
+    }
+
+    push(&vm->stack, (Item) { POINTER_TYPE, list });
+}
+
+void built_in_keys(VM *vm) {
+    map_items(vm, 0);
+}
+
+void built_in_values(VM *vm) {
+    map_items(vm, 1);
+}
+
+void built_in_remove(VM *vm) {
+    size_t map = pop(&vm->stack).value;
+    Item key = pop(&vm->stack);
+
+    map_remove(&vm->heap, map, key);
+}
+
 void (*builtins[])(VM *vm) = {
     built_in_exit,
     built_in_print,
@@ -457,9 +591,15 @@ void (*builtins[])(VM *vm) = {
     built_in_lower,
     built_in_upper,
     built_in_toString,
+    built_in_open,
+    built_in_close,
+    built_in_read_chunk,
+    built_in_keys,
+    built_in_values,
+    built_in_remove,
 };
 
 void syscall(VM *vm, int arg) {
-    if (arg > -1 && arg < 20) builtins[arg](vm);
+    if (arg > -1 && arg < (int) (sizeof(builtins) / sizeof(builtins[0]))) builtins[arg](vm);
     else printf("Unknown syscall: %d\n", arg);
 }
\ No newline at end of file
@@ -1,149 +1,653 @@
+#define _POSIX_C_SOURCE 200809L
 #include "virtual_machine.h"
 #include "includes/opcode_handlers.h"
+#include "includes/bytecode.h"
+#include "includes/opcodes.h"
+#include "includes/gc.h"
+
+#include <fcntl.h>
+#include <unistd.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <time.h>
+
+#ifdef VM_STATS
+#include <sys/resource.h>
+
+static unsigned long long executed_instructions = 0;
+
+long peak_rss_kb() {
+#ifdef __linux__
+    // ru_maxrss would also count the process that exec'd the VM
+    char line[128];
+    long peak = -1;
+    FILE *status = fopen("/proc/self/status", "r");
+    while (status && fgets(line, sizeof(line), status))
+        if (sscanf(line, "VmHWM: %ld kB", &peak) == 1) break;
+    if (status) fclose(status);
+    return peak;
+#else
+    struct rusage usage;
+    getrusage(RUSAGE_SELF, &usage);
+    return usage.ru_maxrss / 1024; // bytes on macOS
+#endif
+}
+#endif
+
+// Each constant becomes a read-only heap block, its pool index being its heap address.
+// String literals are interned, so equal ones compare as the same block
+void load_constants(VM *vm, const uint8_t *section, size_t size) {
+    uint32_t count, length;
+    uint8_t type;
+    size_t offset = sizeof(uint32_t);
+
+    if (size < sizeof(uint32_t)) handle_error(INVALID_BYTECODE);
+    memcpy(&count, section, sizeof(uint32_t));
+
+    for (uint32_t i = 0; i < count; i++) {
+        if (offset + sizeof(uint8_t) + sizeof(uint32_t) > size) handle_error(INVALID_BYTECODE);
+        memcpy(&type, section + offset, sizeof(uint8_t));
+        memcpy(&length, section + offset + sizeof(uint8_t), sizeof(uint32_t));
+        offset += sizeof(uint8_t) + sizeof(uint32_t);
+
+        if (type > POINTER_TYPE || offset + length * sizes[type] > size) handle_error(INVALID_BYTECODE);
+
+        size_t address = heap_add_block(&vm->heap, type);
+        memory_expand(&vm->heap.blocks[address], length * sizes[type]);
+        memcpy(vm->heap.blocks[address].data, section + offset, length * sizes[type]);
+        offset += length * sizes[type];
+    }
+
+    // Read-only from here on, so the strings are interned in place
+    vm->heap.constants = vm->heap.size;
+    for (size_t i = 0; i < vm->heap.constants; i++)
+        if (vm->heap.table_type[i] == CHAR_TYPE) heap_intern(&vm->heap, i);
+}
+
+// vm_run only stops at a HALT, so the code must end with one and every jump must stay inside it
+void check_code(const Instruction *code, int size) {
+    if (size == 0 || code[size - 1].opcode != OP_HALT) handle_error(INVALID_BYTECODE);
+
+    for (int i = 0; i < size; i++) {
+        switch (code[i].opcode) {
+            case OP_JUMP: case OP_JUMP_IF: case OP_JUMP_IF_FALSE:
+            case OP_JUMP_IF_LT: case OP_JUMP_IF_GE: case OP_JUMP_IF_GT: case OP_JUMP_IF_LE:
+                if (code[i].arg >= (uint32_t) size) handle_error(INVALID_BYTECODE);
+                break;
+            default:
+                break;
+        }
+    }
+}
 
 void vm_init(VM *vm, const char *filename) {
+    // A terminal still gets every line as soon as it's printed
+    setvbuf(stdout, vm->output, isatty(STDOUT_FILENO) ? _IOLBF : _IOFBF, OUTPUT_BUFFER_SIZE);
+
     stack_init(&vm->stack);
     memory_init(&vm->memory);
     heap_init(&vm->heap);
 
-    
-    FILE *file = fopen(filename, "rb");
-    if (!file) handle_error(FILE_NOT_FOUND);
-    fseek(file, 0, SEEK_END);
-    long size = ftell(file);
-    fseek(file, 0, SEEK_SET);
-    
+    int file = open(filename, O_RDONLY);
+    if (file == -1) handle_error(FILE_NOT_FOUND);
+
+    struct stat file_info;
+    if (fstat(file, &file_info) == -1) handle_error(FILE_NOT_FOUND);
+    vm->image_size = file_info.st_size;
+    if (vm->image_size < sizeof(ImageHeader)) handle_error(INVALID_BYTECODE);
+
+    vm->image = mmap(NULL, vm->image_size, PROT_READ, MAP_PRIVATE, file, 0);
+    close(file);
+    if (vm->image == MAP_FAILED) handle_error(FILE_NOT_FOUND);
+
+    const ImageHeader *header = (const ImageHeader*) vm->image;
+    const SectionHeader *sections = (const SectionHeader*) (vm->image + sizeof(ImageHeader));
+    if (memcmp(header->magic, IMAGE_MAGIC, 4) != 0 || header->version != IMAGE_VERSION)
+        handle_error(INVALID_BYTECODE);
+    if (header->image_size != vm->image_size || sizeof(ImageHeader) + header->section_count * sizeof(SectionHeader) > vm->image_size)
+        handle_error(INVALID_BYTECODE);
+
     string_format = 0;
     vm->frame_pointer = 0;
-    vm->program_size = size/5;
-    vm->bytecode = malloc(sizeof(Instruction) * (vm->program_size + 1));
-    vm->pc = vm->bytecode;
+    vm->frame_base = 0;
+    vm->locals_top = 0;
+    vm->program_size = 0;
+    vm->bytecode = NULL;
+    for (int i = 0; i < MAX_OPEN_FILES; i++) vm->files[i] = NULL;
 
-    for (int i = 0; i < vm->program_size; i++) {
-        fread(&vm->bytecode[i].opcode, sizeof(uint8_t), 1, file);
-        fread(&vm->bytecode[i].arg, sizeof(uint32_t), 1, file);
+    for (int i = 0; i < header->section_count; i++) {
+        SectionHeader section = sections[i];
+        if ((size_t) section.offset + section.size > vm->image_size) handle_error(INVALID_BYTECODE);
+
+        switch (section.type) {
+            case CODE_SECTION:
+                if (section.offset % _Alignof(Instruction) != 0 || section.count * sizeof(Instruction) != section.size)
+                    handle_error(INVALID_BYTECODE);
+                vm->bytecode = (Instruction*) (vm->image + section.offset);
+                vm->program_size = section.count;
+                check_code(vm->bytecode, vm->program_size);
+                break;
+            case CONSTANTS_SECTION:
+                load_constants(vm, vm->image + section.offset, section.size);
+                break;
+            default: // Debug info and function table aren't needed to run the program
+                break;
+        }
     }
 
-    fclose(file);
+    if (vm->bytecode == NULL) handle_error(INVALID_BYTECODE);
+    vm->pc = vm->bytecode;
 }
 
 void vm_destroy(VM *vm) {
     if (!vm) return;
+    fflush(stdout);
 
-    if (vm->bytecode) {
-        free(vm->bytecode);
+    if (vm->image) {
+        munmap(vm->image, vm->image_size);
+        vm->image = NULL;
         vm->bytecode = NULL;
     }
 
     memory_destroy(&vm->memory);
     heap_destroy(&vm->heap);
 
+    for (int i = 0; i < MAX_OPEN_FILES; i++) {
+        if (vm->files[i]) fclose(vm->files[i]);
+        vm->files[i] = NULL;
+    }
+
     vm->program_size = 0;
     vm->frame_pointer = 0;
+    vm->frame_base = 0;
+    vm->locals_top = 0;
     vm->pc = NULL;
+}
 
-    for (int i = 0; i < RECURSION_LIMIT; i++)
-        vm->return_address[i] = NULL;
-}
-
-OpcodeHandler opcode_handlers[] = {
-    [0x0F] = handle_store,
-    [0x10] = handle_store_byte,
-    [0x11] = handle_store_float,
-    [0x12] = handle_store_char,
-    [0x13] = handle_store_mem,
-    [0x14] = handle_load,
-    [0x15] = handle_jump,
-    [0x16] = handle_jump_if,
-    [0x17] = handle_call,
-    [0x18] = handle_return,
-    [0x19] = handle_build_list,
-    [0x1A] = handle_list_access,
-    [0x1B] = handle_list_set,
-    [0x1C] = handle_define_type,
-    [0x1D] = handle_new,
-    [0x1E] = handle_cast,
-    [0xFF] = handle_syscall,
-};
-
+// The ALU leaves both operands and an UNASSIGNED item on the stack when one of them is a string
 void string_format_proc(VM* vm) {
     Item right, left; pop(&vm->stack);
     right = pop(&vm->stack); left = pop(&vm->stack);
 
     string_format = 0;
-    
-    if (left.type == POINTER_TYPE) {
-        if (right.type == POINTER_TYPE) {
-            uint32_t buffer;
-            for (int i = 0; i < vm->heap.blocks[right.value].size; i++) {
-                heap_read(&vm->heap, right.value, &buffer, i, 1);
-                heap_write(&vm->heap, left.value, buffer, vm->heap.blocks[left.value].size + 1, 1);
-            }
-            
-            push(&vm->stack, left);
-        } else {
-            char str[32];
-            if (right.type == FLOAT_TYPE) {
-                sprintf(str, "%g", extract_float(right));
-            } else {
-                sprintf(str, "%d", right.value);
-            }
-            
-            vm->heap.table_type[left.value] = CHAR_TYPE;
-            for (int i = 0; i < strlen(str); i++)
-                heap_write(&vm->heap, left.value, str[i], vm->heap.blocks[left.value].size + i, 1);
-            
-            push(&vm->stack, left);
-        }
-    } else {
-        char str[32];
-        if (right.type == FLOAT_TYPE) {
-            sprintf(str, "%g", extract_float(right));
-        } else {
-            sprintf(str, "%d", right.value);
-        }
+    string_concat(vm, left, right);
+}
 
-        size_t address = heap_add_block(&vm->heap, CHAR_TYPE);
-        for (int i = 0; i < strlen(str); i++)
-            heap_write(&vm->heap, left.value, str[i], vm->heap.blocks[left.value].size + i, 1);
+static size_t format_number(char *str, Item item) {
+    if (item.type == FLOAT_TYPE) return sprintf(str, "%g", extract_float(item));
+    return sprintf(str, "%d", item.value);
+}
 
-        uint32_t buffer;
-        for (int i = 0; i < vm->heap.blocks[right.value].size; i++) {
-            heap_read(&vm->heap, right.value, &buffer, i, 1);
-            heap_write(&vm->heap, address, buffer, i, 1);
-        }
+// Strings and numbers go at the end of the block, which takes the item type of the
+// first string appended while it has none (the empty literal)
+static void append_item(VM *vm, size_t address, Item item) {
+    char str[32];
+    if (item.type != POINTER_TYPE) {
+        vm->heap.table_type[address] = CHAR_TYPE;
+        heap_append(&vm->heap, address, str, format_number(str, item));
+        return;
+    }
+
+    if (item.value >= vm->heap.size) handle_error(MEMORY_ACCESS_OUT_OF_BOUNDS);
+    if (vm->heap.table_type[address] == UNASSIGNED_TYPE)
+        vm->heap.table_type[address] = vm->heap.table_type[item.value];
+    heap_concat(&vm->heap, address, item.value);
+}
 
-        push(&vm->stack, (Item) {
-            POINTER_TYPE,
-            address
-        });
+// The operands are left as they are, the result is a new block
+void string_concat(VM *vm, Item left, Item right) {
+    size_t address = heap_add_block(&vm->heap, UNASSIGNED_TYPE);
+    if (address == (size_t) -1) handle_error(UNDEFINED_ERROR);
+    append_item(vm, address, left);
+    append_item(vm, address, right);
+
+    push(&vm->stack, (Item) {
+        POINTER_TYPE,
+        address
+    });
+}
+
+// string + item for 's = s + item', whose result replaces the string in its variable: the
+// first append copies the string into a builder block that the next ones grow in place
+// (amortized O(1) each) until it's stored anywhere else. Other operands are added as ADD does
+Item string_append(VM *vm, Item string, Item item) {
+    if (string.type != POINTER_TYPE) {
+        push(&vm->stack, string);
+        push(&vm->stack, item);
+        alu(&vm->stack, 0x01); // ADD
+        if (string_format) string_format_proc(vm);
+        return pop(&vm->stack);
     }
+
+    if (string.value >= vm->heap.size) handle_error(MEMORY_ACCESS_OUT_OF_BOUNDS);
+    if (!vm->heap.blocks[string.value].builder) {
+        size_t address = heap_add_block(&vm->heap, vm->heap.table_type[string.value]);
+        if (address == (size_t) -1) handle_error(UNDEFINED_ERROR);
+        heap_concat(&vm->heap, address, string.value);
+
+        vm->heap.blocks[address].builder = 1;
+        string.value = address;
+    }
+
+    append_item(vm, string.value, item);
+    return string;
+}
+
+// Computed goto jumps from the end of every opcode straight to the next one, the
+// switch is kept for other compilers or when building with -DVM_SWITCH_DISPATCH
+#if defined(__GNUC__) && !defined(VM_SWITCH_DISPATCH)
+#define THREADED_DISPATCH
+#endif
+
+// GCC's cross-jumping would merge the identical dispatch tails back into a few shared jumps
+#if defined(THREADED_DISPATCH) && !defined(__clang__)
+#define DISPATCH_LOOP __attribute__((optimize("no-crossjumping")))
+#else
+#define DISPATCH_LOOP
+#endif
+
+#ifdef VM_STATS
+#define COUNT_INSTRUCTION() executed_instructions++
+#else
+#define COUNT_INSTRUCTION()
+#endif
+
+// The instruction being run is pc[-1]. There's no bounds check, as the code ends with HALT and
+// check_code keeps the jumps inside it: the short sequence lets GCC copy the dispatch into every
+// opcode instead of merging them into a single indirect jump
+#define INSTR (pc[-1])
+#define FETCH() do { pc++; COUNT_INSTRUCTION(); } while (0)
+
+#ifdef THREADED_DISPATCH
+#define TARGET(name) case OP_##name: label_##name
+#define DISPATCH() do { FETCH(); goto *dispatch_table[INSTR.opcode]; } while (0)
+#else
+#define TARGET(name) case OP_##name
+#define DISPATCH() continue
+#endif
+
+// pc and the stack top are kept in locals, written back before leaving vm_run's code
+#define SYNC() do { vm->pc = pc; vm->stack.top = (int) (sp - stack_base) - 1; instr_pc_log = INSTR; } while (0)
+#define RELOAD() do { pc = vm->pc; sp = stack_base + vm->stack.top + 1; } while (0)
+#define CALL_HANDLER(handler) do { SYNC(); handler(vm, INSTR); RELOAD(); GC_POINT(); } while (0)
+#define CALL_ALU(op) do { SYNC(); alu(&vm->stack, op); if (string_format) string_format_proc(vm); RELOAD(); GC_POINT(); } while (0)
+
+// Only the code that leaves vm_run allocates, and the collection waits until it's back: while
+// an instruction runs, the blocks it popped from the stack aren't reachable from any root
+#define GC_POINT() do { if (vm->heap.collect) gc_collect(vm); } while (0)
+
+#define VM_ERROR(code) do { instr_pc_log = INSTR; handle_error(code); } while (0)
+#define NEED(count) do { if (sp - stack_base < (count)) VM_ERROR(STACK_UNDERFLOW); } while (0)
+#define PUSH(item_type, item_value) do { \
+    if (sp == stack_end) VM_ERROR(STACK_OVERFLOW); \
+    *sp++ = (Item) { item_type, item_value }; \
+} while (0)
+
+// Typed opcodes, emitted when the compiler knows both operand types: a single tag check
+// guards the operation, which is computed in place. The static type can still be wrong
+// (an int variable holding the float result of a '%'), then the ALU computes it as it
+// does for the untyped opcodes
+#define INT_OP(name, op, result) TARGET(name): { \
+    NEED(2); \
+    Item right = sp[-1], left = sp[-2]; \
+    if (left.type != INT_TYPE || right.type != INT_TYPE) { CALL_ALU(op); DISPATCH(); } \
+    sp[-2] = (Item) { INT_TYPE, (result) }; sp--; \
+    DISPATCH(); \
+}
+
+// The comparisons give 1.0 or 0.0, as float_alu does
+#define FLOAT_OP(name, op, result) TARGET(name): { \
+    NEED(2); \
+    Item right = sp[-1], left = sp[-2]; \
+    if (left.type != FLOAT_TYPE || right.type != FLOAT_TYPE) { CALL_ALU(op); DISPATCH(); } \
+    float a = to_float(left.value), b = to_float(right.value); \
+    sp[-2] = (Item) { FLOAT_TYPE, from_float(result) }; sp--; \
+    DISPATCH(); \
+}
+
+// Integer comparisons branch directly, the handler pops and compares any other type
+#define COMPARE_JUMP(name, condition, handler) TARGET(name): { \
+    NEED(2); \
+    Item right = sp[-1], left = sp[-2]; \
+    if (left.type != INT_TYPE || right.type != INT_TYPE) { CALL_HANDLER(handler); DISPATCH(); } \
+    sp -= 2; \
+    if (condition) pc = bytecode + INSTR.arg; \
+    DISPATCH(); \
+}
+
+// Same little-endian layout as memory_read and memory_write
+static inline uint32_t read_bytes(const uint8_t *data, size_t size) {
+    uint32_t value = 0;
+    for (size_t i = 0; i < size; i++)
+        value |= (uint32_t) data[i] << (8 * i);
+    return value;
+}
+
+static inline void write_bytes(uint8_t *data, uint32_t value, size_t size) {
+    for (size_t i = 0; i < size; i++)
+        data[i] = (uint8_t) (value >> (8 * i));
+}
+
+static inline float to_float(uint32_t value) {
+    float result;
+    memcpy(&result, &value, sizeof(float));
+    return result;
+}
+
+static inline uint32_t from_float(float value) {
+    uint32_t result;
+    memcpy(&result, &value, sizeof(float));
+    return result;
 }
 
-void vm_run(VM *vm) {
-    while (vm->pc < vm->bytecode + vm->program_size) {
-        Instruction instr = *vm->pc++;
-        instr_pc_log = instr;
+DISPATCH_LOOP void vm_run(VM *vm) {
+    Instruction *pc = vm->pc;
+    Instruction *const bytecode = vm->bytecode;
+    Item *const stack_base = vm->stack.data;
+    Item *const stack_end = vm->stack.data + STACK_SIZE;
+    Item *sp = stack_base + vm->stack.top + 1; // First free slot
 
-        if (instr.opcode < 0x0F) {
-            alu(&vm->stack, instr.opcode);
-            if (string_format) string_format_proc(vm);
-            continue;
+#ifdef THREADED_DISPATCH
+    static void *dispatch_table[256] = {
+        [0 ... 255] = &&label_undefined,
+#define OPCODE_LABEL(name, code) [OP_##name] = &&label_##name,
+        OPCODES(OPCODE_LABEL)
+#undef OPCODE_LABEL
+    };
+#endif
+
+    for (;;) {
+        FETCH();
+        switch (INSTR.opcode) {
+            // Operands of unknown type: the ALU dispatches on their tags
+            TARGET(ADD):
+            TARGET(SUB):
+            TARGET(MUL):
+            TARGET(DIV):
+            TARGET(MOD):
+            TARGET(LT):
+            TARGET(GT):
+            TARGET(LE):
+            TARGET(GE): {
+                CALL_ALU(INSTR.opcode);
+                DISPATCH();
+            }
+
+            INT_OP(ADD_I, OP_ADD, left.value + right.value)
+            INT_OP(SUB_I, OP_SUB, left.value - right.value)
+            INT_OP(MUL_I, OP_MUL, left.value * right.value)
+            INT_OP(EQ_I, OP_EQ, left.value == right.value)
+            INT_OP(NEQ_I, OP_NEQ, left.value != right.value)
+            INT_OP(LT_I, OP_LT, (int32_t) left.value < (int32_t) right.value)
+            INT_OP(GT_I, OP_GT, (int32_t) left.value > (int32_t) right.value)
+            INT_OP(LE_I, OP_LE, (int32_t) left.value <= (int32_t) right.value)
+            INT_OP(GE_I, OP_GE, (int32_t) left.value >= (int32_t) right.value)
+
+            FLOAT_OP(ADD_F, OP_ADD, a + b)
+            FLOAT_OP(SUB_F, OP_SUB, a - b)
+            FLOAT_OP(MUL_F, OP_MUL, a * b)
+            FLOAT_OP(DIV_F, OP_DIV, a / b)
+            FLOAT_OP(EQ_F, OP_EQ, (float) (a == b))
+            FLOAT_OP(NEQ_F, OP_NEQ, (float) (a != b))
+            FLOAT_OP(LT_F, OP_LT, (float) (a < b))
+            FLOAT_OP(GT_F, OP_GT, (float) (a > b))
+            FLOAT_OP(LE_F, OP_LE, (float) (a <= b))
+            FLOAT_OP(GE_F, OP_GE, (float) (a >= b))
+
+            // Strings compare their contents, the ALU would send them to string_format
+            TARGET(EQ):
+            TARGET(NEQ): {
+                NEED(2);
+                Item right = sp[-1], left = sp[-2];
+                if (left.type != POINTER_TYPE && right.type != POINTER_TYPE) { CALL_ALU(INSTR.opcode); DISPATCH(); }
+
+                SYNC();
+                int equal = left.type == right.type && heap_equal(&vm->heap, left.value, right.value);
+                sp[-2] = (Item) { INT_TYPE, equal == (INSTR.opcode == OP_EQ) }; sp--;
+                DISPATCH();
+            }
+
+            TARGET(CONCAT): {
+                NEED(2);
+                Item right = sp[-1], left = sp[-2];
+                if (left.type != POINTER_TYPE && right.type != POINTER_TYPE) { CALL_ALU(OP_ADD); DISPATCH(); }
+
+                sp -= 2;
+                SYNC();
+                string_concat(vm, left, right);
+                RELOAD();
+                GC_POINT();
+                DISPATCH();
+            }
+
+            TARGET(AND): {
+                NEED(2);
+                sp[-2] = (Item) { BOOL_TYPE, sp[-2].value && sp[-1].value }; sp--;
+                DISPATCH();
+            }
+
+            TARGET(OR): {
+                NEED(2);
+                sp[-2] = (Item) { BOOL_TYPE, sp[-2].value || sp[-1].value }; sp--;
+                DISPATCH();
+            }
+
+            TARGET(NOT): {
+                NEED(1);
+                sp[-1] = (Item) { BOOL_TYPE, !sp[-1].value };
+                DISPATCH();
+            }
+
+            TARGET(STORE): {
+                PUSH(INT_TYPE, INSTR.arg);
+                DISPATCH();
+            }
+
+            TARGET(STORE_BYTE): {
+                PUSH(BOOL_TYPE, INSTR.arg);
+                DISPATCH();
+            }
+
+            TARGET(STORE_FLOAT): {
+                PUSH(FLOAT_TYPE, INSTR.arg);
+                DISPATCH();
+            }
+
+            TARGET(STORE_CHAR): {
+                PUSH(CHAR_TYPE, INSTR.arg);
+                DISPATCH();
+            }
+
+            TARGET(LOAD_CONST): {
+                if (INSTR.arg >= vm->heap.constants) VM_ERROR(MEMORY_ACCESS_OUT_OF_BOUNDS);
+                PUSH(POINTER_TYPE, INSTR.arg);
+                DISPATCH();
+            }
+
+            TARGET(LOAD): {
+                if (INSTR.arg >= vm->memory.size) VM_ERROR(MEMORY_ACCESS_OUT_OF_BOUNDS);
+                DataType type = vm->memory.table_type[INSTR.arg];
+                type = (type >= 0 && type <= 5) ? type : 0;
+                if (INSTR.arg + sizes[type] > vm->memory.size) VM_ERROR(MEMORY_ACCESS_OUT_OF_BOUNDS);
+                PUSH(type, read_bytes(vm->memory.data + INSTR.arg, sizes[type]));
+                DISPATCH();
+            }
+
+            // New variables (STORE_MEM -1) and pointers, which may have to be copied, go through the handlers
+            TARGET(STORE_MEM):
+            TARGET(STORE_MEM_LOAD): {
+                NEED(1);
+                Item item = sp[-1];
+                if (INSTR.arg == (uint32_t) -1 || item.type == POINTER_TYPE || item.type > POINTER_TYPE) {
+                    if (INSTR.opcode == OP_STORE_MEM) CALL_HANDLER(handle_store_mem);
+                    else CALL_HANDLER(handle_store_mem_load);
+                    DISPATCH();
+                }
+
+                size_t size = sizes[item.type];
+                if (INSTR.arg + size > vm->memory.size) VM_ERROR(MEMORY_ACCESS_OUT_OF_BOUNDS);
+                write_bytes(vm->memory.data + INSTR.arg, item.value, size);
+                vm->memory.table_type[INSTR.arg] = item.type;
+
+                if (INSTR.opcode == OP_STORE_MEM) sp--;
+                else sp[-1].value = read_bytes(vm->memory.data + INSTR.arg, size);
+                DISPATCH();
+            }
+
+            TARGET(LOAD_LOCAL): {
+                if (INSTR.arg >= (uint32_t) (vm->locals_top - vm->frame_base)) VM_ERROR(MEMORY_ACCESS_OUT_OF_BOUNDS);
+                Item local = vm->locals[vm->frame_base + INSTR.arg];
+                PUSH(local.type, local.value);
+                DISPATCH();
+            }
+
+            TARGET(STORE_LOCAL): {
+                NEED(1);
+                if (sp[-1].type == POINTER_TYPE) { CALL_HANDLER(handle_store_local); DISPATCH(); }
+                if (INSTR.arg >= (uint32_t) (vm->locals_top - vm->frame_base)) VM_ERROR(MEMORY_ACCESS_OUT_OF_BOUNDS);
+                vm->locals[vm->frame_base + INSTR.arg] = *--sp;
+                DISPATCH();
+            }
+
+            TARGET(INC_MEM): {
+                uint32_t address = INSTR.arg & 0xFFFFFF;
+                if (address + sizes[INT_TYPE] > vm->memory.size || vm->memory.table_type[address] != INT_TYPE) {
+                    CALL_HANDLER(handle_inc_mem);
+                    DISPATCH();
+                }
+
+                uint32_t value = read_bytes(vm->memory.data + address, sizes[INT_TYPE]);
+                write_bytes(vm->memory.data + address, value + (uint32_t) (int32_t) (int8_t) (INSTR.arg >> 24), sizes[INT_TYPE]);
+                DISPATCH();
+            }
+
+            TARGET(INC_LOCAL): {
+                uint32_t slot = INSTR.arg & 0xFFFFFF;
+                if (slot >= (uint32_t) (vm->locals_top - vm->frame_base) || vm->locals[vm->frame_base + slot].type != INT_TYPE) {
+                    CALL_HANDLER(handle_inc_local);
+                    DISPATCH();
+                }
+
+                vm->locals[vm->frame_base + slot].value += (uint32_t) (int32_t) (int8_t) (INSTR.arg >> 24);
+                DISPATCH();
+            }
+
+            TARGET(APPEND_MEM): {
+                NEED(1);
+                CALL_HANDLER(handle_append_mem);
+                DISPATCH();
+            }
+
+            TARGET(APPEND_LOCAL): {
+                NEED(1);
+                CALL_HANDLER(handle_append_local);
+                DISPATCH();
+            }
+
+            TARGET(JUMP): {
+                pc = bytecode + INSTR.arg;
+                DISPATCH();
+            }
+
+            TARGET(JUMP_IF): {
+                NEED(1);
+                if ((--sp)->value != 0) pc = bytecode + INSTR.arg;
+                DISPATCH();
+            }
+
+            TARGET(JUMP_IF_FALSE): {
+                NEED(1);
+                if ((--sp)->value == 0) pc = bytecode + INSTR.arg;
+                DISPATCH();
+            }
+
+            COMPARE_JUMP(JUMP_IF_LT, (int32_t) left.value < (int32_t) right.value, handle_jump_if_lt)
+            COMPARE_JUMP(JUMP_IF_GE, !((int32_t) left.value < (int32_t) right.value), handle_jump_if_ge)
+            COMPARE_JUMP(JUMP_IF_GT, (int32_t) left.value > (int32_t) right.value, handle_jump_if_gt)
+            COMPARE_JUMP(JUMP_IF_LE, !((int32_t) left.value > (int32_t) right.value), handle_jump_if_le)
+
+            TARGET(CALL): {
+                uint32_t function;
+                if (INSTR.arg == (uint32_t) -1) {
+                    NEED(1);
+                    function = (--sp)->value;
+                } else {
+                    if (INSTR.arg + sizes[INT_TYPE] > vm->memory.size) VM_ERROR(MEMORY_ACCESS_OUT_OF_BOUNDS);
+                    function = read_bytes(vm->memory.data + INSTR.arg, sizes[INT_TYPE]);
+                }
+
+                if (function >= (uint32_t) vm->program_size) VM_ERROR(MEMORY_ACCESS_OUT_OF_BOUNDS);
+                if (vm->frame_pointer >= RECURSION_LIMIT) VM_ERROR(MAX_RECURSION_DEPTH_EXCEEDED);
+                vm->frames[vm->frame_pointer++] = (Frame) { pc, vm->frame_base };
+                pc = bytecode + function;
+                DISPATCH();
+            }
+
+            TARGET(ENTER): {
+                if (vm->locals_top + INSTR.arg > LOCALS_SIZE) VM_ERROR(STACK_OVERFLOW);
+                vm->frame_base = vm->locals_top;
+                vm->locals_top += INSTR.arg;
+                DISPATCH();
+            }
+
+            // A return outside any function ends the program
+            TARGET(RETURN): {
+                if (vm->frame_pointer == 0) goto halt;
+                Frame frame = vm->frames[--vm->frame_pointer];
+                pc = frame.return_address;
+                vm->locals_top = vm->frame_base;
+                vm->frame_base = frame.base;
+                DISPATCH();
+            }
+
+            TARGET(HALT): {
+                goto halt;
+            }
+
+            TARGET(BUILD_LIST): { CALL_HANDLER(handle_build_list); DISPATCH(); }
+            TARGET(LIST_ACCESS): { CALL_HANDLER(handle_list_access); DISPATCH(); }
+            TARGET(LIST_SET): { CALL_HANDLER(handle_list_set); DISPATCH(); }
+            TARGET(BUILD_MAP): { CALL_HANDLER(handle_build_map); DISPATCH(); }
+            TARGET(MAP_GET): { NEED(2); CALL_HANDLER(handle_map_get); DISPATCH(); }
+            TARGET(MAP_SET): { NEED(3); CALL_HANDLER(handle_map_set); DISPATCH(); }
+            TARGET(MAP_HAS): { NEED(2); CALL_HANDLER(handle_map_has); DISPATCH(); }
+            TARGET(DEFINE_TYPE): { CALL_HANDLER(handle_define_type); DISPATCH(); }
+            TARGET(NEW): { CALL_HANDLER(handle_new); DISPATCH(); }
+            TARGET(CAST): { CALL_HANDLER(handle_cast); DISPATCH(); }
+            TARGET(SYSCALL): { CALL_HANDLER(handle_syscall); DISPATCH(); }
+
+            default:
+#ifdef THREADED_DISPATCH
+            label_undefined:
+#endif
+                VM_ERROR(UNDEFINED_ERROR);
         }
-        
-        // printf("%d %d\n", instr.opcode, instr.arg);
-        OpcodeHandler handler = opcode_handlers[instr.opcode];
-        if (!handler) handle_error(UNDEFINED_ERROR);
-        handler(vm, instr);
     }
+
+halt:
+    vm->pc = pc;
+    vm->stack.top = (int) (sp - stack_base) - 1;
 }
 
 int main(int argc, char* argv[]) {
     const char* filename = (argc < 2) ? "output.o" : argv[1];
 
-    VM virtual_machine;
+    static VM virtual_machine; // Its output buffer must outlive main, stdout is flushed at exit
+#ifdef VM_STATS
+    clock_t load_start = clock();
+    vm_init(&virtual_machine, filename);
+    fprintf(stderr, "load time (ms): %.3f\n", 1000.0 * (clock() - load_start) / CLOCKS_PER_SEC);
+#else
     vm_init(&virtual_machine, filename);
+#endif
     vm_run(&virtual_machine);
+
+#ifdef VM_STATS
+    fprintf(stderr, "executed instructions: %llu\n", executed_instructions);
+    gc_print_stats(&virtual_machine.heap);
+    fprintf(stderr, "peak rss (KB): %ld\n", peak_rss_kb());
+#endif
+
     vm_destroy(&virtual_machine);
 
     return 0;
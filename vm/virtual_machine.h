@@ -3,11 +3,19 @@
 #include "includes/stack.h"
 #include "includes/errors.h"
 #include "stdio.h"
-#define RECURSION_LIMIT 128
+#define RECURSION_LIMIT 1024
+#define LOCALS_SIZE (64 * 1024)
+#define MAX_OPEN_FILES 64
+#define OUTPUT_BUFFER_SIZE (64 * 1024)
+
+typedef struct {
+    Instruction *return_address;
+    int base; // First slot of the caller's frame
+} Frame;
 
 typedef struct {
     int program_size;
-    int frame_pointer;
+    int frame_pointer; // Number of active calls
     
     Stack stack;
     Memory memory;
@@ -15,9 +23,21 @@ typedef struct {
 
     Instruction *pc;
     Instruction *bytecode;
-    Instruction* return_address[RECURSION_LIMIT];
+
+    uint8_t *image; // Bytecode file mapped in memory
+    size_t image_size;
+    Frame frames[RECURSION_LIMIT];
+    Item locals[LOCALS_SIZE]; // Parameters and local variables of the active calls
+    int frame_base;           // First slot of the current frame
+    int locals_top;
+
+    FILE *files[MAX_OPEN_FILES]; // Handles returned by open, NULL once closed
+    char output[OUTPUT_BUFFER_SIZE]; // stdout buffer, flushed when full, before reading input and at exit
 } VM;
 
 void vm_init(VM *vm, const char *filename);
 void vm_destroy(VM *vm);
-void vm_run(VM *vm);
\ No newline at end of file
+void vm_run(VM *vm);
+void string_format_proc(VM *vm);
+void string_concat(VM *vm, Item left, Item right);
+Item string_append(VM *vm, Item string, Item item);
\ No newline at end of file